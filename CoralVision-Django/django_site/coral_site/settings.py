@@ -7,6 +7,7 @@ DEBUG = True
 ALLOWED_HOSTS = ['*']
 
 INSTALLED_APPS = [
+    'daphne',  # ASGI runserver so video_feed and websockets run async
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+from .dets import class_name, from_dicts, names_of
+
+# BGR colours cycled by class id
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+    (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61),
+]
+_PALETTE = np.array(PALETTE, dtype=np.uint8)
+FONT, FONT_SCALE = cv2.FONT_HERSHEY_SIMPLEX, 0.5
+THICKNESS = 2
+
+_label_sizes = {}  # class name -> (w, h) of "<name> 0.00"
+
+
+def _label_size(name):
+    size = _label_sizes.get(name)
+    if size is None:
+        size = _label_sizes[name] = cv2.getTextSize(f"{name} 0.00", FONT, FONT_SCALE, 1)[0]
+    return size
+
+
+def draw_boxes(frame, arr, names, copy=False):
+    """Draw a detection array onto frame (in place unless copy).
+
+    Pixel coords and colours for the whole frame come from one array pass;
+    boxes are axis-aligned so they skip anti-aliasing, label sizes are
+    cached per class and only outline/label pixels are written.
+    """
+    out = frame.copy() if copy else frame
+    if not len(arr):
+        return out
+    h, w = out.shape[:2]
+    xy = np.stack([arr[c] for c in ('x1', 'y1', 'x2', 'y2')], axis=1)
+    np.clip(xy, 0, (w - 1, h - 1, w - 1, h - 1), out=xy)
+    slots = (arr['class_id'] % len(PALETTE)).tolist()
+    for (x1, y1, x2, y2), (cid, conf), slot in zip(xy.astype(np.intp).tolist(), arr[['class_id', 'conf']].tolist(), slots):
+        cv2.rectangle(out, (x1, y1), (x2, y2), PALETTE[slot], THICKNESS)
+        name = class_name(names, cid)
+        tw, th = _label_size(name)
+        y = max(th + 4, y1)
+        out[y - th - 4:y, x1:x1 + tw + 4] = _PALETTE[slot]
+        cv2.putText(out, f"{name} {conf:.2f}", (x1 + 2, y - 3), FONT, FONT_SCALE, (255, 255, 255), 1, cv2.LINE_AA)
+    return out
+
+
+def draw_detections(frame, dets, copy=True):
+    """Draw boxes and 'name conf' labels for a list of detection dicts."""
+    return draw_boxes(frame, from_dicts(dets), names_of(dets), copy=copy)
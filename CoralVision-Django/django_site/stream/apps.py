@@ -0,0 +1,45 @@
+import os, sys
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def _sqlite_wal(sender, connection, **kwargs):
+    # WAL lets the API read detection history while the store thread writes.
+    # journal_mode is stored in the database file itself, so it is only set in
+    # processes that run the store (see _writes_store), not on every manage.py call.
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL;')
+            cursor.execute('PRAGMA synchronous=NORMAL;')
+
+
+class StreamConfig(AppConfig):
+    name = 'stream'
+    default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        if _writes_store():
+            connection_created.connect(_sqlite_wal)
+        # CORAL_PRELOAD=1 starts the detector in the background so the first
+        # viewer does not wait for the model; CORAL_PRELOAD=model only loads
+        # the weights (for servers that fork workers after loading the app).
+        mode = os.environ.get('CORAL_PRELOAD', '0')
+        if mode not in ('0', 'false', 'False', '') and _serving():
+            from .detector import preload
+            preload(mode)
+
+
+def _serving():
+    # other manage.py commands (migrate, shell, ...) never load the model
+    if os.path.basename(sys.argv[0]) != 'manage.py' or len(sys.argv) < 2:
+        return True  # daphne / uvicorn / gunicorn
+    if sys.argv[1] != 'runserver':
+        return False
+    # the autoreloader's parent process only watches files
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+
+def _writes_store():
+    if os.environ.get('CORAL_STORE', '1') in ('0', 'false', 'False'):
+        return False
+    return _serving() or sys.argv[1:2] == ['run_detector']
@@ -0,0 +1,239 @@
+import ast, contextlib, hashlib, os, shutil
+import cv2
+import numpy as np
+from .dets import empty, from_arrays, from_results
+
+BACKENDS = ('torch', 'onnx', 'openvino', 'auto')
+DEFAULT_THREADS = max(1, (os.cpu_count() or 2) - 1)  # leave a core for capture/encode
+
+
+def weights_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def weights_key(path, imgsz):
+    return f"{weights_hash(path)}_{imgsz}"
+
+
+def cached_export(weights, fmt, imgsz=640):
+    """Export weights once to ONNX/OpenVINO and cache it next to them.
+
+    The cache name carries a hash of the weights, so replacing the .pt file
+    triggers a fresh export while restarts reuse the previous one. Workers
+    starting together export once; the others wait on a lock file.
+    """
+    stem, _ = os.path.splitext(weights)
+    key = weights_key(weights, imgsz)
+    target = f"{stem}.{key}.onnx" if fmt == 'onnx' else f"{stem}.{key}_openvino_model"
+    if os.path.exists(target):
+        return target
+    with _file_lock(target + '.lock'):
+        if os.path.exists(target):
+            return target  # another process finished it while we waited
+        from ultralytics import YOLO
+        out = YOLO(weights).export(format=fmt, imgsz=imgsz, dynamic=True, verbose=False)
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(out, target)
+    return target
+
+
+def cached_quantized(onnx_path):
+    """Dynamic int8 quantization of an exported ONNX model, cached next to it."""
+    target = onnx_path[:-len('.onnx')] + '.int8.onnx'
+    if os.path.exists(target):
+        return target
+    with _file_lock(target + '.lock'):
+        if os.path.exists(target):
+            return target
+        try:
+            import onnx
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError:
+            raise RuntimeError('int8 profiles need onnx and onnxruntime (pip install onnx onnxruntime)')
+        tmp = target[:-len('.onnx')] + '.tmp.onnx'
+        quantize_dynamic(onnx_path, tmp, weight_type=QuantType.QUInt8)
+        # keep the export's metadata (class names) on the quantized graph
+        model, src = onnx.load(tmp), onnx.load(onnx_path)
+        if not model.metadata_props:
+            model.metadata_props.extend(src.metadata_props)
+        onnx.save(model, tmp)
+        os.replace(tmp, target)
+    return target
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    try:
+        import fcntl
+    except ImportError:  # Windows: no cross-process lock
+        yield
+        return
+    with open(path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def letterbox(frame, size):
+    h, w = frame.shape[:2]
+    gain = min(size / h, size / w)
+    nh, nw = int(round(h * gain)), int(round(w * gain))
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    out[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return out, gain, left, top
+
+
+class TorchBackend:
+    """ultralytics YOLO on PyTorch (the original path)."""
+    name = 'torch'
+
+    def __init__(self, weights, imgsz=None):
+        from ultralytics import YOLO
+        self.model = YOLO(weights)
+        self.names = self.model.names
+        self.imgsz = imgsz  # None keeps the size the weights were trained at
+
+    def predict(self, frames, conf=0.6):
+        kwargs = {'imgsz': self.imgsz} if self.imgsz else {}
+        results = self.model.predict(source=frames, conf=conf, verbose=False, **kwargs)
+        return [from_results(r) for r in results]
+
+    def warmup(self):
+        size = self.imgsz or 640
+        self.predict([np.zeros((size, size, 3), dtype=np.uint8)])
+
+
+class _ExportedBackend:
+    """Shared letterbox pre-processing and YOLOv8-head decode + NMS."""
+
+    def __init__(self, imgsz=640, iou=0.7):
+        self.imgsz = imgsz
+        self.iou = iou
+        self.names = {}
+
+    def _run(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames, conf=0.6):
+        metas, blobs = [], []
+        for f in frames:
+            img, gain, left, top = letterbox(f, self.imgsz)
+            blobs.append(img[:, :, ::-1].transpose(2, 0, 1))  # BGR HWC -> RGB CHW
+            metas.append((gain, left, top, f.shape[1], f.shape[0]))
+        blob = np.ascontiguousarray(np.stack(blobs), dtype=np.float32) / 255.0
+        out = self._run(blob)
+        return [self._decode(out[i], m, conf) for i, m in enumerate(metas)]
+
+    def _decode(self, pred, meta, conf):
+        # pred: (4 + nc, anchors) with cx, cy, w, h rows then class scores
+        pred = pred.T
+        scores = pred[:, 4:]
+        cls = scores.argmax(1)
+        best = scores[np.arange(len(cls)), cls]
+        keep = best >= conf
+        if not keep.any():
+            return empty()
+        xywh, best, cls = pred[keep, :4], best[keep], cls[keep]
+        xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+        boxes = np.concatenate([xyxy[:, :2], xywh[:, 2:]], axis=1)
+        idx = np.asarray(cv2.dnn.NMSBoxesBatched(boxes.tolist(), best.tolist(), cls.tolist(), conf, self.iou)).reshape(-1)
+        idx = idx[np.argsort(-best[idx])]
+        gain, left, top, fw, fh = meta
+        xyxy = (xyxy[idx] - (left, top, left, top)) / gain
+        np.clip(xyxy, 0, (fw, fh, fw, fh), out=xyxy)
+        return from_arrays(xyxy, best[idx], cls[idx])
+
+    def warmup(self, runs=2):
+        frame = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict([frame])
+
+
+class OnnxBackend(_ExportedBackend):
+    name = 'onnx'
+
+    def __init__(self, weights, imgsz=640, threads=DEFAULT_THREADS, int8=False):
+        try:
+            import onnxruntime as ort  # optional; imported only when this backend is used
+        except ImportError:
+            raise RuntimeError('onnx backend needs onnxruntime (pip install onnxruntime)')
+        super().__init__(imgsz)
+        self.path = cached_export(weights, 'onnx', imgsz)
+        if int8:
+            self.path = cached_quantized(self.path)
+            self.name = 'onnx-int8'
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.path, opts, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        meta = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in meta:
+            self.names = ast.literal_eval(meta['names'])
+
+    def _run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(_ExportedBackend):
+    name = 'openvino'
+
+    def __init__(self, weights, imgsz=640, threads=DEFAULT_THREADS):
+        try:
+            import openvino as ov  # optional; imported only when this backend is used
+        except ImportError:
+            raise RuntimeError('openvino backend needs openvino (pip install openvino)')
+        super().__init__(imgsz)
+        self.path = cached_export(weights, 'openvino', imgsz)
+        xml = [f for f in os.listdir(self.path) if f.endswith('.xml')][0]
+        core = ov.Core()
+        model = core.read_model(os.path.join(self.path, xml))
+        self.compiled = core.compile_model(model, 'CPU', {
+            'INFERENCE_NUM_THREADS': threads,
+            'PERFORMANCE_HINT': 'LATENCY',
+        })
+        meta_path = os.path.join(self.path, 'metadata.yaml')
+        if os.path.exists(meta_path):
+            import yaml
+            with open(meta_path) as f:
+                self.names = {int(k): v for k, v in (yaml.safe_load(f).get('names') or {}).items()}
+
+    def _run(self, blob):
+        return self.compiled(blob)[0]
+
+
+def load_backend(weights, name='torch', imgsz=None, threads=DEFAULT_THREADS, int8=False):
+    """Build the requested backend; 'auto' tries openvino, then onnx, then torch.
+
+    int8 runs a dynamically quantized ONNX export and needs name='onnx'.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; expected one of {BACKENDS}")
+    if int8:
+        if name != 'onnx':
+            raise ValueError(f"int8 needs the onnx backend, not {name!r}")
+        return OnnxBackend(weights, imgsz or 640, threads, int8=True)
+    if name == 'torch':
+        return TorchBackend(weights, imgsz)
+    torch_imgsz = imgsz
+    imgsz = imgsz or 640
+    if name == 'onnx':
+        return OnnxBackend(weights, imgsz, threads)
+    if name == 'openvino':
+        return OpenVinoBackend(weights, imgsz, threads)
+    for cls in (OpenVinoBackend, OnnxBackend):
+        try:
+            return cls(weights, imgsz, threads)
+        except Exception:
+            continue
+    return TorchBackend(weights, torch_imgsz)
@@ -0,0 +1,161 @@
+import csv, os, platform, resource, subprocess, tempfile, time
+import cv2
+import numpy as np
+from .annotate import draw_boxes
+from .dets import csv_rows
+from .logsink import HEADER
+
+STAGES = ('decode', 'inference', 'plot', 'jpeg', 'csv', 'mp4')
+
+
+def summarize(samples):
+    """Per-call latencies (seconds) -> p50/p95/p99/mean in ms and calls per second."""
+    a = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(a):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {
+        "n": int(len(a)),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(a.mean()), 3),
+        "fps": round(1000.0 * len(a) / float(a.sum()), 2) if a.sum() > 0 else None,
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+def git_commit(path):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=path,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def _timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+
+def run(video, backend, frames=100, conf=0.6, quality=80):
+    """Time each pipeline stage alone over the same frames, then all of them chained.
+
+    Frames are decoded once into memory so the isolated stages see
+    identical input; the end-to-end pass re-decodes and runs
+    decode -> inference -> plot -> jpeg -> csv -> mp4 per frame, the order
+    of the live output stage.
+    """
+    names = backend.names
+    times = {s: [] for s in STAGES}
+    rss = {}
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    decoded = []
+    while len(decoded) < frames:
+        (ok, frame), dt = _timed(cap.read)
+        if not ok:
+            break
+        decoded.append(frame)
+        times['decode'].append(dt)
+    cap.release()
+    if not decoded:
+        raise RuntimeError(f"No frames decoded from {video}")
+    rss['decode'] = peak_rss_mb()
+    h, w = decoded[0].shape[:2]
+
+    backend.warmup()
+    dets = []
+    for frame in decoded:
+        out, dt = _timed(backend.predict, [frame], conf)
+        dets.append(out[0])
+        times['inference'].append(dt)
+    rss['inference'] = peak_rss_mb()
+
+    draw_boxes(decoded[0].copy(), dets[0], names)  # font/label caches
+    # in place, like the live output stage: inference is done with these frames
+    annotated = []
+    for frame, arr in zip(decoded, dets):
+        img, dt = _timed(draw_boxes, frame, arr, names)
+        annotated.append(img)
+        times['plot'].append(dt)
+    rss['plot'] = peak_rss_mb()
+
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    cv2.imencode('.jpg', annotated[0], params)
+    jpeg_bytes = 0
+    for img in annotated:
+        (ok, buf), dt = _timed(cv2.imencode, '.jpg', img, params)
+        jpeg_bytes += len(buf)
+        times['jpeg'].append(dt)
+    rss['jpeg'] = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory(prefix='coral-bench-') as tmp:
+        with open(os.path.join(tmp, 'bench.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(HEADER)
+            ts = '2000-01-01T00:00:00'
+            for arr in dets:
+                t = time.perf_counter()
+                writer.writerows(csv_rows(ts, arr, names))
+                f.flush()
+                times['csv'].append(time.perf_counter() - t)
+        rss['csv'] = peak_rss_mb()
+
+        mp4 = cv2.VideoWriter(os.path.join(tmp, 'bench.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+        for img in annotated:
+            _, dt = _timed(mp4.write, img)
+            times['mp4'].append(dt)
+        mp4.release()
+        rss['mp4'] = peak_rss_mb()
+        del annotated
+
+        # end to end, one frame at a time through every stage
+        e2e = []
+        cap = cv2.VideoCapture(video)
+        mp4 = cv2.VideoWriter(os.path.join(tmp, 'e2e.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+        with open(os.path.join(tmp, 'e2e.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            t_all = time.perf_counter()
+            for _ in range(len(decoded)):
+                t = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                arr = backend.predict([frame], conf)[0]
+                img = draw_boxes(frame, arr, names)
+                cv2.imencode('.jpg', img, params)
+                writer.writerows(csv_rows('2000-01-01T00:00:00', arr, names))
+                mp4.write(img)
+                e2e.append(time.perf_counter() - t)
+            wall = time.perf_counter() - t_all
+        mp4.release()
+        cap.release()
+
+    stages = {}
+    for s in STAGES:
+        stages[s] = summarize(times[s])
+        stages[s]["peak_rss_mb"] = rss[s]
+    end_to_end = summarize(e2e)
+    end_to_end["wall_fps"] = round(len(e2e) / wall, 2) if wall > 0 else None
+    return {
+        "video": os.path.basename(video),
+        "frames": len(decoded),
+        "resolution": [w, h],
+        "backend": backend.name,
+        "imgsz": getattr(backend, 'imgsz', None),
+        "boxes_per_frame": round(sum(len(a) for a in dets) / len(dets), 2),
+        "jpeg_kb_per_frame": round(jpeg_bytes / len(decoded) / 1024.0, 1),
+        "stages": stages,
+        "end_to_end": end_to_end,
+        "peak_rss_mb": peak_rss_mb(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(),
+                 "cpus": os.cpu_count(), "opencv": cv2.__version__},
+    }
@@ -0,0 +1,131 @@
+import asyncio, threading
+
+BOUNDARY = b'--frame'
+
+
+def mjpeg_part(jpeg):
+    return (BOUNDARY + b"\r\nContent-Type: image/jpeg\r\nContent-Length: "
+            + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+
+
+class Broadcaster:
+    """Latest-value fan-out with sequence numbers.
+
+    The producer publishes each value once; every reader waits for a
+    sequence number newer than the one it last handled, so nobody polls,
+    nobody sees a duplicate, and a slow reader simply skips to the newest
+    value. Sync waiters use a Condition, async waiters a per-call future
+    resolved on their own event loop.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.value = None
+        self.viewers = 0
+        self._cond = threading.Condition()
+        self._futures = set()
+
+    def publish(self, value):
+        with self._cond:
+            self.seq += 1
+            self.value = value
+            seq = self.seq
+            futures, self._futures = self._futures, set()
+            self._cond.notify_all()
+        for loop, fut in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, seq)
+            except RuntimeError:
+                pass  # loop already closed
+
+    def latest(self):
+        with self._cond:
+            return self.seq, self.value
+
+    def wait(self, after_seq=0, timeout=1.0):
+        with self._cond:
+            if self.seq <= after_seq:
+                self._cond.wait(timeout)
+            return self.seq, self.value
+
+    async def wait_async(self, after_seq=0, timeout=1.0):
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self.seq > after_seq:
+                return self.seq, self.value
+            fut = loop.create_future()
+            entry = (loop, fut)
+            self._futures.add(entry)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._futures.discard(entry)
+        return self.latest()
+
+    def add_viewer(self, n=1):
+        with self._cond:
+            self.viewers += n
+
+
+class FrameBroadcaster(Broadcaster):
+    """Broadcaster of (jpeg, multipart chunk); the chunk is built once per frame."""
+
+    def publish(self, jpeg):
+        super().publish((jpeg, mjpeg_part(jpeg)))
+
+
+class VariantSet:
+    """Per-(width, quality) FrameBroadcasters that exist only while watched.
+
+    Width 0 means the native frame size. The output stage encodes each
+    subscribed variant once per frame; a variant is dropped when its last
+    viewer leaves, and the default variant is kept as `default`.
+    """
+
+    DEFAULT = (0, 80)
+
+    def __init__(self):
+        self.default = FrameBroadcaster()
+        self._variants = {self.DEFAULT: self.default}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(w=None, q=None):
+        # quantized so near-identical requests share one encode
+        w = 0 if not w else max(64, int(round(w / 32.0)) * 32)
+        q = VariantSet.DEFAULT[1] if q is None else min(95, max(10, int(round(q / 5.0)) * 5))
+        return w, q
+
+    def subscribe(self, key):
+        with self._lock:
+            b = self._variants.get(key)
+            if b is None:
+                b = self._variants[key] = FrameBroadcaster()
+            b.add_viewer()
+            return b
+
+    def unsubscribe(self, key):
+        with self._lock:
+            b = self._variants.get(key)
+            if b is None:
+                return
+            b.add_viewer(-1)
+            if b.viewers <= 0 and key != self.DEFAULT:
+                del self._variants[key]
+
+    def active(self):
+        """(key, broadcaster) pairs that currently have viewers."""
+        with self._lock:
+            return [(k, b) for k, b in self._variants.items() if b.viewers > 0]
+
+    def stats(self):
+        with self._lock:
+            return {f"{w or 'native'}@q{q}": b.viewers for (w, q), b in self._variants.items() if b.viewers > 0}
+
+
+def _resolve(fut, seq):
+    if not fut.done():
+        fut.set_result(seq)
@@ -1,25 +1,99 @@
-import asyncio, json
+import json, time
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .detector import get_detector
+from .publish import get_publisher, group_name
+from .metrics import BYTES_SENT
 
 class DetectionsConsumer(AsyncWebsocketConsumer):
+    """Streams detection meta pushed by the stream's MetaPublisher.
+
+    Clients may send {"mode": "full"|"compact", "max_rate": <Hz>} at any
+    time (or pass the same as query parameters). Compact mode sends track
+    deltas with fixed-point boxes, falling back to a snapshot whenever the
+    client skipped a frame (rate limit or a dropped message). Outcomes of
+    source switch/probe jobs arrive as {"job": {...}} in either mode.
+    """
+
     async def connect(self):
+        self.stream_id = self.scope.get('url_route', {}).get('kwargs', {}).get('stream_id', 0)
+        from .detector import get_detector  # deferred like the views: loads the model on first use
+        self.det = await sync_to_async(get_detector)(self.stream_id)
+        if self.det is None:
+            await self.close()
+            return
+        self.compact = False
+        self.min_interval = 0.0
+        self._last_sent = 0.0
+        self._last_seq = None
+        qs = parse_qs(self.scope.get('query_string', b'').decode())
+        self._configure({k: v[-1] for k, v in qs.items()})
+        self.sent = BYTES_SENT.labels(self.stream_id, 'ws')
+        self.group = group_name(self.stream_id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
         await self.accept()
-        self._task = asyncio.create_task(self._send_loop())
+        self.publisher = get_publisher(self.det, self.channel_layer)
+        self.publisher.clients += 1
+        if self.compact:
+            self.publisher.compact_clients += 1
+        # current state right away rather than waiting for the next frame
+        meta = self.det.get_meta()
+        if meta and not self.compact:
+            text = json.dumps(meta)
+            self.sent.inc(len(text))
+            await self.send(text_data=text)
 
     async def disconnect(self, close_code):
-        try:
-            self._task.cancel()
-        except Exception:
-            pass
+        if getattr(self, 'group', None):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+        pub = getattr(self, 'publisher', None)
+        if pub is not None:
+            pub.clients -= 1
+            if self.compact:
+                pub.compact_clients -= 1
 
     async def receive(self, text_data=None, bytes_data=None):
-        # Placeholder if you want to accept client commands later
-        pass
-
-    async def _send_loop(self):
-        det = get_detector()
-        while True:
-            meta = det.get_meta()
-            await self.send(text_data=json.dumps(meta))
-            await asyncio.sleep(0.1)
+        try:
+            opts = json.loads(text_data or '{}')
+        except ValueError:
+            return
+        if isinstance(opts, dict):
+            self._configure(opts)
+
+    def _configure(self, opts):
+        was_compact = self.compact
+        if 'mode' in opts:
+            self.compact = opts['mode'] == 'compact'
+        if 'max_rate' in opts:
+            try:
+                rate = float(opts['max_rate'])
+            except (TypeError, ValueError):
+                rate = 0.0
+            self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        pub = getattr(self, 'publisher', None)
+        if pub is not None and was_compact != self.compact:
+            pub.compact_clients += 1 if self.compact else -1
+            self._last_seq = None
+
+    async def detections_meta(self, event):
+        now = time.monotonic()
+        if self.min_interval and now - self._last_sent < self.min_interval:
+            return
+        seq = event['seq']
+        if not self.compact:
+            text = event['text']
+        elif 'delta' not in event:
+            return  # published before the publisher saw a compact client
+        elif self._last_seq is not None and seq == self._last_seq + 1:
+            text = event['delta']
+        else:
+            text = event['snapshot']
+        self._last_sent = now
+        self._last_seq = seq
+        self.sent.inc(len(text))
+        await self.send(text_data=text)
+
+    async def source_job(self, event):
+        # switch/probe outcomes are never rate limited
+        self.sent.inc(len(event['text']))
+        await self.send(text_data=event['text'])
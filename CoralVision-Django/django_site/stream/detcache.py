@@ -0,0 +1,167 @@
+import datetime, hashlib, json, os, shutil, threading
+import numpy as np
+from .dets import DET_DTYPE, empty
+
+# Detections of every frame of a video file, kept on disk so a replay skips
+# the model. One directory per (video content, model key):
+#
+#   index.npy  (frames, 2) int64 memmap: offset into dets.bin and box count;
+#              offset -1 = not computed yet
+#   dets.bin   DET_DTYPE records, appended as frames are inferred
+#   meta.json  video path, fps, frame count, model key
+#
+# The video is keyed by a hash of its contents, so a renamed file still hits
+# and a re-encoded one does not. The model key starts with the weights hash,
+# followed by whatever else changes the boxes (inference profile, tiling):
+# each profile keeps its own cache, and new weights start over and remove
+# the caches made with the old ones. Streams playing the same file share one
+# DetectionCache (open_cache), so each directory has a single writer.
+
+_hashes = {}  # (path, size, mtime) -> content hash, so each file is read once per process
+_hash_lock = threading.Lock()
+_open = {}  # cache dir -> DetectionCache in use
+_open_lock = threading.Lock()
+
+
+def file_hash(path):
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if key in _hashes:
+            return _hashes[key]
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    with _hash_lock:
+        _hashes[key] = h.hexdigest()[:16]
+        return _hashes[key]
+
+
+def open_cache(root, video, frames, model_key, fps=None):
+    """The DetectionCache of this video and model key, shared by every stream that plays it."""
+    path = os.path.join(root, f"{file_hash(video)}_{model_key}")
+    with _open_lock:
+        cache = _open.get(path)
+        if cache is not None:
+            cache.users += 1
+            return cache
+        cache = _open[path] = DetectionCache(root, video, frames, model_key, fps)
+        return cache
+
+
+class DetectionCache:
+    """Per-video detection cache; get()/put() by frame index, safe across threads.
+
+    Open it through open_cache(): two instances on one directory would each
+    append to dets.bin at their own offset and corrupt it. close() releases
+    one user; the files are closed when the last one is gone.
+    """
+
+    def __init__(self, root, video, frames, model_key, fps=None):
+        self.video = video
+        self.frames = int(frames)
+        if self.frames <= 0:
+            raise ValueError(f"{video}: unknown frame count, cannot cache")
+        self.model_key = model_key
+        vid = file_hash(video)
+        self.dir = os.path.join(root, f"{vid}_{model_key}")
+        current = f"{vid}_{model_key.split('_', 1)[0]}_"
+        for name in os.listdir(root) if os.path.isdir(root) else ():
+            if name.startswith(vid + '_') and not name.startswith(current):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)  # other weights
+        os.makedirs(self.dir, exist_ok=True)
+        index_path, dets_path = os.path.join(self.dir, 'index.npy'), os.path.join(self.dir, 'dets.bin')
+        records = os.path.getsize(dets_path) // DET_DTYPE.itemsize if os.path.exists(dets_path) else 0
+        self.index = None
+        if os.path.exists(index_path):
+            try:
+                self.index = np.load(index_path, mmap_mode='r+')
+                # a different frame count or entries past the end of dets.bin: start over
+                if self.index.shape != (self.frames, 2) or int(self.index.sum(axis=1).max()) > records:
+                    self.index = None
+            except ValueError:
+                self.index = None
+        if self.index is None:
+            self.index = np.lib.format.open_memmap(index_path, mode='w+', dtype=np.int64, shape=(self.frames, 2))
+            self.index[:, 0] = -1
+            self.index[:, 1] = 0
+            self.index.flush()
+            with open(dets_path, 'wb'):
+                pass
+            with open(os.path.join(self.dir, 'meta.json'), 'w') as f:
+                json.dump({"video": os.path.abspath(video), "frames": self.frames, "fps": fps, "model": model_key,
+                           "created": datetime.datetime.utcnow().isoformat()}, f)
+        self.cached = int((self.index[:, 0] >= 0).sum())
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._out = open(dets_path, 'ab')
+        self._records = self._out.tell() // DET_DTYPE.itemsize
+        self._map = None
+        self._dirty = 0
+        self.closed = False
+        self.users = 1
+
+    def has(self, idx):
+        index = self.index
+        return index is not None and 0 <= idx < self.frames and bool(index[idx, 0] >= 0)
+
+    def get(self, idx):
+        """Detection array for frame idx, or None if it was never inferred."""
+        if not 0 <= idx < self.frames:
+            return None
+        with self._lock:
+            if self.closed:
+                return None
+            off, n = (int(v) for v in self.index[idx])
+            if off < 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if n == 0:
+                return empty()
+            if self._map is None or off + n > len(self._map):
+                # dets.bin grew since it was mapped
+                self._map = np.memmap(self._out.name, DET_DTYPE, mode='r')
+            return np.array(self._map[off:off + n])
+
+    def put(self, idx, arr):
+        if not 0 <= idx < self.frames:
+            return
+        with self._lock:
+            if self.closed or self.index[idx, 0] >= 0:
+                return
+            off = self._records
+            if len(arr):
+                self._out.write(np.ascontiguousarray(arr, DET_DTYPE).tobytes())
+                self._out.flush()  # records must be on disk before the index points at them
+                self._records += len(arr)
+            self.index[idx, 1] = len(arr)
+            self.index[idx, 0] = off
+            self.cached += 1
+            self._dirty += 1
+            if self._dirty >= 256 or self.cached == self.frames:
+                self.index.flush()
+                self._dirty = 0
+
+    def stats(self):
+        return {"frames": self.frames, "cached": self.cached, "complete": self.cached == self.frames,
+                "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with _open_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            if _open.get(self.dir) is self:
+                del _open[self.dir]
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.index.flush()
+                self._out.close()
+            except Exception:
+                pass
+            self.index = self._map = None
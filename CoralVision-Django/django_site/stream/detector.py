@@ -1,6 +1,21 @@
-import os, threading, time, csv, datetime
+import collections, functools, hashlib, json, os, threading, time, datetime
 import cv2
-from ultralytics import YOLO
+from .backends import load_backend, weights_hash, DEFAULT_THREADS
+from .dets import empty, to_dicts
+from .pipeline import StageQueue, StageStats
+from .tracking import FlowTracker, SkipController
+from .annotate import draw_boxes
+from .broadcast import Broadcaster, VariantSet
+from .logsink import LogSink, TrackLog
+from .tracks import TrackAggregator
+from .recorder import Recorder
+from .events import EventClipper, parse_rules
+from .tiling import TileConfig, load_configs, parse_rois, predict_tiled
+from .motion import SceneGate
+from .metrics import BATCH_SIZE, STAGE_SECONDS, Callback
+from .sources import SourceManager, source_label, src_is
+from .detcache import open_cache
+from .profiles import ProfileGovernor, default_profiles, load_profiles
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # ...\CoralVision-Django\django_site
 PROJECT_ROOT = os.path.dirname(BASE_DIR)  # ...\CoralVision-Django
@@ -14,10 +29,76 @@ ALT_SOURCE_PATHS = [
     os.path.join(os.path.dirname(PROJECT_ROOT), 'CoralVision-Tkinter', 'v2videotesting.mp4'),
 ]
 
+# Nothing here touches the disk or loads the model at import: the pool (and
+# the model with it) is built on the first stream request, or earlier by the
+# CORAL_PRELOAD hook in apps.py. The log directory is created by the sinks.
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
-os.makedirs(LOG_DIR, exist_ok=True)
-LOG_CSV = os.path.join(LOG_DIR, f"detections_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-REC_OUT = os.path.join(LOG_DIR, f"record_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
+# Detection log sink: csv, csv.gz or parquet (needs pyarrow); rows are batched
+# off the hot loop and files rotate by size and, optionally, every hour.
+LOG_FORMAT = os.environ.get('CORAL_LOG_FORMAT', 'csv')
+LOG_ROTATE_MB = float(os.environ.get('CORAL_LOG_ROTATE_MB', '64'))
+LOG_ROTATE_HOURLY = os.environ.get('CORAL_LOG_ROTATE_HOURLY', '1') not in ('0', 'false', 'False')
+LOG_FLUSH_ROWS = int(os.environ.get('CORAL_LOG_FLUSH_ROWS', '500'))
+LOG_FLUSH_SECS = float(os.environ.get('CORAL_LOG_FLUSH_SECS', '1.0'))
+LOG_QUEUE_SIZE = int(os.environ.get('CORAL_LOG_QUEUE', '1000'))
+# What gets logged to files: 'tracks' is one row per object once it has left
+# the scene (tracks_*.csv), 'frames' one row per box per frame
+# (detections_*.csv), 'both' writes both. CORAL_STORE_LOG picks the same for
+# the database (Track/TrackMinute, Detection/DetectionMinute); it defaults to
+# 'both' so /api/detections and /api/stats keep filling. Boxes join a track of their class at CORAL_TRACK_IOU
+# overlap; tracks count after CORAL_TRACK_MIN_HITS frames and end after
+# CORAL_TRACK_MAX_AGE seconds unseen.
+DETECTION_LOG = os.environ.get('CORAL_DETECTION_LOG', 'tracks')
+DETECTION_LOG_MODES = ('tracks', 'frames', 'both')
+STORE_LOG = os.environ.get('CORAL_STORE_LOG', 'both')
+TRACK_IOU = float(os.environ.get('CORAL_TRACK_IOU', '0.3'))
+TRACK_MIN_HITS = int(os.environ.get('CORAL_TRACK_MIN_HITS', '3'))
+TRACK_MAX_AGE = float(os.environ.get('CORAL_TRACK_MAX_AGE', '1.0'))
+# Inference backend: torch (ultralytics/PyTorch), onnx (onnxruntime), openvino,
+# or auto (first of openvino/onnx that loads, else torch). Exports are cached
+# next to the weights, keyed by a hash of the weights file.
+BACKEND = os.environ.get('CORAL_BACKEND', 'torch')
+IMGSZ = int(os.environ['CORAL_IMGSZ']) if os.environ.get('CORAL_IMGSZ') else None
+THREADS = int(os.environ.get('CORAL_THREADS', str(DEFAULT_THREADS)))
+# Inference profiles (stream/profiles.py): "accurate" runs CORAL_BACKEND at
+# CORAL_IMGSZ, "int8" a dynamically quantized ONNX export, "fast" a
+# CORAL_FAST_IMGSZ input; all use CORAL_CONF. CORAL_PROFILES_CONFIG names a
+# JSON list that replaces them (ladder order). CORAL_PROFILE is the one to
+# start with; each other one loads on first use. CORAL_GOVERNOR=1 steps down
+# the ladder when inference overruns the frame budget (1/CORAL_GOVERNOR_FPS,
+# default the fastest source) and back up when there is headroom.
+CONF = float(os.environ.get('CORAL_CONF', '0.6'))
+FAST_IMGSZ = int(os.environ.get('CORAL_FAST_IMGSZ', '320'))
+PROFILES = load_profiles(default_profiles(BACKEND, IMGSZ, CONF, FAST_IMGSZ), os.environ.get('CORAL_PROFILES_CONFIG'))
+PROFILE_NAMES = {p.name: p for p in PROFILES}
+DEFAULT_PROFILE = os.environ.get('CORAL_PROFILE', PROFILES[0].name)
+GOVERNOR = os.environ.get('CORAL_GOVERNOR', '0') not in ('0', 'false', 'False')
+GOVERNOR_FPS = float(os.environ.get('CORAL_GOVERNOR_FPS', '0'))
+# Also insert detections into the Django database (stream.models.Detection)
+# for /api/detections and /api/stats; needs `manage.py migrate`.
+STORE_ENABLED = os.environ.get('CORAL_STORE', '1') not in ('0', 'false', 'False')
+# Pipeline hand-off queues between capture, inference and output stages.
+# drop-oldest keeps latency low on live sources; set CORAL_DROP_OLDEST=0 to
+# process every frame (e.g. when replaying a file).
+PIPELINE_QUEUE_SIZE = int(os.environ.get('CORAL_QUEUE_SIZE', '2'))
+PIPELINE_DROP_OLDEST = os.environ.get('CORAL_DROP_OLDEST', '1') not in ('0', 'false', 'False')
+# Recordings are written by a background thread as CORAL_RECORD_SEGMENT_SECS
+# long MP4 segments plus an index.jsonl; CORAL_RECORD_RAW=1 records the
+# unannotated frames with a per-segment detections sidecar instead.
+RECORD_SEGMENT_SECS = float(os.environ.get('CORAL_RECORD_SEGMENT_SECS', '60'))
+RECORD_RAW = os.environ.get('CORAL_RECORD_RAW', '0') not in ('0', 'false', 'False')
+RECORD_QUEUE_SIZE = int(os.environ.get('CORAL_RECORD_QUEUE', '64'))
+# Detection-triggered event clips: rules like 'bleached>0.8x5' (class name or
+# id, min conf, consecutive frames), ';'-separated. A clip holds the last
+# CORAL_EVENT_PRE_SECS of annotated JPEGs from a ring buffer plus
+# CORAL_EVENT_POST_SECS after the last matching frame, written to EVENT_DIR.
+EVENT_RULES = parse_rules(os.environ.get('CORAL_EVENT_RULES', ''))
+EVENT_PRE_SECS = float(os.environ.get('CORAL_EVENT_PRE_SECS', '5'))
+EVENT_POST_SECS = float(os.environ.get('CORAL_EVENT_POST_SECS', '5'))
+EVENT_COOLDOWN_SECS = float(os.environ.get('CORAL_EVENT_COOLDOWN_SECS', '10'))
+EVENT_MAX_SECS = float(os.environ.get('CORAL_EVENT_MAX_SECS', '60'))
+EVENT_RING_MB = float(os.environ.get('CORAL_EVENT_RING_MB', '64'))
+EVENT_DIR = os.path.join(LOG_DIR, 'events')
 
 
 def _first_existing(paths):
@@ -27,157 +108,546 @@ def _first_existing(paths):
     return None
 
 MODEL_PATH = _first_existing([MODEL_PATH] + ALT_MODEL_PATHS)
-if not MODEL_PATH:
-    raise FileNotFoundError('YOLO weights not found; expected coralaiv3.pt in project or CoralVision-Tkinter folder')
+
+
+def model_path():
+    if not MODEL_PATH:
+        raise FileNotFoundError('YOLO weights not found; expected coralaiv3.pt in project or CoralVision-Tkinter folder')
+    return MODEL_PATH
 
 _source_candidate = _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
 SOURCE = _source_candidate if _source_candidate else 0  # fallback to webcam
 
 
+def _parse_sources(spec):
+    # "0,1,/data/dive.mp4" -> [0, 1, '/data/dive.mp4']
+    out = []
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        out.append(int(part) if part.isdigit() else part)
+    return out
+
+# Sources served by the DetectorPool, one stream per entry (stream id = index).
+# CORAL_SOURCES="0,1,2,3" runs four cameras through one batched model.
+SOURCES = _parse_sources(os.environ.get('CORAL_SOURCES')) or [SOURCE]
+# How long a tick waits for the remaining streams once the first frame is in
+BATCH_WINDOW = float(os.environ.get('CORAL_BATCH_WINDOW_MS', '15')) / 1000.0
+# Adaptive frame skipping: when CORAL_TARGET_FPS > 0 the detector runs every K
+# frames (K <= CORAL_MAX_SKIP, adapted to hit the target) and boxes are moved
+# by optical flow in between.
+TARGET_FPS = float(os.environ.get('CORAL_TARGET_FPS', '0'))
+MAX_SKIP = int(os.environ.get('CORAL_MAX_SKIP', '8'))
+# Tiled inference for high-resolution sources: CORAL_TILE=640 cuts frames into
+# overlapping tiles (CORAL_TILE_OVERLAP fraction) run CORAL_TILE_BATCH at a
+# time and merged across tile edges. CORAL_ROIS="x1,y1,x2,y2;..." (0..1)
+# limits inference to static regions. CORAL_TILING_CONFIG names a JSON file
+# of per-stream overrides, e.g. {"1": {"tile": 960, "rois": [[0, 0.4, 1, 1]]}}.
+TILING = TileConfig(
+    tile=int(os.environ.get('CORAL_TILE', '0')),
+    overlap=float(os.environ.get('CORAL_TILE_OVERLAP', '0.2')),
+    batch=int(os.environ.get('CORAL_TILE_BATCH', '8')),
+    rois=parse_rois(os.environ.get('CORAL_ROIS')),
+)
+TILING_PER_STREAM = load_configs(TILING, os.environ.get('CORAL_TILING_CONFIG'))
+# Scene-change gate: with CORAL_MOTION_THRESH > 0 a frame whose downsampled
+# grayscale differs from the last inferred one by less than this mean grey
+# level skips inference and reuses the previous detections and annotated
+# frame. CORAL_MOTION_MAX_AGE seconds forces a fresh inference regardless.
+MOTION_THRESH = float(os.environ.get('CORAL_MOTION_THRESH', '0'))
+MOTION_MAX_AGE = float(os.environ.get('CORAL_MOTION_MAX_AGE', '10'))
+
+# Shared-memory frame bus: `manage.py run_detector` runs the pool as its own
+# process and publishes each stream's JPEG + meta to shared memory; web
+# workers started with CORAL_BUS=client attach to it instead of opening
+# cameras and loading the model. Control calls go over CORAL_BUS_CONTROL,
+# authenticated with a random key kept in the (0600) bus segment.
+BUS_MODE = os.environ.get('CORAL_BUS', '')
+BUS_PREFIX = os.environ.get('CORAL_BUS_NAME', 'coral')
+BUS_SLOTS = int(os.environ.get('CORAL_BUS_SLOTS', '4'))
+BUS_SLOT_MB = float(os.environ.get('CORAL_BUS_SLOT_MB', '4'))
+_bus_host, _, _bus_port = os.environ.get('CORAL_BUS_CONTROL', '127.0.0.1:8765').rpartition(':')
+BUS_CONTROL = (_bus_host or '127.0.0.1', int(_bus_port))
+
+# Source switching: switched-away captures stay open for instant switch-back,
+# up to CORAL_WARM_CAPTURES idle ones; a source that failed a background probe
+# is not probed again for CORAL_PROBE_TTL seconds (switches always retry).
+WARM_CAPTURES = int(os.environ.get('CORAL_WARM_CAPTURES', '2'))
+PROBE_TTL = float(os.environ.get('CORAL_PROBE_TTL', '30'))
+
+# Detection cache for file sources (see detcache.py): frames already inferred
+# with the current weights are replayed from CACHE_DIR without the model.
+DET_CACHE = os.environ.get('CORAL_DET_CACHE', '1') not in ('0', 'false', 'False')
+CACHE_DIR = os.path.join(LOG_DIR, 'detcache')
+
+# output_q marker for frames the scene gate let skip inference. output_q items
+# are (frame, detections, ts, keyframe, seq): seq is the inference sequence
+# number of model output, and for REUSE the inference the frame follows.
+REUSE = object()
+
+
+def encode_jpeg(frame, w=0, q=80, resized=None):
+    """JPEG of frame scaled to width w (0 = native); resized caches scaled frames by width."""
+    img = frame
+    if w and w < frame.shape[1]:
+        img = resized.get(w) if resized is not None else None
+        if img is None:
+            h = max(1, round(frame.shape[0] * w / frame.shape[1]))
+            img = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            if resized is not None:
+                resized[w] = img
+    ok, buf = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), q])
+    return buf.tobytes() if ok else None
+
+
 class Detector:
-    def __init__(self):
-        self.model = YOLO(MODEL_PATH)
-        self.cap = cv2.VideoCapture(SOURCE)
-        if not self.cap.isOpened() and SOURCE == 0:
-            # Windows often needs DirectShow backend
-            try:
-                self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-            except Exception:
-                pass
-        if not self.cap.isOpened():
-            raise RuntimeError(f"Could not open video source: {SOURCE}")
-        # Video writer for annotated recording (only when recording flag is True)
-        self.writer = None
-        self.recording = False
-        self._record_path = None
-        self._record_reset = False  # request to (re)open writer on next frame
-        # Source switching
-        self._switch_req = None  # None or 0 or filepath str
-        self.source_label = 'file' if isinstance(SOURCE, str) else 'webcam'
+    """One video source: capture and annotate/encode/record stages.
+
+    Inference is shared: the owning DetectorPool pulls frames from every
+    stream's infer_q, runs one batched predict and feeds each output_q.
+    """
+
+    def __init__(self, pool, stream_id=0, source=SOURCE, queue_size=PIPELINE_QUEUE_SIZE, drop_oldest=PIPELINE_DROP_OLDEST):
+        self.pool = pool
+        self.stream_id = stream_id
+        self.source = source  # the source actually being read
+        self.cap = pool.sources.acquire(source)
+        if self.cap is None:
+            raise RuntimeError(f"Could not open video source: {source}")
+        self.source_label = source_label(source)
+        self.src_fps = self._read_src_fps()
+        self.src_frames = self._read_src_frames()
+        self.tiling = TILING_PER_STREAM.get(stream_id, TILING)
+        # File sources: index of the next frame read, pending seek, detection cache
+        self.frame_idx = 0
+        self._seek_req = None
+        self.cache = self._open_cache(source, self.cap)
+        # Segmented recording; None when not recording
+        self.recorder = None
+        # Source switching: (source, opened capture, job, detection cache) from the SourceManager
+        self._switch_req = None
+        self.source_job = None  # latest switch/probe job touching this stream
+        self.job_updates = Broadcaster()
+        self.gate = SceneGate(MOTION_THRESH, max_age=MOTION_MAX_AGE) if MOTION_THRESH > 0 else None
+        self._last_arr = None  # detections of the last inferred frame (for REUSE)
+        # infer_q items carry a sequence number; output holds a REUSE frame
+        # until it has drawn the inference sent before it (_out_seq)
+        self._infer_sent = 0
+        self._out_seq = 0
         # Shared state
         self.lock = threading.Lock()
         self.latest_jpeg = None
-        self.latest_meta = {"ts": None, "fps": 0.0, "detections": []}
+        self._latest_frame = None  # annotated frame behind latest_jpeg, encoded on demand
+        # /video_feed variants by (width, quality); frames is the default one
+        self.variants = VariantSet()
+        self.frames = self.variants.default
+        self.meta_updates = Broadcaster()
+        self.latest_meta = {"ts": None, "fps": 0.0, "detections": [], "stream": stream_id}
+        self.bus = None  # FrameBus when running under `manage.py run_detector`
         self.stop_event = threading.Event()
         self.fps_smooth = 0.0
-        # CSV header
-        with open(LOG_CSV, 'w', newline='') as f:
-            import csv as _csv
-            w = _csv.writer(f)
-            w.writerow(['timestamp','class_id','class_name','conf','x1','y1','x2','y2'])
-        # Start thread
-        self.thread = threading.Thread(target=self._run, daemon=True)
-        self.thread.start()
+        # Pipeline: capture -> [infer_q] -> pool inference -> [output_q] -> annotate/encode/record
+        self.infer_q = StageQueue(queue_size, drop_oldest, notify=pool.frame_ready)
+        self.output_q = StageQueue(queue_size, drop_oldest)
+        self.stats = {
+            "capture": StageStats(),
+            "output": StageStats(),
+        }
+        # Frame skipping state (used only when the pool has a SkipController):
+        # capture sends every frame to output and every K-th to the pool; the
+        # output stage moves the latest keyframe boxes onto each frame.
+        self.tracker = FlowTracker()
+        self._since_key = None  # frames since last keyframe; None = need one now
+        self._key_pending = False
+        self._key = None  # (frame, detection array) from the pool not yet given to tracker
+        for name, mode in (('CORAL_DETECTION_LOG', DETECTION_LOG), ('CORAL_STORE_LOG', STORE_LOG)):
+            if mode not in DETECTION_LOG_MODES:
+                raise ValueError(f"Unknown {name} {mode!r}; expected one of {DETECTION_LOG_MODES}")
+        # Stable track IDs and per-track summaries (see DETECTION_LOG)
+        self.tracks = TrackAggregator(pool.backend.names, iou_threshold=TRACK_IOU, max_age=TRACK_MAX_AGE,
+                                      min_hits=TRACK_MIN_HITS)
+        # Detection logs; extra streams log next to the primary files
+        log_opts = dict(
+            names=pool.backend.names, suffix='' if stream_id == 0 else f'_s{stream_id}', fmt=LOG_FORMAT,
+            flush_rows=LOG_FLUSH_ROWS, flush_secs=LOG_FLUSH_SECS,
+            rotate_bytes=int(LOG_ROTATE_MB * 1024 * 1024), rotate_hourly=LOG_ROTATE_HOURLY,
+            queue_size=LOG_QUEUE_SIZE,
+        )
+        self.log = LogSink(LOG_DIR, **log_opts) if DETECTION_LOG != 'tracks' else None
+        self.track_log = TrackLog(LOG_DIR, **log_opts) if DETECTION_LOG != 'frames' else None
+        self.store = None
+        if STORE_ENABLED:
+            from .store import DetectionStore
+            self.store = DetectionStore(source=stream_id)
+        self.events = None
+        if EVENT_RULES:
+            self.events = EventClipper(
+                EVENT_DIR, EVENT_RULES, stream=stream_id, suffix='' if stream_id == 0 else f'_s{stream_id}',
+                pre_secs=EVENT_PRE_SECS, post_secs=EVENT_POST_SECS, cooldown_secs=EVENT_COOLDOWN_SECS,
+                max_secs=EVENT_MAX_SECS, ring_bytes=int(EVENT_RING_MB * 1024 * 1024),
+            )
+        self.threads = []
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name=f'coral-capture-{self.stream_id}', daemon=True),
+            threading.Thread(target=self._output_loop, name=f'coral-output-{self.stream_id}', daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+
+    def _read_src_fps(self, cap=None):
+        src_fps = (cap or self.cap).get(cv2.CAP_PROP_FPS)
+        return float(src_fps) if src_fps and src_fps > 0 else 30.0
+
+    def _read_src_frames(self):
+        # 0 for cameras and containers that do not report a length
+        return max(0, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))) if self.source_label == 'file' else 0
+
+    def cache_key(self, profile=None):
+        # weights first: the cache only drops entries made with other weights
+        key = f"{self.pool.weights_hash}_{(profile or self.pool.profile).key}"
+        if self.tiling.enabled:
+            key += '_t' + hashlib.sha1(json.dumps(self.tiling.as_dict(), sort_keys=True).encode()).hexdigest()[:6]
+        return key
+
+    def _open_cache(self, src, cap):
+        if not DET_CACHE or self.pool.weights_hash is None or source_label(src) != 'file':
+            return None
+        try:
+            return open_cache(CACHE_DIR, src, cap.get(cv2.CAP_PROP_FRAME_COUNT), self.cache_key(),
+                              self._read_src_fps(cap))
+        except Exception:
+            return None  # unreadable file or unknown length: infer every frame as before
+
+    def request_switch(self, src, cap, job):
+        # called from the SourceManager thread with an opened, verified capture;
+        # hashing the file for its detection cache happens here, off the capture loop
+        cache = self._open_cache(src, cap)
+        with self.lock:
+            pending, self._switch_req = self._switch_req, (src, cap, job, cache)
+        if pending is not None:
+            self.pool.sources.release(pending[0], pending[1])
+            self.pool.sources.switched(pending[2], 'superseded by a newer switch')
+            if pending[3] is not None:
+                pending[3].close()
+
+    def settle_switch(self, src, job):
+        """Settle a switch to src that needs no new capture.
+
+        'current': src is already playing; a pending switch to another
+        source is dropped (A -> B -> A stays on A). 'pending': a switch to
+        src is already queued and job takes it over. None: src must be opened.
+        """
+        with self.lock:
+            pending = self._switch_req
+            if src_is(self.source, src):
+                self._switch_req = None
+                settled = 'current'
+            elif pending is not None and src_is(pending[0], src):
+                self._switch_req = (pending[0], pending[1], job, pending[3])
+                settled = 'pending'
+            else:
+                return None
+        if pending is not None:
+            if settled == 'current':
+                self.pool.sources.release(pending[0], pending[1])
+                if pending[3] is not None:
+                    pending[3].close()
+            self.pool.sources.switched(pending[2], 'superseded by a newer switch')
+        return settled
 
-    def _ensure_writer(self, frame):
-        if not self.recording:
+    def seek(self, t):
+        """Queue a jump to t seconds into a file source; the capture loop applies it."""
+        if self.source_label != 'file':
+            return {"ok": False, "error": "Seeking needs a video file source", "stream": self.stream_id}
+        idx = max(0, int(round(float(t) * self.src_fps)))
+        if self.src_frames:
+            idx = min(idx, self.src_frames - 1)
+        self._seek_req = idx
+        cache = self.cache
+        return {"ok": True, "stream": self.stream_id, "frame": idx, "t": round(idx / self.src_fps, 3),
+                "cached": cache is not None and cache.has(idx)}
+
+    def job_updated(self, job):
+        self.source_job = job
+        self.job_updates.publish(job)
+
+    def _apply_switch(self):
+        with self.lock:
+            req, self._switch_req = self._switch_req, None
+            if req is None:
+                return
+            src, cap, job, cache = req
+            # the old capture goes back to the warm pool instead of being closed;
+            # swapped under the lock so settle_switch sees either side, never between
+            old_src, old_cap, old_cache = self.source, self.cap, self.cache
+            self.source, self.cap, self.cache = src, cap, cache
+        self.source_label = source_label(src)
+        self.src_fps = self._read_src_fps()
+        self.src_frames = self._read_src_frames()
+        self.frame_idx = 0
+        self._seek_req = None
+        # drop frames from the old source and reset writer size on new source
+        self._reset_pipeline()
+        if old_cache is not None:
+            old_cache.close()
+        self.pool.sources.release(old_src, old_cap)
+        self.pool.sources.switched(job)
+
+    def _apply_seek(self):
+        idx, self._seek_req = self._seek_req, None
+        if idx is None or self.source_label != 'file':
             return
-        if self.writer is None or self._record_reset:
-            # Try to use source FPS when available, else 30
-            src_fps = self.cap.get(cv2.CAP_PROP_FPS)
-            fps = float(src_fps) if src_fps and src_fps > 0 else 30.0
-            h, w = frame.shape[:2]
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            path = self._record_path or os.path.join(
-                LOG_DIR, f"record_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
-            )
-            # Close any existing writer before reopening
-            if self.writer is not None:
-                try:
-                    self.writer.release()
-                except Exception:
-                    pass
-            self.writer = cv2.VideoWriter(path, fourcc, fps, (w, h))
-            self._record_reset = False
-
-    def _run(self):
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        # containers seek to a keyframe; trust the position the decoder reports
+        pos = self.cap.get(cv2.CAP_PROP_POS_FRAMES)
+        self.frame_idx = int(pos) if pos >= 0 else idx
+        self._reset_pipeline()
+
+    def _reset_pipeline(self):
+        # frames in flight belong to the old source or position
+        self.infer_q.clear()
+        self.output_q.clear()
+        self._since_key = None
+        self._key_pending = False
+        self._key = None
+        self._last_arr = None
+        self._out_seq = self._infer_sent
+        if self.gate is not None:
+            self.gate.reset()
+
+    def _capture_loop(self):
+        stats = self.stats["capture"]
+        timing = STAGE_SECONDS.labels('capture', self.stream_id)
         while not self.stop_event.is_set():
             # Apply pending source switch
             if self._switch_req is not None:
-                try:
-                    self.cap.release()
-                except Exception:
-                    pass
-                new_src = self._switch_req
-                self.cap = cv2.VideoCapture(new_src)
-                if not self.cap.isOpened() and new_src == 0:
-                    try:
-                        self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-                    except Exception:
-                        pass
-                if not self.cap.isOpened():
-                    # Revert to previous if failed
-                    self.cap = cv2.VideoCapture(SOURCE)
-                else:
-                    self.source_label = 'webcam' if new_src == 0 else 'file'
-                # reset writer size on new source
-                self._record_reset = True
-                self._switch_req = None
+                self._apply_switch()
+            if self._seek_req is not None:
+                self._apply_seek()
+            if self.cache is not None and self.cache.model_key != self.cache_key():
+                # the profile changed: its boxes differ, so it has a cache of its own
+                old, self.cache = self.cache, self._open_cache(self.source, self.cap)
+                old.close()
 
+            start = time.time()
+            idx = self.frame_idx
             ok, frame = self.cap.read()
             if not ok:
-                if isinstance(SOURCE, str):
+                if self.source_label == 'file':
                     self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.frame_idx = 0
                     continue
                 break
-            start = time.time()
-            results = self.model.predict(source=frame, conf=0.6, verbose=False)
-            r = results[0]
-            annotated = r.plot()
+            self.frame_idx += 1
+            elapsed = time.time() - start
+            stats.tick(elapsed)
+            timing.observe(elapsed)
+            skip = self.pool.skip
+            cache = self.cache
+            cached = cache.get(idx) if cache is not None else None
+            # the pool stores what it infers for a file frame under (cache, index)
+            key = (cache, idx) if cache is not None else None
+            if cached is not None:
+                # seen before with these weights: replay the boxes, no model
+                self._since_key = None
+                self.output_q.put((frame, cached, datetime.datetime.utcnow().isoformat(), True, None), self.stop_event)
+            elif skip is None:
+                if self.gate is not None and self.gate.check(frame):
+                    # static scene: output reuses the detections and frame of the
+                    # last inference, which may still be in flight
+                    self.output_q.put((frame, REUSE, datetime.datetime.utcnow().isoformat(), False, self._infer_sent),
+                                      self.stop_event)
+                else:
+                    self._infer_sent += 1
+                    self.infer_q.put((frame, key, self._infer_sent), self.stop_event)
+            else:
+                if (not self._key_pending and (self._since_key is None or self._since_key + 1 >= skip.k)
+                        and not (self.gate is not None and self._since_key is not None and self.gate.check(frame))):
+                    self._key_pending = True
+                    self._since_key = 0
+                    # output annotates in place; the pool and tracker keep their own copy
+                    self._infer_sent += 1
+                    self.infer_q.put((frame.copy(), key, self._infer_sent), self.stop_event)
+                else:
+                    self._since_key += 1
+                self.output_q.put((frame, None, datetime.datetime.utcnow().isoformat(), False, None), self.stop_event)
+            if self.source_label == 'file':
+                # files decode far faster than real time; pace them like a camera
+                delay = 1.0 / self.src_fps - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+        # wake downstream stages so they notice shutdown / end of stream
+        self.stop_event.set()
 
-            # encode JPEG for HTTP stream
-            ok, buf = cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if not ok:
-                continue
+    def _output_loop(self):
+        stats = self.stats["output"]
+        t_output, t_draw, t_encode = (STAGE_SECONDS.labels(stage, self.stream_id) for stage in ('output', 'draw', 'encode'))
+        held = collections.deque()  # REUSE frames that arrived ahead of their inference
+        while not self.stop_event.is_set():
+            if held and held[0][4] <= self._out_seq:
+                item = held.popleft()
+            else:
+                item = self.output_q.get()
+                if item is None:
+                    continue
+                if item[1] is REUSE and item[4] > self._out_seq:
+                    held.append(item)
+                    if self.output_q.drop_oldest and len(held) > self.output_q.maxsize:
+                        held.popleft()
+                        self.output_q.dropped += 1
+                    continue
+            frame, arr, ts, keyframe, seq = item
+            start = time.time()
+            static = arr is REUSE
+            if static:
+                arr = self._last_arr if self._last_arr is not None else empty()
+            elif arr is None:
+                arr, keyframe = self._track(frame)
+            else:
+                self._last_arr = arr
+                if seq is not None:
+                    # also releases frames held for an inference whose output was dropped
+                    self._out_seq = max(self._out_seq, seq)
+            recorder = self.recorder
+            if recorder is not None and recorder.raw:
+                recorder.submit(frame if static else frame.copy(), ts, arr)
+            if static and self._latest_frame is not None:
+                # unchanged scene: keep the last annotated frame; only new variants need a JPEG
+                annotated = self._latest_frame
+                jpeg = self._encode_variants(annotated, missing_only=True) or self.latest_jpeg
+            else:
+                # the frame is ours from here on, so draw in place
+                t = time.time()
+                annotated = draw_boxes(frame, arr, self.pool.backend.names)
+                t_draw.observe(time.time() - t)
+                # encode JPEGs only for the variants someone is watching
+                t = time.time()
+                jpeg = self._encode_variants(annotated)
+                t_encode.observe(time.time() - t)
 
-            # compute FPS
-            dt = time.time() - start
-            fps = 1.0/dt if dt > 0 else 0.0
-            self.fps_smooth = 0.9*self.fps_smooth + 0.1*fps if self.fps_smooth else fps
-
-            # gather detections
-            dets = []
-            if hasattr(r, 'boxes') and r.boxes is not None:
-                boxes = r.boxes.xyxy.cpu().numpy()
-                confs = r.boxes.conf.cpu().numpy()
-                clss = r.boxes.cls.cpu().numpy().astype(int)
-                names = r.names
-                for (x1,y1,x2,y2), conf, cid in zip(boxes, confs, clss):
-                    dets.append({
-                        'class_id': int(cid),
-                        'class_name': names.get(int(cid), str(cid)) if isinstance(names, dict) else str(cid),
-                        'conf': float(conf),
-                        'x1': float(x1), 'y1': float(y1), 'x2': float(x2), 'y2': float(y2)
-                    })
-
-            ts = datetime.datetime.utcnow().isoformat()
-            # write CSV rows
+            # stable IDs for this frame's boxes; tracks that ended are logged once
+            track_ids, ended = self.tracks.update(ts, arr)
+            dets = to_dicts(arr, self.pool.backend.names, **({} if keyframe else {"tracked": True}))
+            for d, tid in zip(dets, track_ids.tolist()):
+                d["track_id"] = tid
+            if ended:
+                self._log_tracks(ended)
+            # queue rows for the log writer thread
             if dets:
-                with open(LOG_CSV, 'a', newline='') as f:
-                    import csv as _csv
-                    w = _csv.writer(f)
-                    for d in dets:
-                        w.writerow([ts, d['class_id'], d['class_name'], f"{d['conf']:.4f}", f"{d['x1']:.2f}", f"{d['y1']:.2f}", f"{d['x2']:.2f}", f"{d['y2']:.2f}"])
+                if self.log is not None:
+                    self.log.submit(ts, arr)
+                if self.store is not None and STORE_LOG != 'tracks':
+                    self.store.submit(ts, dets)
+
+            # hand the frame to the recording thread; annotated is not touched after this
+            if recorder is not None and not recorder.raw:
+                recorder.submit(annotated, ts)
 
-            # ensure mp4 writer and write frame (only if recording)
-            self._ensure_writer(annotated)
-            if self.recording and self.writer:
-                self.writer.write(annotated)
+            # output FPS is end-to-end delivered frame rate
+            elapsed = time.time() - start
+            stats.tick(elapsed)
+            t_output.observe(elapsed)
+            self.fps_smooth = stats.fps
 
+            if self.events is not None and jpeg is not None:
+                self.events.observe(ts, jpeg, dets)
             with self.lock:
-                self.latest_jpeg = buf.tobytes()
+                self.latest_jpeg = jpeg
+                self._latest_frame = annotated
                 self.latest_meta = {
                     "ts": ts,
                     "fps": round(self.fps_smooth, 2),
                     "detections": dets,
+                    "stream": self.stream_id,
                     "source": self.source_label,
-                    "recording": bool(self.recording),
+                    "source_job": self.source_job,
+                    "position": self._position(),
+                    "cache": self.cache.stats() if self.cache is not None else None,
+                    "recording": recorder is not None,
+                    "record": recorder.stats() if recorder is not None else None,
+                    "keyframe": keyframe,
+                    "stages": self.stage_stats(),
+                    "tiling": self.tiling.as_dict() if self.tiling.enabled else None,
+                    "static": static,
+                    "motion": self.gate.stats() if self.gate is not None else None,
+                    "tracks": self.tracks.stats(),
+                    "log": self.log.stats() if self.log is not None else None,
+                    "track_log": self.track_log.stats() if self.track_log is not None else None,
+                    "store": self.store.stats() if self.store is not None else None,
+                    "events": self.events.stats() if self.events is not None else None,
+                    "viewers": self.variants.stats(),
                 }
+            self.meta_updates.publish(self.latest_meta)
+            bus = self.bus
+            if bus is not None and jpeg is not None:
+                bus.publish(jpeg, json.dumps(self.latest_meta).encode())
 
-            time.sleep(0.001)
+    def _log_tracks(self, records):
+        if self.track_log is not None:
+            self.track_log.submit(records)
+        if self.store is not None and STORE_LOG != 'frames':
+            self.store.submit_tracks(records)
+
+    def _encode_variants(self, frame, missing_only=False):
+        """Encode each watched (width, quality) once; returns the default JPEG or None."""
+        active = self.variants.active()
+        if missing_only:
+            active = [(k, b) for k, b in active if b.latest()[1] is None]
+        if ((self.events is not None or self.bus is not None) and not missing_only
+                and not any(k == VariantSet.DEFAULT for k, _ in active)):
+            active.append((VariantSet.DEFAULT, None))  # the event pre-roll and the frame bus need it
+        default = None
+        resized = {}
+        for (w, q), frames in active:
+            jpeg = encode_jpeg(frame, w, q, resized)
+            if jpeg is None:
+                continue
+            if (w, q) == VariantSet.DEFAULT:
+                default = jpeg
+            if frames is not None:
+                frames.publish(jpeg)
+        return default
+
+    def _position(self):
+        if self.source_label != 'file':
+            return None
+        # frames in flight put this a queue length or two ahead of the frame shown
+        return {"frame": self.frame_idx, "t": round(self.frame_idx / self.src_fps, 3),
+                "duration": round(self.src_frames / self.src_fps, 3) if self.src_frames else None}
+
+    def set_keyframe(self, frame, dets):
+        with self.lock:
+            self._key = (frame, dets)
+        self._key_pending = False
+
+    def _track(self, frame):
+        with self.lock:
+            key, self._key = self._key, None
+        start = time.time()
+        if key is not None:
+            # detector boxes belong to an earlier frame; flow them forward
+            self.tracker.reset(*key)
+        dets = self.tracker.update(frame)
+        self.pool.skip.observe_track(time.time() - start)
+        return dets, key is not None
+
+    def stage_stats(self):
+        return {
+            "capture": self.stats["capture"].snapshot(),
+            "inference": self.pool.inference_stats(self.infer_q),
+            "output": self.stats["output"].snapshot(self.output_q),
+        }
 
     def get_frame(self):
         with self.lock:
+            if self.latest_jpeg is None and self._latest_frame is not None:
+                # nobody was watching, so the default variant was not encoded
+                ok, buf = cv2.imencode('.jpg', self._latest_frame, [int(cv2.IMWRITE_JPEG_QUALITY), VariantSet.DEFAULT[1]])
+                if ok:
+                    self.latest_jpeg = buf.tobytes()
             return self.latest_jpeg
 
     def get_meta(self):
@@ -186,84 +656,428 @@ class Detector:
 
     def stop(self):
         self.stop_event.set()
-        try:
-            self.thread.join(timeout=2)
-        except Exception:
-            pass
-        if self.writer:
+        for t in self.threads:
             try:
-                self.writer.release()
+                t.join(timeout=2)
             except Exception:
                 pass
+        if self.recorder is not None:
+            self.recorder.close()
         self.cap.release()
+        with self.lock:
+            pending, self._switch_req = self._switch_req, None
+        if pending is not None:
+            pending[1].release()
+            if pending[3] is not None:
+                pending[3].close()
+        if self.cache is not None:
+            self.cache.close()
+        # objects still in view end with the stream
+        self._log_tracks(self.tracks.flush())
+        if self.log is not None:
+            self.log.close()
+        if self.track_log is not None:
+            self.track_log.close()
+        if self.store is not None:
+            self.store.close()
+        if self.events is not None:
+            self.events.close()
 
-# create singleton on import
-_detector_singleton = None
 
-def get_detector():
-    global _detector_singleton
-    if _detector_singleton is None:
-        _detector_singleton = Detector()
-    return _detector_singleton
+class DetectorPool:
+    """Owns the model and N Detector streams; runs one batched predict per tick.
 
-# Public control methods (thread-safe requests)
-def use_camera(index: int = 0):
-    det = get_detector()
-    # Probe availability first, with DSHOW fallback
-    test = cv2.VideoCapture(index)
-    if not test.isOpened() and index == 0:
+    Each tick takes the newest pending frame from every stream, so a slow
+    camera never holds back the others and per-call overhead is paid once.
+    """
+
+    def __init__(self, sources=None, max_batch=None, batch_window=BATCH_WINDOW, target_fps=TARGET_FPS):
+        if DEFAULT_PROFILE not in PROFILE_NAMES:
+            raise RuntimeError(f"Unknown CORAL_PROFILE {DEFAULT_PROFILE!r}; expected one of {list(PROFILE_NAMES)}")
+        self.profile = PROFILE_NAMES[DEFAULT_PROFILE]
+        self.backend = get_backend(profile=self.profile.name)
+        self._profile_req = None  # (profile, loaded backend) swapped in between ticks
+        self._profile_lock = threading.Lock()
+        self.profile_loading = {}  # profile name -> loader thread
+        self.profile_errors = {}
+        self.governor = ProfileGovernor([p.name for p in PROFILES])
+        self.auto = GOVERNOR
+        # detections cached for file sources are only valid for these weights
+        self.weights_hash = weights_hash(model_path()) if DET_CACHE else None
+        self.sources = SourceManager(WARM_CAPTURES, PROBE_TTL, on_update=self._job_updated)
+        self.batch_window = batch_window
+        self.skip = SkipController(target_fps, MAX_SKIP) if target_fps > 0 else None
+        self.frame_ready = threading.Event()
+        self.stop_event = threading.Event()
+        self.stats = StageStats()
+        self.last_batch = 0
+        self._t_infer = STAGE_SECONDS.labels('inference', 'all')
+        self._batch_sizes = BATCH_SIZE.labels()
+        self.streams = []
+        for i, src in enumerate(sources if sources is not None else SOURCES):
+            self.streams.append(Detector(self, stream_id=i, source=src))
+        self.max_batch = max_batch or len(self.streams)
+        for s in self.streams:
+            s.start()
+        self.thread = threading.Thread(target=self._infer_loop, name='coral-inference', daemon=True)
+        self.thread.start()
+
+    def _infer_loop(self):
+        while not self.stop_event.is_set():
+            if self._profile_req is not None:
+                self._apply_profile()
+            if not self.frame_ready.wait(0.1):
+                continue
+            # give the other cameras a short window to deliver so they share this tick
+            deadline = time.time() + self.batch_window
+            while time.time() < deadline:
+                live = [s for s in self.streams if not s.stop_event.is_set()]
+                if all(s.infer_q.depth() for s in live):
+                    break
+                self.frame_ready.clear()
+                self.frame_ready.wait(max(0.0, deadline - time.time()))
+            self.frame_ready.clear()
+            batch = []
+            for s in self.streams:
+                if s.stop_event.is_set():
+                    continue
+                item = s.infer_q.get_nowait()
+                if item is not None:
+                    batch.append((s, *item))
+            if not batch:
+                continue
+            for i in range(0, len(batch), self.max_batch):
+                self._predict(batch[i:i + self.max_batch])
+
+    def _predict(self, batch):
+        start = time.time()
+        profile, backend = self.profile, self.backend
+        # whole frames share one predict call; tiled streams batch their own tiles
+        whole = [f for s, f, _, _ in batch if not s.tiling.enabled]
+        whole_dets = iter(backend.predict(whole, conf=profile.conf) if whole else [])
+        results = [predict_tiled(backend, f, s.tiling, profile.conf) if s.tiling.enabled else next(whole_dets)
+                   for s, f, _, _ in batch]
+        ts = datetime.datetime.utcnow().isoformat()
+        elapsed = time.time() - start
+        self.last_batch = len(batch)
+        self.stats.tick(elapsed)
+        self._t_infer.observe(elapsed)
+        self._batch_sizes.observe(len(batch))
+        if self.skip is not None:
+            self.skip.observe_inference(elapsed)
+        self._govern(profile, elapsed)
+        for (s, frame, key, seq), dets in zip(batch, results):
+            if key is not None and key[0].model_key == s.cache_key(profile):
+                key[0].put(key[1], dets)
+            if self.skip is not None:
+                # frames reach output through the tracker; hand it fresh boxes
+                s.set_keyframe(frame, dets)
+            else:
+                s.output_q.put((frame, dets, ts, True, seq), s.stop_event)
+
+    def set_profile(self, name, auto=False):
+        """Switch inference to a profile; one not loaded yet loads in the background first."""
+        profile = PROFILE_NAMES.get(name)
+        if profile is None:
+            return {"ok": False, "error": f"Unknown profile {name!r}; expected one of {list(PROFILE_NAMES)}"}
+        if not auto:
+            self.auto = False  # a manual choice overrides the governor until it is re-enabled
+        with self._profile_lock:
+            if profile is self.profile and self._profile_req is None:
+                return {"ok": True, "profile": name, "state": "active"}
+            if name in self.profile_loading:
+                return {"ok": True, "profile": name, "state": "loading"}
+            self.profile_errors.pop(name, None)
+            t = threading.Thread(target=self._load_profile, args=(profile,), name=f'coral-profile-{name}', daemon=True)
+            self.profile_loading[name] = t
+        t.start()
+        return {"ok": True, "profile": name, "state": "loading"}
+
+    def _load_profile(self, profile):
         try:
-            test = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        except Exception:
-            pass
-    try:
-        if not test.isOpened():
-            return {"ok": False, "error": f"Webcam {index} not available"}
-    finally:
+            backend = get_backend(profile=profile.name)
+            with self._profile_lock:
+                self._profile_req = (profile, backend)
+        except Exception as e:
+            self.profile_errors[profile.name] = str(e)
+            self.governor.disable(profile.name)
+        finally:
+            with self._profile_lock:
+                self.profile_loading.pop(profile.name, None)
+
+    def _apply_profile(self):
+        with self._profile_lock:
+            req, self._profile_req = self._profile_req, None
+        if req is not None:
+            self.profile, self.backend = req
+            self.governor.switched()
+
+    def _govern(self, profile, elapsed):
+        budget = 1.0 / GOVERNOR_FPS if GOVERNOR_FPS > 0 else 1.0 / max(
+            [s.src_fps for s in self.streams if not s.stop_event.is_set()] or [30.0])
+        target = self.governor.observe(profile.name, elapsed, budget)
+        if self.auto and target is not None and not self.profile_loading and self._profile_req is None:
+            self.set_profile(target, auto=True)
+            self.governor.switched()  # no further steps while it loads
+
+    def profile_stats(self):
+        return {
+            "profile": self.profile.name,
+            "auto": self.auto,
+            "profiles": [dict(p.as_dict(), loaded=p.name in _backends, loading=p.name in self.profile_loading,
+                              error=self.profile_errors.get(p.name)) for p in PROFILES],
+            "cost_ms": self.governor.stats(),
+        }
+
+    def _job_updated(self, job):
+        # switch jobs concern one stream; probes are shown to all of them
+        for s in self.streams:
+            if job["stream"] is None or job["stream"] == s.stream_id:
+                s.job_updated(job)
+
+    def inference_stats(self, queue=None):
+        out = self.stats.snapshot(queue)
+        out["batch"] = self.last_batch
+        out["backend"] = self.backend.name
+        out["profile"] = self.profile.name
+        out["skip_k"] = self.skip.k if self.skip is not None else 1
+        return out
+
+    def get(self, stream_id=0):
+        if 0 <= stream_id < len(self.streams):
+            return self.streams[stream_id]
+        return None
+
+    def stop(self):
+        self.stop_event.set()
         try:
-            test.release()
+            self.thread.join(timeout=2)
         except Exception:
             pass
-    det._switch_req = int(index)
-    return {"ok": True, "source": "webcam", "index": int(index)}
+        for s in self.streams:
+            s.stop()
+        self.sources.close()
+
+# Backends (one per profile) and the pool are per-process singletons created
+# on first use. The lock covers the CORAL_PRELOAD thread racing the first
+# request.
+_backends = {}  # profile name -> loaded backend
+_backend_warm_pid = {}  # profile name -> pid it was warmed up in
+_pool_singleton = None
+_init_lock = threading.RLock()
 
+def get_backend(warmup=True, profile=None):
+    """The process-wide backend for a profile (default CORAL_PROFILE), loaded once.
 
-def use_webcam():
-    return use_camera(0)
+    A backend loaded before the server forks its workers (CORAL_PRELOAD=model)
+    is inherited by every worker, so the weights pages stay shared
+    copy-on-write; warm-up runs after the fork, in the worker that uses it,
+    so no inference threads exist in the parent.
+    """
+    p = PROFILE_NAMES[profile or DEFAULT_PROFILE]
+    with _init_lock:
+        backend = _backends.get(p.name)
+        if backend is None:
+            backend = _backends[p.name] = load_backend(model_path(), p.backend, p.imgsz, THREADS, int8=p.int8)
+        if warmup and _backend_warm_pid.get(p.name) != os.getpid():
+            # first call pays for graph setup / allocation; do it before frames arrive
+            backend.warmup()
+            _backend_warm_pid[p.name] = os.getpid()
+        return backend
 
-def use_video():
-    det = get_detector()
-    path = _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
-    if not path:
-        return {"ok": False, "error": "Sample video not found"}
-    # probe video can be opened
-    test = cv2.VideoCapture(path)
+def get_pool():
+    global _pool_singleton
+    if _pool_singleton is None:
+        with _init_lock:
+            if _pool_singleton is None:
+                if BUS_MODE == 'client':
+                    from .shmbus import BusPool
+                    _pool_singleton = BusPool(BUS_PREFIX, BUS_CONTROL)
+                else:
+                    _pool_singleton = DetectorPool()
+    return _pool_singleton
+
+def preload(mode='1'):
+    """CORAL_PRELOAD hook: 'model' loads the weights now, anything else starts the pool in the background."""
+    if mode == 'model':
+        if BUS_MODE != 'client':  # bus clients never load the model
+            get_backend(warmup=False)
+        return None
+    t = threading.Thread(target=_preload_pool, name='coral-preload', daemon=True)
+    t.start()
+    return t
+
+def _preload_pool():
     try:
-        if not test.isOpened():
-            return {"ok": False, "error": f"Cannot open video: {path}"}
-    finally:
-        try:
-            test.release()
-        except Exception:
-            pass
-    det._switch_req = path
-    return {"ok": True, "source": "file", "path": path}
-
-def start_recording():
-    det = get_detector()
-    det.recording = True
-    det._record_path = os.path.join(
-        LOG_DIR, f"record_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        get_pool()
+    except Exception:
+        pass  # the first request retries and reports the error
+
+def _streams():
+    # scrapes never start the pool
+    pool = _pool_singleton
+    return list(pool.streams) if pool is not None else []
+
+
+def _queue_depths():
+    for s in _streams():
+        yield {"stream": s.stream_id, "queue": "infer"}, s.infer_q.depth()
+        yield {"stream": s.stream_id, "queue": "output"}, s.output_q.depth()
+
+
+def _dropped_frames():
+    for s in _streams():
+        yield {"stream": s.stream_id, "where": "infer_queue"}, s.infer_q.dropped
+        yield {"stream": s.stream_id, "where": "output_queue"}, s.output_q.dropped
+        if s.log is not None:
+            yield {"stream": s.stream_id, "where": "log"}, s.log.dropped
+        if s.track_log is not None:
+            yield {"stream": s.stream_id, "where": "track_log"}, s.track_log.dropped
+        if s.store is not None:
+            yield {"stream": s.stream_id, "where": "store"}, s.store.dropped
+        recorder = s.recorder
+        if recorder is not None:
+            yield {"stream": s.stream_id, "where": "record"}, recorder.dropped
+        if s.events is not None:
+            yield {"stream": s.stream_id, "where": "events"}, s.events.dropped
+
+
+Callback('coral_queue_depth', 'Items waiting in the hand-off queue in front of a stage.', _queue_depths)
+Callback('coral_dropped_frames', 'Frames or rows dropped because a queue was full.', _dropped_frames, kind='counter')
+Callback('coral_static_frames', 'Frames that skipped inference because the scene was static.',
+         lambda: [({"stream": s.stream_id}, s.gate.skipped) for s in _streams() if s.gate is not None], kind='counter')
+Callback('coral_inference_profile', 'Inference profile in use (1) or not (0).',
+         lambda: [({"profile": p.name}, int(_pool_singleton.profile is p)) for p in PROFILES]
+         if hasattr(_pool_singleton, 'profile') else [])
+Callback('coral_event_clip_errors', 'Event clips that failed to write.',
+         lambda: [({"stream": s.stream_id}, s.events.errors) for s in _streams() if s.events is not None], kind='counter')
+Callback('coral_mjpeg_clients', 'Connected /video_feed viewers.',
+         lambda: [({"stream": s.stream_id}, sum(s.variants.stats().values())) for s in _streams()])
+
+def get_detector(stream_id: int = 0):
+    return get_pool().get(stream_id)
+
+def list_streams():
+    pool = get_pool()
+    return {"ok": True, "streams": [s.get_meta() for s in pool.streams]}
+
+# Public control methods (thread-safe requests)
+def _forwarded(fn):
+    # a bus client has no local streams; the detector process runs the call
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if BUS_MODE == 'client':
+            return get_pool().call(fn.__name__, *args, **kwargs)
+        return fn(*args, **kwargs)
+    return wrapper
+
+def _no_stream(stream_id):
+    return {"ok": False, "error": f"Unknown stream {stream_id}"}
+
+@_forwarded
+def use_camera(index: int = 0, stream_id: int = 0):
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    # opened and verified in the background; the outcome arrives as a job update
+    job = det.pool.sources.switch(det, int(index))
+    return {"ok": True, "source": "webcam", "index": int(index), "stream": stream_id, "job": job}
+
+
+@_forwarded
+def use_webcam(stream_id: int = 0):
+    return use_camera(0, stream_id)
+
+@_forwarded
+def use_video(stream_id: int = 0, path=None):
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    if path:
+        # a recording or clip under LOG_DIR, given relative to it
+        root = os.path.realpath(LOG_DIR)
+        path = os.path.realpath(os.path.join(root, path))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return {"ok": False, "error": "Video not found in the log directory"}
+    else:
+        path = _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
+        if not path:
+            return {"ok": False, "error": "Sample video not found"}
+    job = det.pool.sources.switch(det, path)
+    return {"ok": True, "source": "file", "path": path, "stream": stream_id, "job": job}
+
+@_forwarded
+def seek(t: float, stream_id: int = 0):
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    return det.seek(t)
+
+@_forwarded
+def track_counts(minutes: int = 60, stream_id: int = 0):
+    # unique tracks per class for the last `minutes` minutes, from memory (no database needed)
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    return dict(det.tracks.stats(), ok=True, stream=stream_id, minutes=det.tracks.minute_counts(max(1, int(minutes))))
+
+@_forwarded
+def get_profiles():
+    return dict(get_pool().profile_stats(), ok=True)
+
+@_forwarded
+def set_profile(name=None, auto=None):
+    pool = get_pool()
+    out = pool.set_profile(name) if name else {"ok": True}
+    if auto is not None and out["ok"]:
+        pool.auto = bool(auto)
+        if pool.auto:
+            pool.governor.switched()  # let the governor measure before its first step
+    return dict(pool.profile_stats(), **out)
+
+@_forwarded
+def job_status(job_id: int):
+    job = get_pool().sources.job(job_id)
+    if job is None:
+        return {"ok": False, "error": f"Unknown job {job_id}"}
+    return {"ok": True, "job": job}
+
+@_forwarded
+def probe_sources(indexes):
+    # opens each camera on the SourceManager thread; results land in list_sources()
+    return {"ok": True, "job": get_pool().sources.probe([int(i) for i in indexes])}
+
+@_forwarded
+def list_sources():
+    pool = get_pool()
+    out = {"ok": True, "streams": [{"stream": s.stream_id, "source": s.source} for s in pool.streams]}
+    out.update(pool.sources.stats())
+    return out
+
+@_forwarded
+def start_recording(stream_id: int = 0, raw=None):
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    if det.recorder is not None:
+        return {"ok": True, "path": det.recorder.path, "raw": det.recorder.raw, "stream": stream_id}
+    suffix = '' if stream_id == 0 else f'_s{stream_id}'
+    path = os.path.join(LOG_DIR, f"record_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}")
+    det.recorder = Recorder(
+        path, det.src_fps, names=det.pool.backend.names, segment_secs=RECORD_SEGMENT_SECS,
+        raw=RECORD_RAW if raw is None else raw, queue_size=RECORD_QUEUE_SIZE,
     )
-    det._record_reset = True
-    return {"ok": True, "path": det._record_path}
+    return {"ok": True, "path": path, "raw": det.recorder.raw, "stream": stream_id}
 
-def stop_recording():
-    det = get_detector()
-    det.recording = False
-    try:
-        if det.writer:
-            det.writer.release()
-    finally:
-        det.writer = None
-    return {"ok": True}
+@_forwarded
+def stop_recording(stream_id: int = 0):
+    det = get_detector(stream_id)
+    if det is None:
+        return _no_stream(stream_id)
+    recorder, det.recorder = det.recorder, None
+    if recorder is None:
+        return {"ok": True, "stream": stream_id}
+    # flushes the queued frames and closes the open segment
+    recorder.close()
+    return {"ok": True, "path": recorder.path, "segments": recorder.segments,
+            "frames": recorder.frames, "dropped": recorder.dropped, "stream": stream_id}
@@ -0,0 +1,60 @@
+import numpy as np
+
+# One record per box for a whole frame; class names live in the model's
+# names table and are only looked up when serializing.
+DET_DTYPE = np.dtype([
+    ('class_id', np.int16), ('conf', np.float32),
+    ('x1', np.float32), ('y1', np.float32), ('x2', np.float32), ('y2', np.float32),
+])
+COORDS = ['x1', 'y1', 'x2', 'y2']
+
+
+def empty():
+    return np.zeros(0, DET_DTYPE)
+
+
+def from_arrays(xyxy, conf, cls):
+    out = np.empty(len(conf), DET_DTYPE)
+    out['class_id'] = cls
+    out['conf'] = conf
+    for i, c in enumerate(COORDS):
+        out[c] = xyxy[:, i]
+    return out
+
+
+def from_results(r):
+    """Ultralytics Results -> detection array, with one device->host copy."""
+    boxes = getattr(r, 'boxes', None)
+    if boxes is None or len(boxes) == 0:
+        return empty()
+    data = boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls (+ track id)
+    return from_arrays(data[:, :4], data[:, 4], data[:, 5])
+
+
+def from_dicts(dets):
+    out = np.empty(len(dets), DET_DTYPE)
+    for name in DET_DTYPE.names:
+        out[name] = [d[name] for d in dets]
+    return out
+
+
+def names_of(dets):
+    return {d['class_id']: d['class_name'] for d in dets}
+
+
+def class_name(names, cid):
+    return names.get(cid, str(cid)) if isinstance(names, dict) else str(cid)
+
+
+def to_dicts(arr, names, **extra):
+    """Detection array -> JSON-ready list of dicts (the meta/API shape)."""
+    return [
+        {'class_id': cid, 'class_name': class_name(names, cid), 'conf': conf,
+         'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2, **extra}
+        for cid, conf, x1, y1, x2, y2 in arr.tolist()
+    ]
+
+
+def csv_rows(ts, arr, names):
+    return [[ts, cid, class_name(names, cid), f"{conf:.4f}", f"{x1:.2f}", f"{y1:.2f}", f"{x2:.2f}", f"{y2:.2f}"]
+            for cid, conf, x1, y1, x2, y2 in arr.tolist()]
@@ -0,0 +1,205 @@
+import collections, datetime, json, logging, os, queue, threading, time
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rules(spec):
+    """'bleached>0.8x5;1>0.9x3' -> rules (class name or id, min conf, consecutive frames)."""
+    rules = []
+    for part in (spec or '').split(';'):
+        part = part.strip()
+        if not part:
+            continue
+        cls, _, rest = part.partition('>')
+        conf, _, frames = rest.partition('x')
+        cls = cls.strip()
+        rules.append({
+            "name": part,
+            "class": int(cls) if cls.isdigit() else cls,
+            "min_conf": float(conf or 0),
+            "frames": max(1, int(frames or 1)),
+        })
+    return rules
+
+
+class FrameRing:
+    """The last `seconds` of encoded frames, also capped at max_bytes."""
+
+    def __init__(self, seconds, max_bytes):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.items = collections.deque()  # (epoch, jpeg)
+        self.bytes = 0
+
+    def append(self, t, jpeg):
+        self.items.append((t, jpeg))
+        self.bytes += len(jpeg)
+        while self.items and (t - self.items[0][0] > self.seconds or self.bytes > self.max_bytes):
+            self.bytes -= len(self.items.popleft()[1])
+
+    def snapshot(self):
+        return list(self.items)
+
+
+class EventClipper:
+    """Detection-triggered clips built from a pre-roll ring of JPEG frames.
+
+    observe() runs on the output loop and only does bookkeeping: it keeps
+    the ring, counts consecutive matching frames per rule and, once a rule
+    fires, collects post-roll frames (extended while the rule keeps
+    matching, up to max_secs). Finished clips go through a bounded queue
+    to a writer thread that decodes the JPEGs into
+    <log_dir>/event_<stamp>_<rule><suffix>.mp4 with a .json description.
+    """
+
+    def __init__(self, log_dir, rules, stream=0, suffix='', pre_secs=5.0, post_secs=5.0, cooldown_secs=10.0,
+                 max_secs=60.0, ring_bytes=64 * 1024 * 1024, queue_size=4):
+        self.log_dir = log_dir
+        self.rules = rules
+        self.stream = stream
+        self.suffix = suffix
+        self.post_secs = post_secs
+        self.cooldown_secs = cooldown_secs
+        self.max_secs = max_secs
+        self.ring = FrameRing(pre_secs, ring_bytes)
+        self._streak = [0] * len(rules)
+        self._last_fired = [0.0] * len(rules)
+        self._active = {}  # rule index -> open clip
+        self.q = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.clips = 0
+        self.errors = 0
+        self.last_error = None
+        os.makedirs(log_dir, exist_ok=True)
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'coral-events{suffix}', daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _matches(rule, dets):
+        key = 'class_id' if isinstance(rule["class"], int) else 'class_name'
+        return any(d[key] == rule["class"] and d['conf'] >= rule["min_conf"] for d in dets)
+
+    def observe(self, ts, jpeg, dets):
+        now = time.time()
+        self.ring.append(now, jpeg)
+        for i, rule in enumerate(self.rules):
+            hit = self._matches(rule, dets)
+            self._streak[i] = self._streak[i] + 1 if hit else 0
+            clip = self._active.get(i)
+            if clip is not None:
+                clip["frames"].append((now, jpeg))
+                if hit:
+                    clip["until"] = min(now + self.post_secs, clip["started"] + self.max_secs)
+                if now >= clip["until"]:
+                    self._finish(self._active.pop(i))
+            elif self._streak[i] >= rule["frames"] and now - self._last_fired[i] >= self.cooldown_secs:
+                self._last_fired[i] = now
+                self._active[i] = {
+                    "rule": rule["name"], "ts": ts, "started": now, "until": now + self.post_secs,
+                    "frames": self.ring.snapshot(),
+                    "trigger": [d for d in dets if self._matches(rule, [d])],
+                }
+
+    def _finish(self, clip):
+        try:
+            self.q.put_nowait(clip)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "rules": [r["name"] for r in self.rules],
+            "active": len(self._active),
+            "queue": self.q.qsize(),
+            "clips": self.clips,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "preroll_frames": len(self.ring.items),
+            "preroll_bytes": self.ring.bytes,
+        }
+
+    def _run(self):
+        while not self._stop.is_set() or not self.q.empty():
+            try:
+                clip = self.q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                self._write(clip)
+            except Exception as e:
+                # the clip is lost, but the writer keeps serving later events
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.exception("event clip %r (stream %s) could not be written", clip["rule"], self.stream)
+
+    def _write(self, clip):
+        frames = clip["frames"]
+        if not frames:
+            return
+        span = frames[-1][0] - frames[0][0]
+        fps = (len(frames) - 1) / span if span > 0 else 30.0
+        stamp = datetime.datetime.fromtimestamp(clip["started"]).strftime('%Y%m%d_%H%M%S')
+        rule = ''.join(c if c.isalnum() else '_' for c in clip["rule"])
+        base = os.path.join(self.log_dir, f"event_{stamp}_{rule}{self.suffix}")
+        writer = None
+        for _, jpeg in frames:
+            img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                continue
+            if writer is None:
+                writer = cv2.VideoWriter(base + '.mp4', cv2.VideoWriter_fourcc(*'mp4v'), fps, (img.shape[1], img.shape[0]))
+                if not writer.isOpened():
+                    raise OSError(f"cannot open {base}.mp4 for writing")
+            writer.write(img)
+        if writer is None:
+            return
+        writer.release()
+        with open(base + '.json', 'w') as f:
+            json.dump({
+                "file": os.path.basename(base) + '.mp4',
+                "rule": clip["rule"],
+                "stream": self.stream,
+                "ts": clip["ts"],
+                "start": datetime.datetime.utcfromtimestamp(frames[0][0]).isoformat(),
+                "end": datetime.datetime.utcfromtimestamp(frames[-1][0]).isoformat(),
+                "preroll_secs": round(clip["started"] - frames[0][0], 2),
+                "frames": len(frames),
+                "fps": round(fps, 2),
+                "trigger": clip["trigger"],
+            }, f)
+        self.clips += 1
+
+    def close(self, timeout=5):
+        # clips still collecting post-roll are written with what they have
+        for clip in self._active.values():
+            self._finish(clip)
+        self._active.clear()
+        self._stop.set()
+        try:
+            self.thread.join(timeout=timeout)
+        except Exception:
+            pass
+
+
+def list_clips(log_dir, stream=None, limit=100):
+    """Clip descriptions, newest first, optionally for one stream."""
+    try:
+        names = [n for n in os.listdir(log_dir) if n.startswith('event_') and n.endswith('.json')]
+    except OSError:
+        return []
+    out = []
+    for name in sorted(names, reverse=True):
+        try:
+            with open(os.path.join(log_dir, name)) as f:
+                clip = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if stream is None or clip.get("stream") == stream:
+            out.append(clip)
+        if len(out) >= limit:
+            break
+    return out
@@ -0,0 +1,379 @@
+import asyncio, base64, datetime, json, os, resource, socket, struct, threading, time
+import cv2
+import numpy as np
+from .broadcast import Broadcaster, VariantSet
+
+# Load test for /video_feed and ws/detections/ (`manage.py load_test`).
+#
+# The ASGI app runs under Daphne in a child process whose detector pool is
+# replaced by StubPool: synthetic frames at a fixed rate, no camera, no
+# weights. Every JPEG carries its publish time in a COM segment and every
+# meta a `t_pub` field, so clients measure end-to-end frame age without
+# decoding. Clients are plain asyncio connections, added step by step; each
+# step reports delivered FPS per client, frame age and the server's CPU/RSS.
+
+STAMP = struct.Struct('>d')
+COM = b'\xff\xfe' + struct.pack('>H', 2 + STAMP.size)  # JPEG comment segment holding the stamp
+
+
+def stamp(jpeg, t):
+    # right after SOI, where a comment segment is always valid
+    return jpeg[:2] + COM + STAMP.pack(t) + jpeg[2:]
+
+
+def read_stamp(jpeg):
+    if jpeg[2:6] != COM:
+        return None
+    return STAMP.unpack_from(jpeg, 6)[0]
+
+
+def synthetic_frames(n, width, height, quality=80):
+    """n JPEGs of a textured scene with two moving boxes, and their detections."""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8)
+    base = cv2.resize(base, (width, height), interpolation=cv2.INTER_LINEAR)
+    out = []
+    for i in range(n):
+        frame = base.copy()
+        x = int((width - 120) * (0.5 + 0.5 * np.sin(2 * np.pi * i / n)))
+        y = int((height - 90) * (0.5 + 0.5 * np.cos(2 * np.pi * i / n)))
+        boxes = [(x, y, x + 120, y + 90), (width - x - 100, height // 3, width - x, height // 3 + 80)]
+        for j, (x1, y1, x2, y2) in enumerate(boxes):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 255) if j else (255, 0, 255), 2)
+        ok, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        dets = [{'class_id': j, 'class_name': ('bleached', 'healthy')[j], 'conf': 0.9 - 0.1 * j,
+                 'x1': float(x1), 'y1': float(y1), 'x2': float(x2), 'y2': float(y2)}
+                for j, (x1, y1, x2, y2) in enumerate(boxes)]
+        out.append((buf.tobytes(), dets))
+    return out
+
+
+class StubStream:
+    """Stands in for a Detector: same VariantSet, broadcasters and getters, synthetic frames."""
+
+    def __init__(self, stream_id, fps, frames):
+        self.stream_id = stream_id
+        self.fps = fps
+        self._frames = frames
+        self.lock = threading.Lock()
+        self.latest_jpeg = None
+        self.latest_meta = {"ts": None, "fps": 0.0, "detections": [], "stream": stream_id}
+        self.variants = VariantSet()
+        self.frames = self.variants.default
+        self.meta_updates = Broadcaster()
+        self.job_updates = Broadcaster()
+        self.stop_event = threading.Event()
+        self.published = 0
+        self.thread = threading.Thread(target=self._run, name=f'coral-stub-{stream_id}', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_t = time.time()
+        while not self.stop_event.is_set():
+            jpeg, dets = self._frames[self.published % len(self._frames)]
+            now = time.time()
+            jpeg = stamp(jpeg, now)
+            meta = {"ts": datetime.datetime.utcnow().isoformat(), "t_pub": now, "fps": self.fps,
+                    "detections": dets, "stream": self.stream_id, "source": "stub"}
+            with self.lock:
+                self.latest_jpeg = jpeg
+                self.latest_meta = meta
+            # scaled variants get the native frame: the stub measures delivery, not encoding
+            for _, frames in self.variants.active():
+                frames.publish(jpeg)
+            self.meta_updates.publish(meta)
+            self.published += 1
+            next_t += period
+            delay = next_t - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_t = time.time()  # fell behind; do not burst to catch up
+
+    def get_frame(self):
+        with self.lock:
+            return self.latest_jpeg
+
+    def get_meta(self):
+        with self.lock:
+            return self.latest_meta
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class StubPool:
+    def __init__(self, streams=1, fps=30.0, width=640, height=480):
+        frames = synthetic_frames(max(2, int(fps * 2)), width, height)
+        self.streams = [StubStream(i, fps, frames) for i in range(streams)]
+
+    def get(self, stream_id=0):
+        if 0 <= stream_id < len(self.streams):
+            return self.streams[stream_id]
+        return None
+
+    def stop(self):
+        for s in self.streams:
+            s.stop()
+
+
+def serve(host, port, streams, fps, width, height):
+    """Child process: Daphne on host:port with the stub pool installed."""
+    from . import detector
+    detector._pool_singleton = StubPool(streams, fps, width, height)
+    from daphne.endpoints import build_endpoint_description_strings
+    from daphne.server import Server  # installs the Twisted asyncio reactor; child only
+    from channels.routing import get_default_application
+    Server(application=get_default_application(), endpoints=build_endpoint_description_strings(host=host, port=port),
+           verbosity=0).run()
+
+
+def free_port(host='127.0.0.1'):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def wait_listening(host, port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class ProcStats:
+    """CPU seconds and RSS of a process, from /proc (Linux); None elsewhere."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+    def cpu_seconds(self):
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self.tick  # utime + stime
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def rss_mb(self):
+        try:
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return round(int(line.split()[1]) / 1024.0, 1)
+        except (OSError, ValueError):
+            pass
+        return None
+
+
+class Client:
+    """One simulated viewer; counts frames and their age while `recording`."""
+
+    def __init__(self, kind, cid):
+        self.kind = kind
+        self.cid = cid
+        self.frames = 0
+        self.ages = []
+        self.error = None
+        self.connected = False
+        self.recording = False
+        self.task = None
+
+    def reset(self):
+        self.frames = 0
+        self.ages = []
+
+    def got(self, t_pub):
+        if not self.recording:
+            return
+        self.frames += 1
+        if t_pub is not None:
+            self.ages.append(time.time() - t_pub)
+
+
+async def _http_head(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = head.split(b'\r\n', 1)[0].decode(errors='replace')
+    return status, head
+
+
+async def mjpeg_client(client, host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        # HTTP/1.0 keeps the body unchunked: multipart parts straight off the socket
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}\r\n\r\n".encode())
+        await writer.drain()
+        status, _ = await _http_head(reader)
+        if ' 200 ' not in status + ' ':
+            raise ConnectionError(status)
+        client.connected = True
+        while True:
+            part = await reader.readuntil(b'\r\n\r\n')
+            length = None
+            for line in part.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length is None:
+                raise ConnectionError('multipart part without Content-Length')
+            jpeg = await reader.readexactly(length)
+            await reader.readexactly(2)
+            client.got(read_stamp(jpeg))
+    finally:
+        client.connected = False
+        writer.close()
+
+
+def _ws_frame(opcode, payload=b''):
+    # client frames are masked (RFC 6455 5.3)
+    mask = os.urandom(4)
+    head = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        head += bytes([0x80 | n])
+    elif n < 1 << 16:
+        head += bytes([0x80 | 126]) + struct.pack('>H', n)
+    else:
+        head += bytes([0x80 | 127]) + struct.pack('>Q', n)
+    return head + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+async def ws_client(client, host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode())
+        await writer.drain()
+        status, _ = await _http_head(reader)
+        if ' 101 ' not in status + ' ':
+            raise ConnectionError(status)
+        client.connected = True
+        buf = b''
+        while True:
+            b0, b1 = await reader.readexactly(2)
+            n = b1 & 0x7f
+            if n == 126:
+                n = struct.unpack('>H', await reader.readexactly(2))[0]
+            elif n == 127:
+                n = struct.unpack('>Q', await reader.readexactly(8))[0]
+            payload = await reader.readexactly(n)
+            opcode = b0 & 0x0f
+            if opcode == 8:
+                raise ConnectionError('closed by server')
+            if opcode == 9:
+                writer.write(_ws_frame(10, payload))
+                continue
+            if opcode in (0, 1):
+                buf += payload
+                if not b0 & 0x80:
+                    continue  # fragmented; wait for the final frame
+                msg, buf = buf, b''
+                try:
+                    meta = json.loads(msg)
+                except ValueError:
+                    continue
+                if 'job' not in meta:
+                    client.got(meta.get('t_pub'))
+    finally:
+        client.connected = False
+        writer.close()
+
+
+async def _client_task(client, host, port, path):
+    run = mjpeg_client if client.kind == 'mjpeg' else ws_client
+    try:
+        await run(client, host, port, path)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        client.error = f"{type(e).__name__}: {e}"
+
+
+def _pct(values, scale=1000.0):
+    a = np.asarray(values, dtype=np.float64) * scale
+    if not len(a):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"n": int(len(a)), "p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "mean": round(float(a.mean()), 2), "min": round(float(a.min()), 2), "max": round(float(a.max()), 2)}
+
+
+def _kind_report(clients, duration):
+    fps = [c.frames / duration for c in clients]
+    return {
+        "clients": len(clients),
+        "connected": sum(c.connected for c in clients),
+        "errors": sum(c.error is not None for c in clients),
+        "fps": _pct(fps, 1.0),
+        "age_ms": _pct([a for c in clients for a in c.ages]),
+    }
+
+
+async def run_steps(host, port, steps, kind='both', duration=5.0, warmup=1.0, fps=30.0, stream_id=0,
+                    ws_mode='full', width=None, server=None, max_age_ms=250.0, min_fps_ratio=0.9, log=None):
+    """Ramp to each client count in steps, measuring every step for duration seconds."""
+    feed = f"/video_feed/{stream_id}" + (f"?w={width}" if width else '')
+    ws_path = f"/ws/detections/{stream_id}/" + ('?mode=compact' if ws_mode == 'compact' else '')
+    clients, results = [], []
+    sustained = degrades_at = None
+    try:
+        for n in steps:
+            while len(clients) < n:
+                k = kind if kind != 'both' else ('mjpeg' if len(clients) % 2 == 0 else 'ws')
+                c = Client(k, len(clients))
+                c.task = asyncio.ensure_future(_client_task(c, host, port, feed if k == 'mjpeg' else ws_path))
+                clients.append(c)
+            await asyncio.sleep(warmup)
+            for c in clients:
+                c.reset()
+                c.recording = True
+            cpu0, wall0 = server.cpu_seconds() if server else None, time.time()
+            self_cpu0 = sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+            await asyncio.sleep(duration)
+            for c in clients:
+                c.recording = False
+            wall = time.time() - wall0
+            cpu1 = server.cpu_seconds() if server else None
+            step = {"clients": n, "duration_s": round(wall, 2)}
+            for k in ('mjpeg', 'ws'):
+                group = [c for c in clients if c.kind == k]
+                if group:
+                    step[k] = _kind_report(group, wall)
+            step["server"] = {
+                "cpu_pct": round(100.0 * (cpu1 - cpu0) / wall, 1) if cpu0 is not None and cpu1 is not None else None,
+                "rss_mb": server.rss_mb() if server else None,
+            }
+            step["load_generator_cpu_pct"] = round(
+                100.0 * (sum(resource.getrusage(resource.RUSAGE_SELF)[:2]) - self_cpu0) / wall, 1)
+            reasons = []
+            for k in ('mjpeg', 'ws'):
+                r = step.get(k)
+                if r is None:
+                    continue
+                if r["errors"]:
+                    reasons.append(f"{r['errors']} {k} client(s) failed")
+                if r["fps"].get("mean") is not None and r["fps"]["mean"] < min_fps_ratio * fps:
+                    reasons.append(f"{k} fps {r['fps']['mean']} < {round(min_fps_ratio * fps, 1)}")
+                if r["age_ms"].get("p95") is not None and r["age_ms"]["p95"] > max_age_ms:
+                    reasons.append(f"{k} p95 age {r['age_ms']['p95']} ms > {max_age_ms} ms")
+            step["degraded"] = reasons or None
+            if reasons and degrades_at is None:
+                degrades_at = n
+            elif not reasons and degrades_at is None:
+                sustained = n
+            results.append(step)
+            if log is not None:
+                log(step)
+        errors = sorted({c.error for c in clients if c.error})[:5]
+    finally:
+        for c in clients:
+            c.task.cancel()
+        await asyncio.gather(*(c.task for c in clients), return_exceptions=True)
+    return {"steps": results, "sustained_clients": sustained, "degrades_at_clients": degrades_at,
+            "sample_errors": errors}
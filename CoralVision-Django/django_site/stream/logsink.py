@@ -0,0 +1,193 @@
+import os, threading, time, csv, gzip, queue, datetime
+import numpy as np
+from .dets import class_name, csv_rows
+from .tracks import TRACK_FIELDS, track_rows
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # parquet output is optional
+    pa = pq = None
+
+HEADER = ['timestamp', 'class_id', 'class_name', 'conf', 'x1', 'y1', 'x2', 'y2']
+FORMATS = ('csv', 'csv.gz', 'parquet')
+
+
+def _parquet_table(batch, names):
+    arr = np.concatenate([a for _, a in batch])
+    ts = np.repeat(np.array([t for t, _ in batch], dtype=object), [len(a) for _, a in batch])
+    cols = {'timestamp': pa.array(ts, pa.string()),
+            'class_id': pa.array(arr['class_id'].astype(np.int32)),
+            'class_name': pa.array([class_name(names, c) for c in arr['class_id'].tolist()], pa.string())}
+    for c in HEADER[3:]:
+        cols[c] = pa.array(arr[c])
+    return pa.table(cols)
+
+
+class LogSink:
+    """Background detection log writer.
+
+    submit() takes a frame's detection array and never blocks: frames go into a bounded queue (a full queue
+    counts a drop) and a writer thread batches rows, flushing every
+    flush_rows rows or flush_secs seconds. Files rotate when they pass
+    rotate_bytes or, with rotate_hourly, when the hour changes; each file
+    is named <prefix>_<YYYYmmdd_HHMMSS><suffix>.<fmt>, with a _<n> sequence
+    number after the stamp when that name is taken (several size rotations
+    within one second, or a restart).
+    """
+
+    header = HEADER
+
+    def __init__(self, log_dir, names=None, prefix='detections', suffix='', fmt='csv', flush_rows=500, flush_secs=1.0,
+                 rotate_bytes=64 * 1024 * 1024, rotate_hourly=True, queue_size=1000):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown log format {fmt!r}; expected one of {FORMATS}")
+        if fmt == 'parquet' and pq is None:
+            raise RuntimeError('Parquet detection logs need pyarrow (pip install pyarrow)')
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        self.names = names if names is not None else {}
+        self.prefix = prefix
+        self.suffix = suffix
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.flush_secs = flush_secs
+        self.rotate_bytes = rotate_bytes
+        self.rotate_hourly = rotate_hourly
+        self.q = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.rows_written = 0
+        self.files = 0
+        self.path = None
+        self._fh = None
+        self._writer = None
+        self._hour = None
+        self._buf = []  # (ts, dets) per frame
+        self._buf_rows = 0
+        self._last_flush = time.time()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'coral-log{suffix}', daemon=True)
+        self.thread.start()
+
+    def submit(self, ts, dets):
+        try:
+            self.q.put_nowait((ts, dets))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "queue": self.q.qsize(),
+            "dropped": self.dropped,
+            "rows": self.rows_written,
+            "file": os.path.basename(self.path) if self.path else None,
+        }
+
+    def _run(self):
+        while not self._stop.is_set() or not self.q.empty():
+            try:
+                ts, dets = self.q.get(timeout=0.2)
+                self._buf.append((ts, dets))
+                self._buf_rows += len(dets)
+            except queue.Empty:
+                pass
+            if self._buf and (self._buf_rows >= self.flush_rows or time.time() - self._last_flush >= self.flush_secs):
+                self._flush()
+        if self._buf:
+            self._flush()
+        self._close()
+
+    def _flush(self):
+        now = datetime.datetime.now()
+        if self._fh is None or (self.rotate_hourly and now.strftime('%Y%m%d%H') != self._hour):
+            self._open(now)
+        batch, n = self._buf, self._buf_rows
+        self._buf, self._buf_rows = [], 0
+        if self.fmt == 'parquet':
+            self._writer.write_table(self._table(batch))
+        else:
+            for ts, dets in batch:
+                self._writer.writerows(self._rows(ts, dets))
+            self._fh.flush()
+        self.rows_written += n
+        self._last_flush = time.time()
+        try:
+            if os.path.getsize(self.path) >= self.rotate_bytes:
+                self._close()
+        except OSError:
+            pass
+
+    def _open(self, now):
+        self._close()
+        stamp = now.strftime('%Y%m%d_%H%M%S')
+        self.path = os.path.join(self.log_dir, f"{self.prefix}_{stamp}{self.suffix}.{self.fmt}")
+        seq = 0
+        while os.path.exists(self.path):
+            seq += 1
+            self.path = os.path.join(self.log_dir, f"{self.prefix}_{stamp}_{seq}{self.suffix}.{self.fmt}")
+        if self.fmt == 'parquet':
+            self._fh = self.path
+            self._writer = pq.ParquetWriter(self.path, self._schema(), compression='zstd')
+        else:
+            if self.fmt == 'csv.gz':
+                self._fh = gzip.open(self.path, 'at', newline='')
+            else:
+                self._fh = open(self.path, 'a', newline='')
+            self._writer = csv.writer(self._fh)
+            self._writer.writerow(self.header)
+        self._hour = now.strftime('%Y%m%d%H')
+        self.files += 1
+
+    def _close(self):
+        if self._fh is None:
+            return
+        try:
+            if self.fmt == 'parquet':
+                self._writer.close()
+            else:
+                self._fh.close()
+        except Exception:
+            pass
+        self._fh = None
+        self._writer = None
+
+    def _rows(self, ts, dets):
+        return csv_rows(ts, dets, self.names)
+
+    def _table(self, batch):
+        return _parquet_table(batch, self.names)
+
+    def _schema(self):
+        return pa.schema([('timestamp', pa.string()), ('class_id', pa.int32()), ('class_name', pa.string())]
+                         + [(c, pa.float32()) for c in HEADER[3:]])
+
+    def close(self, timeout=2):
+        self._stop.set()
+        try:
+            self.thread.join(timeout=timeout)
+        except Exception:
+            pass
+
+
+class TrackLog(LogSink):
+    """LogSink for ended tracks: one row per track (TRACK_FIELDS) instead of one per box per frame."""
+
+    header = TRACK_FIELDS
+    _types = {'track_id': 'int64', 'class_id': 'int32', 'frames': 'int32', 'max_conf': 'float32',
+              'mean_conf': 'float32', 'x1': 'float32', 'y1': 'float32', 'x2': 'float32', 'y2': 'float32'}
+
+    def __init__(self, log_dir, names=None, prefix='tracks', **kwargs):
+        super().__init__(log_dir, names=names, prefix=prefix, **kwargs)
+
+    def submit(self, records):
+        super().submit(None, records)
+
+    def _rows(self, ts, records):
+        return track_rows(records)
+
+    def _table(self, batch):
+        records = [r for _, recs in batch for r in recs]
+        return pa.Table.from_pylist(records, schema=self._schema())
+
+    def _schema(self):
+        return pa.schema([(f, getattr(pa, self._types.get(f, 'string'))()) for f in TRACK_FIELDS])
@@ -0,0 +1,88 @@
+import time
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+from stream.backends import load_backend, TorchBackend, BACKENDS
+from stream.dets import to_dicts
+from stream.detector import model_path, SOURCE_PATH, ALT_SOURCE_PATHS, THREADS, _first_existing
+from stream.tracking import box_iou
+
+
+def _match(ref, other, min_iou):
+    """Greedy same-class IoU matching; returns list of (iou, conf_delta)."""
+    pairs = sorted(
+        ((box_iou(a, b), i, j) for i, a in enumerate(ref) for j, b in enumerate(other) if a['class_id'] == b['class_id']),
+        reverse=True,
+    )
+    used_i, used_j, out = set(), set(), []
+    for iou, i, j in pairs:
+        if iou < min_iou or i in used_i or j in used_j:
+            continue
+        used_i.add(i)
+        used_j.add(j)
+        out.append((iou, abs(ref[i]['conf'] - other[j]['conf'])))
+    return out
+
+
+class Command(BaseCommand):
+    help = 'Compare an exported inference backend against the PyTorch path on a video'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', default='onnx', choices=[b for b in BACKENDS if b != 'torch'])
+        parser.add_argument('--source', help='video file (default: the sample video)')
+        parser.add_argument('--frames', type=int, default=100)
+        parser.add_argument('--imgsz', type=int, default=640)
+        parser.add_argument('--conf', type=float, default=0.6)
+        parser.add_argument('--min-iou', type=float, default=0.9, help='IoU for two boxes to count as the same')
+        parser.add_argument('--min-recall', type=float, default=0.95, help='fail below this matched fraction')
+
+    def handle(self, *args, **opts):
+        source = opts['source'] or _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
+        if not source:
+            raise CommandError('No video found; pass --source')
+        try:
+            ref = TorchBackend(model_path(), opts['imgsz'])
+            other = load_backend(model_path(), opts['backend'], opts['imgsz'], THREADS)
+        except (RuntimeError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+        if other.name == 'torch':
+            raise CommandError(f"backend {opts['backend']} is not available")
+        ref.warmup()
+        other.warmup()
+
+        cap = cv2.VideoCapture(source)
+        n_ref = n_other = frames = 0
+        matches = []
+        t_ref = t_other = 0.0
+        while frames < opts['frames']:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            t = time.perf_counter()
+            a = to_dicts(ref.predict([frame], opts['conf'])[0], ref.names)
+            t_ref += time.perf_counter() - t
+            t = time.perf_counter()
+            b = to_dicts(other.predict([frame], opts['conf'])[0], other.names)
+            t_other += time.perf_counter() - t
+            n_ref += len(a)
+            n_other += len(b)
+            matches.extend(_match(a, b, opts['min_iou']))
+            frames += 1
+        cap.release()
+        if not frames:
+            raise CommandError(f'Could not read frames from {source}')
+
+        recall = len(matches) / n_ref if n_ref else 1.0
+        precision = len(matches) / n_other if n_other else 1.0
+        mean_iou = sum(m[0] for m in matches) / len(matches) if matches else 0.0
+        max_dconf = max((m[1] for m in matches), default=0.0)
+        self.stdout.write(
+            f'{frames} frames | torch {n_ref} boxes {1000 * t_ref / frames:.1f} ms/frame | '
+            f'{other.name} {n_other} boxes {1000 * t_other / frames:.1f} ms/frame'
+        )
+        self.stdout.write(
+            f'matched {len(matches)} | recall {recall:.3f} precision {precision:.3f} | '
+            f'mean IoU {mean_iou:.3f} | max conf delta {max_dconf:.3f}'
+        )
+        if recall < opts['min_recall'] or precision < opts['min_recall']:
+            raise CommandError(f"parity below {opts['min_recall']}")
+        self.stdout.write(self.style.SUCCESS('parity OK'))
@@ -0,0 +1,42 @@
+import json, os
+from django.core.management.base import BaseCommand, CommandError
+from stream.backends import BACKENDS
+
+
+class Command(BaseCommand):
+    help = 'Benchmark decode/inference/plot/jpeg/csv/mp4 stages and the chained pipeline on a video; prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('video', nargs='?', help='video file (default: the sample video)')
+        parser.add_argument('--frames', type=int, default=100, help='frames to run (held in memory)')
+        parser.add_argument('--model', help='weights (default: the app model)')
+        parser.add_argument('--backend', default='torch', choices=BACKENDS)
+        parser.add_argument('--imgsz', type=int, default=320, help='model input size; small keeps CPU runs short')
+        parser.add_argument('--threads', type=int, default=None)
+        parser.add_argument('--conf', type=float, default=0.6)
+        parser.add_argument('--device', default='cpu', choices=('cpu', 'auto'), help='cpu hides GPUs from torch')
+        parser.add_argument('--out', help='also write the JSON report here')
+
+    def handle(self, *args, **opts):
+        if opts['device'] == 'cpu':
+            # before torch is imported by the backend
+            os.environ['CUDA_VISIBLE_DEVICES'] = ''
+        from stream import bench
+        from stream.backends import load_backend, DEFAULT_THREADS
+        from stream.detector import model_path, SOURCE_PATH, ALT_SOURCE_PATHS, _first_existing
+        video = opts['video'] or _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
+        if not video or not os.path.exists(video):
+            raise CommandError('No video found; pass one')
+        try:
+            backend = load_backend(opts['model'] or model_path(), opts['backend'], opts['imgsz'],
+                                   opts['threads'] or DEFAULT_THREADS)
+            report = bench.run(video, backend, opts['frames'], opts['conf'])
+        except (RuntimeError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+        from django.conf import settings
+        report["commit"] = bench.git_commit(str(settings.BASE_DIR))
+        text = json.dumps(report, indent=2)
+        if opts['out']:
+            with open(opts['out'], 'w') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
@@ -0,0 +1,61 @@
+import time
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+from stream.backends import load_backend, BACKENDS
+from stream.detector import model_path, SOURCE_PATH, ALT_SOURCE_PATHS, BACKEND, IMGSZ, THREADS, TILING, _first_existing
+from stream.tiling import TileConfig, parse_rois, plan_tiles, predict_tiled
+
+
+class Command(BaseCommand):
+    help = 'Compare whole-frame and tiled inference throughput on (upscaled) high-resolution frames'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', help='video file (default: the sample video)')
+        parser.add_argument('--frames', type=int, default=20)
+        parser.add_argument('--width', type=int, default=3840, help='resize frames to this width (0 = as decoded)')
+        parser.add_argument('--tile', type=int, default=TILING.tile or 640)
+        parser.add_argument('--overlap', type=float, default=TILING.overlap)
+        parser.add_argument('--batch', type=int, default=TILING.batch)
+        parser.add_argument('--rois', default=None, help='"x1,y1,x2,y2;..." normalized (default: CORAL_ROIS)')
+        parser.add_argument('--backend', default=BACKEND, choices=BACKENDS)
+        parser.add_argument('--conf', type=float, default=0.6)
+
+    def handle(self, *args, **opts):
+        source = opts['source'] or _first_existing([SOURCE_PATH] + ALT_SOURCE_PATHS)
+        if not source:
+            raise CommandError('No video found; pass --source')
+        cap = cv2.VideoCapture(source)
+        frames = []
+        while len(frames) < opts['frames']:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if opts['width'] and frame.shape[1] != opts['width']:
+                h = round(frame.shape[0] * opts['width'] / frame.shape[1])
+                frame = cv2.resize(frame, (opts['width'], h), interpolation=cv2.INTER_CUBIC)
+            frames.append(frame)
+        cap.release()
+        if not frames:
+            raise CommandError(f'Could not read frames from {source}')
+        try:
+            backend = load_backend(model_path(), opts['backend'], IMGSZ, THREADS)
+        except (RuntimeError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+        backend.warmup()
+        rois = parse_rois(opts['rois']) if opts['rois'] is not None else TILING.rois
+        cfg = TileConfig(opts['tile'], opts['overlap'], opts['batch'], rois)
+        h, w = frames[0].shape[:2]
+        self.stdout.write(f'{len(frames)} frames {w}x{h} | {backend.name} | {len(plan_tiles(w, h, cfg))} tiles/frame '
+                          f'(tile {cfg.tile}, overlap {cfg.overlap}, batch {cfg.batch}, rois {cfg.rois or "none"})')
+        for label, run in (
+            ('whole-frame', lambda f: backend.predict([f], opts['conf'])[0]),
+            ('tiled', lambda f: predict_tiled(backend, f, cfg, opts['conf'])),
+        ):
+            run(frames[0])  # warm the path (tile batch shapes, allocations)
+            boxes = 0
+            t = time.perf_counter()
+            for f in frames:
+                boxes += len(run(f))
+            secs = time.perf_counter() - t
+            self.stdout.write(f'  {label:12s} {1000 * secs / len(frames):8.1f} ms/frame  {len(frames) / secs:6.2f} fps  '
+                              f'{boxes / len(frames):6.1f} boxes/frame')
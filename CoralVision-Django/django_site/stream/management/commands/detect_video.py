@@ -0,0 +1,126 @@
+import datetime, json, os, shutil, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.core.management.base import BaseCommand, CommandError
+from stream import offline
+from stream.backends import BACKENDS
+from stream.detector import LOG_DIR, BACKEND, IMGSZ, model_path
+
+
+class _StoreBuffer:
+    """Batches --store rows into save_detections()."""
+
+    def __init__(self, source_id, batch=5000):
+        from stream.store import save_detections
+        self.save = save_detections
+        self.source_id = source_id
+        self.batch = batch
+        self.rows = []
+
+    def on_frame(self, ts, dets):
+        self.rows.extend((ts, self.source_id, d) for d in dets)
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.save(self.rows)
+            self.rows = []
+
+
+class Command(BaseCommand):
+    help = 'Run detection over recorded videos with a process pool; resumable'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='video files')
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+        parser.add_argument('--shard-frames', type=int, default=300, help='frames per shard (resume granularity)')
+        parser.add_argument('--batch', type=int, default=8, help='frames per predict call')
+        parser.add_argument('--conf', type=float, default=0.6)
+        parser.add_argument('--backend', default=BACKEND, choices=BACKENDS)
+        parser.add_argument('--int8', action='store_true', help='dynamically quantized ONNX model (needs --backend onnx)')
+        parser.add_argument('--imgsz', type=int, default=IMGSZ)
+        parser.add_argument('--annotate', action='store_true', help='also write an annotated MP4')
+        parser.add_argument('--store', action='store_true',
+                            help='also insert detections into the history DB (once per video and --start; --force repeats)')
+        parser.add_argument('--source-id', type=int, default=0, help='source id for --store rows')
+        parser.add_argument('--start', help='wall-clock ISO time of frame 0 (default: file mtime)')
+        parser.add_argument('--force', action='store_true', help='discard checkpoints and start over')
+
+    def handle(self, *args, **opts):
+        for path in opts['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'No such file: {path}')
+        if opts['int8'] and opts['backend'] != 'onnx':
+            raise CommandError('--int8 needs --backend onnx')
+        self.start = None
+        if opts['start']:
+            try:
+                self.start = datetime.datetime.fromisoformat(opts['start'])
+            except ValueError:
+                raise CommandError(f"--start: not an ISO time: {opts['start']!r}")
+        try:
+            self.weights = model_path()
+        except FileNotFoundError as e:
+            raise CommandError(str(e))
+        for path in opts['paths']:
+            self._process(path, opts)
+
+    def _process(self, video, opts):
+        info = offline.video_info(video)
+        if info['frames'] <= 0:
+            raise CommandError(f'{video}: frame count unavailable')
+        work = offline.work_dir(os.path.join(LOG_DIR, 'offline'), video, self.weights, opts['imgsz'] or 640,
+                                opts['backend'], opts['int8'], opts['conf'])
+        if opts['force'] and os.path.isdir(work):
+            shutil.rmtree(work)
+        os.makedirs(work, exist_ok=True)
+        shards = offline.plan_shards(info['frames'], opts['shard_frames'])
+        paths = [os.path.join(work, f'shard_{s:08d}_{e:08d}.jsonl') for s, e in shards]
+        todo = [(s, e, p) for (s, e), p in zip(shards, paths) if not os.path.exists(p)]
+        name = os.path.basename(video)
+        self.stdout.write(f'{name}: {info["frames"]} frames, {len(shards)} shards, {len(shards) - len(todo)} already done')
+
+        t0 = time.time()
+        done_frames = 0
+        if todo:
+            workers = max(1, min(opts['workers'], len(todo)))
+            threads = max(1, (os.cpu_count() or 2) // workers)
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=offline._init_worker,
+                initargs=(self.weights, opts['backend'], opts['imgsz'], threads, opts['int8']),
+            ) as pool:
+                futs = [pool.submit(offline.process_shard, video, s, e, p, opts['conf'], opts['batch']) for s, e, p in todo]
+                for fut in as_completed(futs):
+                    start, n, secs = fut.result()
+                    done_frames += n
+                    elapsed = time.time() - t0
+                    self.stdout.write(
+                        f'  shard @{start}: {n} frames in {secs:.1f}s | total {done_frames} frames, '
+                        f'{done_frames / elapsed:.1f} frames/s'
+                    )
+
+        stem = os.path.splitext(name)[0]
+        base = self.start or datetime.datetime.utcfromtimestamp(os.path.getmtime(video))
+        csv_path = os.path.join(LOG_DIR, f'detections_{stem}.csv')
+        mp4_path = os.path.join(LOG_DIR, f'annotated_{stem}.mp4') if opts['annotate'] else None
+        store = None
+        if opts['store']:
+            from stream.models import ImportedLog
+            # recorded like import_detections does, so a resumed or repeated run does not insert twice
+            stored_name = f'{os.path.basename(work)}_s{opts["source_id"]}_{base.isoformat()}'
+            if opts['force'] or not ImportedLog.objects.filter(name=stored_name).exists():
+                store = _StoreBuffer(opts['source_id'])
+            else:
+                self.stdout.write(f'{name}: detections already stored (--force to store again)')
+        rows = offline.write_outputs(video, info, paths, csv_path, base, mp4_path,
+                                     store.on_frame if store is not None else None)
+        if store is not None:
+            store.flush()
+            ImportedLog.objects.update_or_create(name=stored_name, defaults={'rows': rows})
+        with open(os.path.join(work, 'done.json'), 'w') as f:
+            json.dump({'frames': info['frames'], 'rows': rows, 'csv': csv_path, 'mp4': mp4_path}, f)
+        elapsed = time.time() - t0
+        rate = f'{done_frames / elapsed:.1f} frames/s' if done_frames else 'from checkpoint'
+        self.stdout.write(self.style.SUCCESS(f'{name}: {rows} detections -> {csv_path} ({rate})'))
+        if mp4_path:
+            self.stdout.write(f'  annotated video -> {mp4_path}')
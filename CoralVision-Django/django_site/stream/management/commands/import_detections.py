@@ -0,0 +1,64 @@
+import csv, glob, gzip, os, re
+from django.core.management.base import BaseCommand, CommandError
+from stream.models import ImportedLog
+from stream.store import parse_ts, save_detections
+
+STREAM_SUFFIX = re.compile(r'_s(\d+)\.csv(\.gz)?$')
+
+
+class Command(BaseCommand):
+    help = 'Import detections_*.csv logs into the detection history store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='CSV/CSV.GZ files (default: LOG_DIR/detections_*.csv*)')
+        parser.add_argument('--source', type=int, help='stream id for every file (default: _s<id> suffix or 0)')
+        parser.add_argument('--force', action='store_true', help='re-import files that were imported before')
+        parser.add_argument('--batch', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        from django.conf import settings
+        paths = opts['paths'] or sorted(glob.glob(os.path.join(settings.BASE_DIR, 'logs', 'detections_*.csv*')))
+        total = skipped = 0
+        for path in paths:
+            if not os.path.exists(path):
+                raise CommandError(f'No such file: {path}')
+            name = os.path.basename(path)
+            if not opts['force'] and ImportedLog.objects.filter(name=name).exists():
+                self.stdout.write(f'skip {name} (already imported)')
+                continue
+            m = STREAM_SUFFIX.search(name)
+            source = opts['source'] if opts['source'] is not None else (int(m.group(1)) if m else 0)
+            n, bad = self._import(path, source, opts['batch'])
+            ImportedLog.objects.update_or_create(name=name, defaults={'rows': n})
+            total += n
+            skipped += bad
+            if bad:
+                self.stdout.write(self.style.WARNING(f'{name}: {n} rows, {bad} malformed rows skipped'))
+            else:
+                self.stdout.write(f'{name}: {n} rows')
+        msg = f'imported {total} rows from {len(paths)} file(s)'
+        if skipped:
+            msg += f', skipped {skipped} malformed rows'
+        self.stdout.write(self.style.SUCCESS(msg))
+
+    def _import(self, path, source, batch_size):
+        opener = gzip.open if path.endswith('.gz') else open
+        n, bad, batch = 0, 0, []
+        with opener(path, 'rt', newline='') as f:
+            for row in csv.DictReader(f):
+                try:
+                    d = {
+                        'class_id': int(row['class_id']), 'class_name': row['class_name'], 'conf': float(row['conf']),
+                        'x1': float(row['x1']), 'y1': float(row['y1']), 'x2': float(row['x2']), 'y2': float(row['y2']),
+                    }
+                    ts = parse_ts(row['timestamp'])
+                except (KeyError, TypeError, ValueError):
+                    bad += 1
+                    continue
+                batch.append((ts, source, d))
+                if len(batch) >= batch_size:
+                    n += save_detections(batch)
+                    batch = []
+        if batch:
+            n += save_detections(batch)
+        return n, bad
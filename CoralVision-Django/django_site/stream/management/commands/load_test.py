@@ -0,0 +1,83 @@
+import asyncio, json, multiprocessing, platform
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _steps(spec):
+    steps = sorted({int(s) for s in spec.split(',') if s.strip()})
+    if not steps or steps[0] < 1:
+        raise ValueError(spec)
+    return steps
+
+
+class Command(BaseCommand):
+    help = ('Load-test /video_feed and ws/detections/ against a local server with a stub detector '
+            '(synthetic frames, no camera or weights); prints a JSON report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--steps', default='10,50,100,200', help='concurrent client counts to ramp through')
+        parser.add_argument('--kind', default='both', choices=('both', 'mjpeg', 'ws'), help='both alternates the two')
+        parser.add_argument('--fps', type=float, default=30.0, help='stub frame rate')
+        parser.add_argument('--size', default='640x480', help='stub frame size WxH')
+        parser.add_argument('--streams', type=int, default=1)
+        parser.add_argument('--duration', type=float, default=5.0, help='measured seconds per step')
+        parser.add_argument('--warmup', type=float, default=1.0, help='seconds after adding clients before measuring')
+        parser.add_argument('--ws-mode', default='full', choices=('full', 'compact'))
+        parser.add_argument('--w', type=int, default=None, help='request this /video_feed width variant')
+        parser.add_argument('--max-age-ms', type=float, default=250.0, help='p95 frame age that counts as degraded')
+        parser.add_argument('--min-fps-ratio', type=float, default=0.9,
+                            help='mean delivered fps below this share of --fps counts as degraded')
+        parser.add_argument('--port', type=int, default=0, help='server port (0 = any free port)')
+        parser.add_argument('--out', help='also write the JSON report here')
+
+    def handle(self, *args, **opts):
+        from stream import bench, loadtest
+        try:
+            steps = _steps(opts['steps'])
+            width, height = (int(v) for v in opts['size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--steps takes positive integers like 10,50,100 and --size WxH')
+        if opts['fps'] <= 0:
+            raise CommandError('--fps must be positive')
+        host, port = '127.0.0.1', opts['port'] or loadtest.free_port()
+        # forked after Django setup; the child only adds the stub pool and Daphne
+        ctx = multiprocessing.get_context('fork')
+        server = ctx.Process(target=loadtest.serve, args=(host, port, opts['streams'], opts['fps'], width, height),
+                             name='coral-loadtest-server', daemon=True)
+        server.start()
+        try:
+            if not loadtest.wait_listening(host, port):
+                raise CommandError(f'server did not start on {host}:{port}')
+
+            def log(step):
+                parts = [f"{step['clients']:>5} clients"]
+                for k in ('mjpeg', 'ws'):
+                    r = step.get(k)
+                    if r:
+                        parts.append(f"{k} {r['fps'].get('mean', 0)} fps, age p95 {r['age_ms'].get('p95', '-')} ms")
+                parts.append(f"server cpu {step['server']['cpu_pct']}% rss {step['server']['rss_mb']} MB")
+                if step['degraded']:
+                    parts.append('DEGRADED: ' + '; '.join(step['degraded']))
+                self.stderr.write(' | '.join(parts))
+
+            result = asyncio.run(loadtest.run_steps(
+                host, port, steps, kind=opts['kind'], duration=opts['duration'], warmup=opts['warmup'],
+                fps=opts['fps'], ws_mode=opts['ws_mode'], width=opts['w'], server=loadtest.ProcStats(server.pid),
+                max_age_ms=opts['max_age_ms'], min_fps_ratio=opts['min_fps_ratio'], log=log,
+            ))
+        finally:
+            server.terminate()
+            server.join(5)
+        from django.conf import settings
+        report = {
+            "config": {"steps": steps, "kind": opts['kind'], "fps": opts['fps'], "size": [width, height],
+                       "streams": opts['streams'], "duration_s": opts['duration'], "ws_mode": opts['ws_mode'],
+                       "w": opts['w'], "max_age_ms": opts['max_age_ms'], "min_fps_ratio": opts['min_fps_ratio']},
+            **result,
+            "host": {"python": platform.python_version(), "machine": platform.machine()},
+            "commit": bench.git_commit(str(settings.BASE_DIR)),
+        }
+        text = json.dumps(report, indent=2)
+        if opts['out']:
+            with open(opts['out'], 'w') as f:
+                f.write(text + '\n')
+        self.stdout.write(text)
@@ -0,0 +1,41 @@
+import json, os
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+from stream.annotate import draw_detections
+from stream.recorder import read_index
+
+
+class Command(BaseCommand):
+    help = 'Burn detection overlays into a raw recording (CORAL_RECORD_RAW) from its sidecars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='recording directory (logs/record_<stamp>)')
+        parser.add_argument('--out', help='output MP4 (default: <path>/annotated.mp4)')
+
+    def handle(self, *args, **opts):
+        path = opts['path']
+        try:
+            segments = read_index(path)
+        except OSError:
+            raise CommandError(f'No index.jsonl in {path}')
+        if not any('sidecar' in seg for seg in segments):
+            raise CommandError(f'{path} is not a raw recording')
+        out_path = opts['out'] or os.path.join(path, 'annotated.mp4')
+        writer = None
+        frames = 0
+        for seg in segments:
+            cap = cv2.VideoCapture(os.path.join(path, seg['file']))
+            with open(os.path.join(path, seg['sidecar'])) as f:
+                for line in f:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    if writer is None:
+                        writer = cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*'mp4v'), seg['fps'],
+                                                 (frame.shape[1], frame.shape[0]))
+                    writer.write(draw_detections(frame, json.loads(line)['detections'], copy=False))
+                    frames += 1
+            cap.release()
+        if writer is not None:
+            writer.release()
+        self.stdout.write(self.style.SUCCESS(f'{frames} frames from {len(segments)} segments -> {out_path}'))
@@ -0,0 +1,53 @@
+import signal, sys, time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Run the detector pool as its own process, publishing frames to shared memory for CORAL_BUS=client web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats-every', type=float, default=0, help='print per-stream fps every N seconds (0 = quiet)')
+
+    def handle(self, *args, **opts):
+        from stream import detector
+        from stream.shmbus import CONTROL_CALLS, ControlServer, FrameBus, bus_name
+        if detector.BUS_MODE == 'client':
+            raise CommandError('CORAL_BUS=client is for web workers; unset it for the detector process')
+        try:
+            pool = detector.get_pool()
+        except (RuntimeError, FileNotFoundError) as e:
+            raise CommandError(str(e))
+        buses = []
+        control = None
+        # SIGTERM (service managers) unwinds like Ctrl-C so the segments get unlinked
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            for s in pool.streams:
+                bus = FrameBus.create(bus_name(detector.BUS_PREFIX, s.stream_id), detector.BUS_SLOTS,
+                                      int(detector.BUS_SLOT_MB * 1024 * 1024))
+                buses.append(bus)
+                s.bus = bus
+            if not buses:
+                raise CommandError('no streams configured')
+            # the random key in stream 0's header authenticates web workers
+            control = ControlServer(detector.BUS_CONTROL, buses[0].key,
+                                    {name: getattr(detector, name) for name in CONTROL_CALLS})
+            self.stdout.write(f'{len(buses)} stream(s) on shared memory {bus_name(detector.BUS_PREFIX, "*")}, '
+                              f'control on {detector.BUS_CONTROL[0]}:{detector.BUS_CONTROL[1]}')
+            last = time.time()
+            while any(not s.stop_event.is_set() for s in pool.streams):
+                time.sleep(0.5)
+                if opts['stats_every'] and time.time() - last >= opts['stats_every']:
+                    last = time.time()
+                    self.stdout.write(' | '.join(
+                        f's{s.stream_id} {s.fps_smooth:.1f} fps seq {s.bus.seq}' for s in pool.streams))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if control is not None:
+                control.close()
+            pool.stop()
+            for s in pool.streams:
+                s.bus = None
+            for bus in buses:
+                bus.close()
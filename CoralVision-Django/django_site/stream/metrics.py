@@ -0,0 +1,197 @@
+import bisect, threading, weakref
+
+# Prometheus text exposition without the client library. Hot-path metrics
+# (Counter, Histogram) keep one shard per writing thread, so observe()/inc()
+# is an unlocked list update; shards are only summed when /metrics is
+# scraped, and a thread's shard is folded into a base total when the thread
+# ends, so short-lived threads do not accumulate. Values that already live
+# elsewhere (queue depths, drop counters, client counts) are read at scrape
+# time through callbacks instead.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class _ThreadToken:
+    # lives only in the thread-local, so it is freed when its thread ends
+    __slots__ = ('__weakref__',)
+
+
+class _Sharded:
+    """Per-thread value lists of a fixed width, summed on read."""
+
+    def __init__(self, width):
+        self.width = width
+        self._local = threading.local()
+        self._shards = []
+        self._base = [0] * width  # shards of threads that have ended
+        self._lock = threading.Lock()
+
+    def shard(self):
+        s = getattr(self._local, 'values', None)
+        if s is None:
+            s = self._local.values = [0] * self.width
+            self._local.token = _ThreadToken()
+            with self._lock:
+                self._shards.append(s)
+            weakref.finalize(self._local.token, self._retire, s)
+        return s
+
+    def _retire(self, s):
+        with self._lock:
+            self._shards = [x for x in self._shards if x is not s]
+            for i, v in enumerate(s):
+                self._base[i] += v
+
+    def total(self):
+        with self._lock:
+            shards = list(self._shards)
+            out = list(self._base)
+        for s in shards:
+            for i, v in enumerate(s):
+                out[i] += v
+        return out
+
+
+class _CounterChild(_Sharded):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, n=1):
+        s = getattr(self._local, 'values', None) or self.shard()
+        s[0] += n
+
+
+class _HistogramChild(_Sharded):
+    def __init__(self, bounds):
+        # one slot per bound, +Inf, then the running sum
+        super().__init__(len(bounds) + 2)
+        self.bounds = bounds
+
+    def observe(self, v):
+        s = getattr(self._local, 'values', None) or self.shard()
+        s[bisect.bisect_left(self.bounds, v)] += 1
+        s[-1] += v
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def labels(self, *values):
+        """Child for these label values; callers on hot paths should keep it."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def samples(self):
+        for key, child in self.children():
+            yield self.name + '_total', dict(zip(self.labelnames, key)), child.total()[0]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def samples(self):
+        for key, child in self.children():
+            labels = dict(zip(self.labelnames, key))
+            values = child.total()
+            cumulative = 0
+            for bound, n in zip(self.bounds + (float('inf'),), values):
+                cumulative += n
+                yield self.name + '_bucket', dict(labels, le=_fmt(bound)), cumulative
+            yield self.name + '_sum', labels, values[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+class Callback:
+    """Gauge or counter whose samples come from fn() at scrape time: [(labels dict, value)]."""
+
+    def __init__(self, name, help, fn, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+        REGISTRY.register(self)
+
+    def samples(self):
+        name = self.name + '_total' if self.kind == 'counter' else self.name
+        for labels, value in self.fn():
+            yield name, labels, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            try:
+                samples = list(m.samples())
+            except Exception:
+                continue  # a broken callback must not take down the scrape
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            for name, labels, value in samples:
+                lines.append(f'{name}{_labels(labels)} {_fmt(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _fmt(v):
+    if v == float('inf'):
+        return '+Inf'
+    if isinstance(v, float):
+        return repr(round(v, 6))
+    return str(int(v))
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+REGISTRY = Registry()
+
+# Pipeline instrumentation shared by the detector and the views
+STAGE_SECONDS = Histogram('coral_stage_seconds', 'Time spent per frame in each pipeline stage.', ('stage', 'stream'))
+BATCH_SIZE = Histogram('coral_inference_batch_size', 'Frames per batched predict call.', buckets=BATCH_BUCKETS)
+BYTES_SENT = Counter('coral_bytes_sent', 'Bytes sent to MJPEG and WebSocket clients.', ('stream', 'transport'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('rows', models.IntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Detection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ts', models.DateTimeField()),
+                ('source', models.SmallIntegerField(default=0)),
+                ('class_id', models.SmallIntegerField()),
+                ('class_name', models.CharField(max_length=64)),
+                ('conf', models.FloatField()),
+                ('x1', models.FloatField()),
+                ('y1', models.FloatField()),
+                ('x2', models.FloatField()),
+                ('y2', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ts'], name='det_ts_idx'), models.Index(fields=['class_id', 'ts'], name='det_class_ts_idx'), models.Index(fields=['source', 'ts'], name='det_source_ts_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectionMinute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('source', models.SmallIntegerField(default=0)),
+                ('class_id', models.SmallIntegerField()),
+                ('class_name', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+                ('max_conf', models.FloatField(default=0.0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_id', 'bucket'], name='detmin_class_bucket_idx'), models.Index(fields=['source', 'bucket'], name='detmin_source_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'source', 'class_id'), name='detmin_unique_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.SmallIntegerField(default=0)),
+                ('track_id', models.IntegerField()),
+                ('class_id', models.SmallIntegerField()),
+                ('class_name', models.CharField(max_length=64)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('frames', models.IntegerField()),
+                ('max_conf', models.FloatField()),
+                ('mean_conf', models.FloatField()),
+                ('best_ts', models.DateTimeField()),
+                ('x1', models.FloatField()),
+                ('y1', models.FloatField()),
+                ('x2', models.FloatField()),
+                ('y2', models.FloatField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['first_seen'], name='track_first_idx'), models.Index(fields=['class_id', 'first_seen'], name='track_class_first_idx'), models.Index(fields=['source', 'first_seen'], name='track_source_first_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrackMinute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('source', models.SmallIntegerField(default=0)),
+                ('class_id', models.SmallIntegerField()),
+                ('class_name', models.CharField(max_length=64)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_id', 'bucket'], name='trackmin_class_bucket_idx'), models.Index(fields=['source', 'bucket'], name='trackmin_source_bucket_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'source', 'class_id'), name='trackmin_unique_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+from django.db import models
+
+
+class Detection(models.Model):
+    """One detected box on one frame of stream `source`."""
+    ts = models.DateTimeField()
+    source = models.SmallIntegerField(default=0)
+    class_id = models.SmallIntegerField()
+    class_name = models.CharField(max_length=64)
+    conf = models.FloatField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    x2 = models.FloatField()
+    y2 = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['ts'], name='det_ts_idx'),
+            models.Index(fields=['class_id', 'ts'], name='det_class_ts_idx'),
+            models.Index(fields=['source', 'ts'], name='det_source_ts_idx'),
+        ]
+
+
+class DetectionMinute(models.Model):
+    """Per-minute rollup of Detection rows, kept up to date on insert.
+
+    /api/stats reads this table, so aggregates cost O(minutes) rather than
+    O(detections).
+    """
+    bucket = models.DateTimeField()
+    source = models.SmallIntegerField(default=0)
+    class_id = models.SmallIntegerField()
+    class_name = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+    max_conf = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'source', 'class_id'], name='detmin_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['class_id', 'bucket'], name='detmin_class_bucket_idx'),
+            models.Index(fields=['source', 'bucket'], name='detmin_source_bucket_idx'),
+        ]
+
+
+class Track(models.Model):
+    """One object followed across frames of stream `source` (see stream/tracks.py)."""
+    source = models.SmallIntegerField(default=0)
+    track_id = models.IntegerField()
+    class_id = models.SmallIntegerField()
+    class_name = models.CharField(max_length=64)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    frames = models.IntegerField()
+    max_conf = models.FloatField()
+    mean_conf = models.FloatField()
+    # box of the most confident detection
+    best_ts = models.DateTimeField()
+    x1 = models.FloatField()
+    y1 = models.FloatField()
+    x2 = models.FloatField()
+    y2 = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['first_seen'], name='track_first_idx'),
+            models.Index(fields=['class_id', 'first_seen'], name='track_class_first_idx'),
+            models.Index(fields=['source', 'first_seen'], name='track_source_first_idx'),
+        ]
+
+
+class TrackMinute(models.Model):
+    """Unique tracks per class and minute; a track counts once in each minute it was seen in."""
+    bucket = models.DateTimeField()
+    source = models.SmallIntegerField(default=0)
+    class_id = models.SmallIntegerField()
+    class_name = models.CharField(max_length=64)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'source', 'class_id'], name='trackmin_unique_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['class_id', 'bucket'], name='trackmin_class_bucket_idx'),
+            models.Index(fields=['source', 'bucket'], name='trackmin_source_bucket_idx'),
+        ]
+
+
+class ImportedLog(models.Model):
+    """Detection CSV files already loaded by `manage.py import_detections` (and `detect_video --store` runs)."""
+    name = models.CharField(max_length=255, unique=True)
+    rows = models.IntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
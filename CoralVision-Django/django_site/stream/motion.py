@@ -0,0 +1,59 @@
+import time
+import cv2
+import numpy as np
+
+
+class SceneGate:
+    """Cheap 'has anything changed?' test in front of inference.
+
+    Each frame is reduced to a blurred size x size*9/16 grayscale thumbnail
+    and compared with the thumbnail of the last frame that was inferred;
+    below `threshold` mean absolute grey-level difference the frame counts
+    as static. The reference only moves on inference, so slow drift still
+    adds up, and max_age forces a fresh inference now and then.
+    """
+
+    def __init__(self, threshold=2.0, size=64, max_age=10.0):
+        self.threshold = float(threshold)
+        self.size = (int(size), max(1, int(size) * 9 // 16))
+        self.max_age = float(max_age)
+        self._ref = None
+        self._ref_time = 0.0
+        self.last_diff = None
+        self.frames = 0
+        self.skipped = 0
+        self.ratio = 0.0  # EMA of the static fraction
+
+    def _thumb(self, frame):
+        step = max(1, frame.shape[1] // (self.size[0] * 4))
+        small = cv2.resize(frame[::step, ::step], self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (3, 3), 0).astype(np.int16)
+
+    def check(self, frame):
+        """True when frame may reuse the last inference; otherwise it becomes the reference."""
+        thumb = self._thumb(frame)
+        now = time.time()
+        static = False
+        if self._ref is not None and thumb.shape == self._ref.shape and now - self._ref_time < self.max_age:
+            self.last_diff = float(np.abs(thumb - self._ref).mean())
+            static = self.last_diff < self.threshold
+        if not static:
+            self._ref = thumb
+            self._ref_time = now
+        self.frames += 1
+        self.skipped += static
+        self.ratio = 0.95 * self.ratio + 0.05 * static
+        return static
+
+    def reset(self):
+        self._ref = None
+
+    def stats(self):
+        return {
+            "skip_ratio": round(self.ratio, 3),
+            "skipped": self.skipped,
+            "frames": self.frames,
+            "diff": round(self.last_diff, 2) if self.last_diff is not None else None,
+            "threshold": self.threshold,
+        }
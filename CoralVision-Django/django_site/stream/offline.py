@@ -0,0 +1,135 @@
+import csv, hashlib, json, os, time
+import cv2
+from .annotate import draw_boxes
+from .backends import load_backend, weights_key
+from .dets import csv_rows, from_dicts, to_dicts
+from .logsink import HEADER
+
+# Per-process backend for shard workers (set by _init_worker)
+_backend = None
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {path}")
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    return {"frames": frames, "fps": float(fps), "width": w, "height": h}
+
+
+def plan_shards(total, shard_frames):
+    return [(s, min(total, s + shard_frames)) for s in range(0, total, shard_frames)]
+
+
+def work_dir(root, video, weights, imgsz, backend='torch', int8=False, conf=0.6):
+    # one checkpoint dir per (video content, model, backend, threshold) so stale shards are never reused
+    st = os.stat(video)
+    h = hashlib.sha1(f"{os.path.abspath(video)}|{st.st_size}|{int(st.st_mtime)}".encode()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(video))[0]
+    model = f"{weights_key(weights, imgsz)}_{backend}{'-int8' if int8 else ''}_c{conf:g}"
+    return os.path.join(root, f"{stem}_{h}_{model}")
+
+
+def _seek(cap, start):
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != start:
+        # container without reliable seeking: rewind and skip without decoding
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        for _ in range(start):
+            if not cap.grab():
+                break
+
+
+def _init_worker(weights, backend, imgsz, threads, int8=False):
+    global _backend
+    cv2.setNumThreads(1)
+    _backend = load_backend(weights, backend, imgsz, threads, int8)
+    _backend.warmup()
+
+
+def process_shard(video, start, end, out_path, conf=0.6, batch=8):
+    """Detect frames [start, end) of video; write one JSON line per frame.
+
+    The file is written under a temp name and renamed when the shard is
+    complete, so its presence is the resume checkpoint.
+    """
+    cap = cv2.VideoCapture(video)
+    _seek(cap, start)
+    tmp = out_path + '.part'
+    t0 = time.time()
+    n = 0
+    with open(tmp, 'w') as f:
+        idx = start
+        while idx < end:
+            frames = []
+            while idx + len(frames) < end and len(frames) < batch:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+            for i, arr in enumerate(_backend.predict(frames, conf)):
+                f.write(json.dumps({"frame": idx + i, "detections": to_dicts(arr, _backend.names)}) + "\n")
+            idx += len(frames)
+            n += len(frames)
+    cap.release()
+    os.replace(tmp, out_path)
+    return start, n, time.time() - t0
+
+
+def iter_shard_results(paths):
+    for p in paths:
+        with open(p) as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def write_outputs(video, info, shard_paths, csv_path, base_time, mp4_path=None, on_frame=None):
+    """Merge shard results in frame order into the CSV log (and optional MP4).
+
+    The MP4 is matched to the results by frame index: a frame a shard did
+    not report (e.g. it ended early on a decode error) is written without
+    boxes rather than shifting every later overlay.
+    """
+    import datetime
+    fps = info["fps"] or 30.0
+    writer = cap = None
+    if mp4_path:
+        cap = cv2.VideoCapture(video)
+        writer = cv2.VideoWriter(mp4_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (info["width"], info["height"]))
+    rows = 0
+    pos = 0  # index of the next frame cap.read() returns
+    names = {}
+    with open(csv_path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        for rec in iter_shard_results(shard_paths):
+            dets = rec["detections"]
+            ts = (base_time + datetime.timedelta(seconds=rec["frame"] / fps)).isoformat()
+            names.update((d["class_id"], d["class_name"]) for d in dets)
+            arr = from_dicts(dets)
+            if dets:
+                w.writerows(csv_rows(ts, arr, names))
+                rows += len(dets)
+            if on_frame is not None:
+                on_frame(ts, dets)
+            if writer is not None and rec["frame"] >= pos:
+                ok = True
+                while ok and pos < rec["frame"]:
+                    ok, frame = cap.read()
+                    if ok:
+                        writer.write(frame)
+                    pos += 1
+                ok, frame = cap.read() if ok else (False, None)
+                pos += 1
+                if ok:
+                    writer.write(draw_boxes(frame, arr, names))
+    if writer is not None:
+        writer.release()
+        cap.release()
+    return rows
@@ -0,0 +1,95 @@
+import threading, time, collections
+
+
+class StageQueue:
+    """Bounded hand-off queue between pipeline stages.
+
+    With drop_oldest=True a full queue discards its oldest item so the
+    producer never stalls (live cameras); otherwise put() waits for room
+    (file playback, where every frame should be processed).
+    """
+
+    def __init__(self, maxsize=2, drop_oldest=True, notify=None):
+        self.maxsize = max(1, int(maxsize))
+        self.drop_oldest = bool(drop_oldest)
+        self.dropped = 0
+        # optional Event shared by several queues so one consumer can wait on all
+        self.notify = notify
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def put(self, item, stop_event=None, timeout=0.1):
+        with self._cond:
+            while len(self._items) >= self.maxsize:
+                if self.drop_oldest:
+                    self._items.popleft()
+                    self.dropped += 1
+                    break
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                self._cond.wait(timeout)
+            self._items.append(item)
+            self._cond.notify_all()
+        if self.notify is not None:
+            self.notify.set()
+        return True
+
+    def get(self, timeout=0.1):
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def get_nowait(self):
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def clear(self):
+        with self._cond:
+            self._items.clear()
+            self._cond.notify_all()
+
+    def depth(self):
+        return len(self._items)
+
+
+class StageStats:
+    """Per-stage throughput (EMA of 1/interval) and busy time."""
+
+    def __init__(self):
+        self.count = 0
+        self.fps = 0.0
+        self.busy_ms = 0.0
+        self._last = None
+
+    def tick(self, busy_s=None):
+        now = time.time()
+        if self._last is not None:
+            dt = now - self._last
+            if dt > 0:
+                inst = 1.0 / dt
+                self.fps = 0.9 * self.fps + 0.1 * inst if self.fps else inst
+        self._last = now
+        if busy_s is not None:
+            ms = busy_s * 1000.0
+            self.busy_ms = 0.9 * self.busy_ms + 0.1 * ms if self.busy_ms else ms
+        self.count += 1
+
+    def snapshot(self, queue=None):
+        out = {
+            "fps": round(self.fps, 2),
+            "busy_ms": round(self.busy_ms, 2),
+            "frames": self.count,
+        }
+        if queue is not None:
+            out["queue"] = queue.depth()
+            out["dropped"] = queue.dropped
+        return out
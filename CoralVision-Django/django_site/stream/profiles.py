@@ -0,0 +1,117 @@
+import json, time
+
+
+class Profile:
+    """A named way to run the model.
+
+    backend and imgsz pick the runtime and input size (None keeps the size
+    the weights were trained at), conf the confidence threshold, int8 a
+    dynamically quantized ONNX export instead of the FP32 one.
+    """
+
+    __slots__ = ('name', 'backend', 'imgsz', 'conf', 'int8')
+
+    def __init__(self, name, backend='torch', imgsz=None, conf=0.6, int8=False):
+        self.name = str(name)
+        self.backend = backend
+        self.imgsz = int(imgsz) if imgsz else None
+        self.conf = float(conf)
+        self.int8 = bool(int8)
+
+    @property
+    def key(self):
+        # everything that changes the boxes; part of the detection cache key
+        return f"{self.name}-{self.backend}{'-int8' if self.int8 else ''}-{self.imgsz or 'native'}-c{self.conf:g}"
+
+    def as_dict(self):
+        return {"name": self.name, "backend": self.backend, "imgsz": self.imgsz, "conf": self.conf, "int8": self.int8}
+
+
+def default_profiles(backend='torch', imgsz=None, conf=0.6, fast_imgsz=320):
+    """accurate, int8 and fast, most to least accurate (the governor's order)."""
+    return [
+        Profile('accurate', backend, imgsz, conf),
+        Profile('int8', 'onnx', imgsz or 640, conf, int8=True),
+        Profile('fast', backend, fast_imgsz, conf),
+    ]
+
+
+def load_profiles(defaults, path=None):
+    """JSON list of profiles replacing the defaults, in ladder order.
+
+    An entry named like a default profile only needs the fields it changes,
+    e.g. [{"name": "accurate"}, {"name": "fast", "imgsz": 416}].
+    """
+    if not path:
+        return list(defaults)
+    with open(path) as f:
+        raw = json.load(f)
+    base = {p.name: p.as_dict() for p in defaults}
+    return [Profile(**dict(base.get(p.get('name'), {}), **p)) for p in raw]
+
+
+class ProfileGovernor:
+    """Steps down the profile ladder when inference overruns the frame budget.
+
+    Inference cost is an EMA per profile. After down_after overrunning
+    ticks in a row the next lighter profile is used; once the current one
+    has been under up_headroom of the budget for up_after ticks, the next
+    heavier one is tried again if its last known cost fits, or if that cost
+    is older than retry_secs (the load may have changed since). cooldown
+    seconds must pass between two switches.
+    """
+
+    def __init__(self, ladder, down_after=15, up_after=90, up_headroom=0.7, cooldown=5.0, retry_secs=60.0):
+        self.ladder = list(ladder)
+        self.down_after = down_after
+        self.up_after = up_after
+        self.up_headroom = up_headroom
+        self.cooldown = cooldown
+        self.retry_secs = retry_secs
+        self.cost = {}  # profile name -> (EMA seconds, when last observed)
+        self.disabled = set()  # profiles that failed to load
+        self._over = self._under = 0
+        self._switched = time.time()  # measure a cooldown's worth before the first step
+
+    def switched(self):
+        self._over = self._under = 0
+        self._switched = time.time()
+
+    def disable(self, name):
+        self.disabled.add(name)
+
+    def _neighbour(self, name, step):
+        i = self.ladder.index(name) + step
+        while 0 <= i < len(self.ladder):
+            if self.ladder[i] not in self.disabled:
+                return self.ladder[i]
+            i += step
+        return None
+
+    def observe(self, name, seconds, budget):
+        """Record one inference tick; returns the profile to switch to, or None."""
+        now = time.time()
+        old = self.cost.get(name)
+        cost = seconds if old is None else 0.8 * old[0] + 0.2 * seconds
+        self.cost[name] = (cost, now)
+        if name not in self.ladder or budget <= 0 or now - self._switched < self.cooldown:
+            return None
+        if cost > budget:
+            self._over += 1
+            self._under = 0
+            if self._over >= self.down_after:
+                return self._neighbour(name, 1)
+        elif cost < self.up_headroom * budget:
+            self._under += 1
+            self._over = 0
+            up = self._neighbour(name, -1)
+            if up is not None and self._under >= self.up_after:
+                known = self.cost.get(up)
+                if known is None or known[0] < self.up_headroom * budget or now - known[1] > self.retry_secs:
+                    return up
+        else:
+            self._over = self._under = 0
+        return None
+
+    def stats(self):
+        return {name: round(c * 1000, 2) for name, (c, _) in self.cost.items()}
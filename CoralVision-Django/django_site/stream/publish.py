@@ -0,0 +1,154 @@
+import asyncio, json
+from .tracking import box_iou
+from .metrics import Callback
+
+# Compact wire format: box coordinates are sent as fixed-point ints
+# (value * FIXED_POINT) and confidences as per-mille ints.
+FIXED_POINT = 10
+MOVE_EPS = 1.0  # px; smaller box motion is not reported as a move
+
+
+def group_name(stream_id):
+    return f'detections_{stream_id}'
+
+
+def _fx(v):
+    return int(round(v * FIXED_POINT))
+
+
+class DeltaEncoder:
+    """Turns successive detection lists into track-ID deltas.
+
+    Detections are matched to the previous frame greedily by IoU within a
+    class. encode() returns (delta, snapshot): the delta lists added,
+    moved and removed track IDs relative to the previous frame, and the
+    snapshot lists every live track, for clients that missed a delta.
+    """
+
+    def __init__(self, iou_threshold=0.3):
+        self.iou_threshold = iou_threshold
+        self.tracks = {}  # id -> det dict
+        self._next_id = 1
+
+    def _match(self, dets):
+        pairs = []
+        for tid, prev in self.tracks.items():
+            for j, d in enumerate(dets):
+                if d['class_id'] == prev['class_id']:
+                    iou = box_iou(prev, d)
+                    if iou >= self.iou_threshold:
+                        pairs.append((iou, tid, j))
+        pairs.sort(reverse=True)
+        matched, used = {}, set()
+        for _, tid, j in pairs:
+            if tid in matched or j in used:
+                continue
+            matched[tid] = j
+            used.add(j)
+        return matched, used
+
+    def encode(self, meta):
+        dets = meta.get('detections') or []
+        if dets and 'track_id' in dets[0]:
+            # detections already carry stable IDs
+            matched = {d['track_id']: j for j, d in enumerate(dets) if d['track_id'] in self.tracks}
+            used = set(matched.values())
+        else:
+            matched, used = self._match(dets)
+        added, moved = [], []
+        tracks = {}
+        for tid, j in matched.items():
+            d, prev = dets[j], self.tracks[tid]
+            if max(abs(d[k] - prev[k]) for k in ('x1', 'y1', 'x2', 'y2')) >= MOVE_EPS:
+                moved.append([tid, _fx(d['x1']), _fx(d['y1']), _fx(d['x2']), _fx(d['y2'])])
+                tracks[tid] = d
+            else:
+                tracks[tid] = prev
+        for j, d in enumerate(dets):
+            if j in used:
+                continue
+            tid = d.get('track_id') or self._next_id
+            self._next_id = max(self._next_id, tid) + 1
+            tracks[tid] = d
+            added.append(self._entry(tid, d))
+        removed = [tid for tid in self.tracks if tid not in tracks]
+        self.tracks = tracks
+        head = {'ts': meta.get('ts'), 'fps': meta.get('fps'), 'fp': FIXED_POINT}
+        delta = dict(head, add=added, move=moved, remove=removed)
+        snapshot = dict(head, snapshot=[self._entry(tid, d) for tid, d in tracks.items()])
+        return delta, snapshot
+
+    @staticmethod
+    def _entry(tid, d):
+        return [tid, d['class_id'], d['class_name'], int(round(d['conf'] * 1000)),
+                _fx(d['x1']), _fx(d['y1']), _fx(d['x2']), _fx(d['y2'])]
+
+
+class MetaPublisher:
+    """Pushes a stream's meta to its channel-layer group, once per new frame.
+
+    Runs as a task on the ASGI event loop so the channel layer is only
+    touched from that loop. Each meta is serialized once here and the
+    resulting strings are shared by every subscriber; compact encodings are
+    only produced while at least one client asked for them. Source switch
+    and probe job updates go to the same group as {"job": ...} messages.
+    """
+
+    def __init__(self, det, layer):
+        self.det = det
+        self.layer = layer
+        self.group = group_name(det.stream_id)
+        self.clients = 0
+        self.compact_clients = 0
+        self.encoder = DeltaEncoder()
+        self.loop = asyncio.get_running_loop()
+        self.task = self.loop.create_task(self._run())
+        self.job_task = self.loop.create_task(self._run_jobs())
+
+    async def _run(self):
+        seq = 0
+        while True:
+            new_seq, meta = await self.det.meta_updates.wait_async(seq)
+            if new_seq <= seq or meta is None:
+                continue
+            seq = new_seq
+            if not self.clients:
+                continue
+            msg = {'type': 'detections.meta', 'seq': seq, 'text': json.dumps(meta)}
+            if self.compact_clients:
+                delta, snapshot = self.encoder.encode(meta)
+                msg['delta'] = json.dumps(delta, separators=(',', ':'))
+                msg['snapshot'] = json.dumps(snapshot, separators=(',', ':'))
+            await self.layer.group_send(self.group, msg)
+
+    async def _run_jobs(self):
+        seq = self.det.job_updates.seq  # only updates from now on
+        while True:
+            new_seq, job = await self.det.job_updates.wait_async(seq)
+            if new_seq <= seq or job is None:
+                continue
+            seq = new_seq
+            if self.clients:
+                await self.layer.group_send(self.group, {'type': 'source.job', 'text': json.dumps({'job': job})})
+
+    def cancel(self):
+        self.task.cancel()
+        self.job_task.cancel()
+
+
+_publishers = {}
+
+
+Callback('coral_ws_clients', 'Connected detection WebSocket clients.',
+         lambda: [({"stream": sid}, pub.clients) for sid, pub in list(_publishers.items())])
+
+
+def get_publisher(det, layer):
+    pub = _publishers.get(det.stream_id)
+    if (pub is None or pub.det is not det or pub.loop is not asyncio.get_running_loop()
+            or pub.task.done() or pub.job_task.done()):
+        if pub is not None:
+            pub.cancel()
+        pub = MetaPublisher(det, layer)
+        _publishers[det.stream_id] = pub
+    return pub
@@ -0,0 +1,118 @@
+import json, os, queue, threading
+import cv2
+from .dets import to_dicts
+
+
+class Recorder:
+    """Segmented MP4 recording on a background writer thread.
+
+    submit() never blocks: frames go into a bounded queue (a full queue
+    counts a drop). The writer cuts a new segment every segment_secs of
+    video, or when the frame size changes, and appends one line per
+    finished segment to index.jsonl in the recording directory, so a crash
+    loses at most the open segment. With raw=True the frames are expected
+    unannotated and each segment gets a .jsonl sidecar holding the
+    detections per frame, to draw overlays later.
+    """
+
+    def __init__(self, path, fps, names=None, segment_secs=60.0, raw=False, queue_size=64):
+        self.path = path
+        self.fps = fps
+        self.names = names if names is not None else {}
+        self.segment_frames = max(1, int(round(segment_secs * fps)))
+        self.raw = raw
+        self.q = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.frames = 0
+        self.segments = 0
+        self.error = None
+        self._writer = None
+        self._sidecar = None
+        self._seg = None  # index entry of the open segment
+        self._size = None
+        os.makedirs(path, exist_ok=True)
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'coral-rec-{os.path.basename(path)}', daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, ts, dets=None):
+        try:
+            self.q.put_nowait((frame, ts, dets))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "raw": self.raw,
+            "queue": self.q.qsize(),
+            "dropped": self.dropped,
+            "frames": self.frames,
+            "segments": self.segments,
+            "error": self.error,
+        }
+
+    def _run(self):
+        while not self._stop.is_set() or not self.q.empty():
+            try:
+                frame, ts, dets = self.q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                self._write(frame, ts, dets)
+            except Exception as e:
+                self.error = str(e)
+        self._close_segment()
+
+    def _write(self, frame, ts, dets):
+        size = (frame.shape[1], frame.shape[0])
+        if self._writer is None or size != self._size or self._seg['frames'] >= self.segment_frames:
+            self._open_segment(size, ts)
+        self._writer.write(frame)
+        if self._sidecar is not None:
+            row = {"frame": self._seg['frames'], "ts": ts,
+                   "detections": to_dicts(dets, self.names) if dets is not None else []}
+            self._sidecar.write(json.dumps(row) + "\n")
+        self._seg['frames'] += 1
+        self._seg['end'] = ts
+        self.frames += 1
+
+    def _open_segment(self, size, ts):
+        self._close_segment()
+        name = f"seg_{self.segments:05d}"
+        writer = cv2.VideoWriter(os.path.join(self.path, name + '.mp4'), cv2.VideoWriter_fourcc(*'mp4v'), self.fps, size)
+        if not writer.isOpened():
+            raise RuntimeError(f"Could not open video writer in {self.path}")
+        self._writer = writer
+        self._size = size
+        self._seg = {"file": name + '.mp4', "start": ts, "end": ts, "frames": 0,
+                     "fps": self.fps, "width": size[0], "height": size[1]}
+        if self.raw:
+            self._sidecar = open(os.path.join(self.path, name + '.jsonl'), 'w')
+            self._seg["sidecar"] = name + '.jsonl'
+        self.segments += 1
+
+    def _close_segment(self):
+        if self._writer is None:
+            return
+        try:
+            self._writer.release()
+            if self._sidecar is not None:
+                self._sidecar.close()
+        except Exception:
+            pass
+        with open(os.path.join(self.path, 'index.jsonl'), 'a') as f:
+            f.write(json.dumps(self._seg) + "\n")
+        self._writer = self._sidecar = self._seg = None
+
+    def close(self, timeout=5):
+        self._stop.set()
+        try:
+            self.thread.join(timeout=timeout)
+        except Exception:
+            pass
+
+
+def read_index(path):
+    with open(os.path.join(path, 'index.jsonl')) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -3,4 +3,5 @@ from .consumers import DetectionsConsumer
 
 websocket_urlpatterns = [
     path('ws/detections/', DetectionsConsumer.as_asgi()),
+    path('ws/detections/<int:stream_id>/', DetectionsConsumer.as_asgi()),
 ]
@@ -0,0 +1,326 @@
+import json, os, struct, threading, time, zlib
+from multiprocessing import shared_memory
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import cv2
+import numpy as np
+from .broadcast import Broadcaster, VariantSet
+
+# One shared-memory ring per stream, written by `manage.py run_detector` and
+# read by any number of web workers (CORAL_BUS=client).
+#
+#   header: magic, slot count, slot capacity, latest complete seq, control key
+#   slot:   version, jpeg length, meta length, crc32, jpeg bytes, meta JSON bytes
+#
+# Frame seq n goes to slot n % slots. Each slot is a seqlock: the writer sets
+# version 2n-1 (odd, being written), copies the payload, then sets 2n, and
+# only then advances `latest`. A reader copies the slot out and re-checks the
+# version; a change means the writer lapped the ring meanwhile, so it retries
+# on the newest frame. Stores are plain memoryview writes with no barriers;
+# x86 does not reorder them, but weaker CPUs (ARM) may, so the reader also
+# checks the payload against the slot's crc32 and treats a mismatch as torn.
+# Readers never block the writer.
+#
+# The control key authenticates BusPool.call to the detector's ControlServer.
+# It is random per detector start and only readable through the segment,
+# which is created 0600, i.e. by the same user. It also tells readers apart
+# the segments of two detector runs: a restarted detector unlinks the old
+# segment and creates a new one under the same name, and a reader that has
+# seen no frame for REATTACH_SECS re-opens the name and switches over when
+# the key differs.
+MAGIC = b'CORALBUS'
+HEADER = struct.Struct('<8sIIQ32s')
+LATEST_OFF = 16
+SLOT_HEAD = struct.Struct('<QIII')
+VERSION = struct.Struct('<Q')
+_ATTACHED = object()
+# control calls a web worker may forward to the detector process
+CONTROL_CALLS = ('use_camera', 'use_webcam', 'use_video', 'start_recording', 'stop_recording',
+                 'job_status', 'probe_sources', 'list_sources', 'seek', 'get_profiles', 'set_profile',
+                 'track_counts')
+
+
+def bus_name(prefix, stream_id):
+    return f'{prefix}_s{stream_id}'
+
+
+def _attach(name):
+    # readers must not unlink the segment when they exit; before Python 3.13
+    # the resource tracker would, so unregister it by hand
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class FrameBus:
+    """Latest-frame ring in shared memory; see the layout notes above."""
+
+    def __init__(self, shm, owner=False):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, self.slots, self.slot_bytes, _, self.key = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{shm.name} is not a frame bus')
+        self.stride = SLOT_HEAD.size + self.slot_bytes
+        self.seq = VERSION.unpack_from(self.buf, LATEST_OFF)[0]
+        self.oversize = 0
+
+    @classmethod
+    def create(cls, name, slots=4, slot_bytes=4 * 1024 * 1024):
+        try:
+            # left over from a detector process that died without cleaning up
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        slots = max(2, int(slots))
+        shm = shared_memory.SharedMemory(name, create=True, size=HEADER.size + slots * (SLOT_HEAD.size + slot_bytes))
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_bytes, 0, os.urandom(32))
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(_attach(name))
+
+    def latest(self):
+        return VERSION.unpack_from(self.buf, LATEST_OFF)[0]
+
+    def publish(self, jpeg, meta):
+        """Writer side: meta is already-serialized JSON bytes."""
+        if len(jpeg) + len(meta) > self.slot_bytes:
+            self.oversize += 1
+            return False
+        seq = self.seq + 1
+        off = HEADER.size + (seq % self.slots) * self.stride
+        data = off + SLOT_HEAD.size
+        VERSION.pack_into(self.buf, off, 2 * seq - 1)
+        self.buf[data:data + len(jpeg)] = jpeg
+        self.buf[data + len(jpeg):data + len(jpeg) + len(meta)] = meta
+        crc = zlib.crc32(meta, zlib.crc32(jpeg))
+        SLOT_HEAD.pack_into(self.buf, off, 2 * seq - 1, len(jpeg), len(meta), crc)
+        VERSION.pack_into(self.buf, off, 2 * seq)
+        VERSION.pack_into(self.buf, LATEST_OFF, seq)
+        self.seq = seq
+        return True
+
+    def read(self, after_seq=0, retries=3):
+        """Reader side: (seq, jpeg, meta bytes) newer than after_seq, or None."""
+        for _ in range(retries):
+            seq = self.latest()
+            if seq <= after_seq:
+                return None
+            off = HEADER.size + (seq % self.slots) * self.stride
+            version, jlen, mlen, crc = SLOT_HEAD.unpack_from(self.buf, off)
+            if version != 2 * seq or jlen + mlen > self.slot_bytes:
+                continue  # already being overwritten
+            data = off + SLOT_HEAD.size
+            jpeg = bytes(self.buf[data:data + jlen])
+            meta = bytes(self.buf[data + jlen:data + jlen + mlen])
+            if VERSION.unpack_from(self.buf, off)[0] == version and zlib.crc32(meta, zlib.crc32(jpeg)) == crc:
+                return seq, jpeg, meta
+        return None
+
+    def close(self):
+        self.buf = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        except Exception:
+            pass
+
+
+class BusStream:
+    """Web-worker view of one detector stream, fed from its FrameBus.
+
+    Looks like a Detector to the views and consumers: the same VariantSet,
+    meta Broadcaster and get_frame()/get_meta(). A poll thread copies each
+    new frame out of shared memory once per worker; scaled variants are
+    re-encoded here, only while watched.
+    """
+
+    POLL = 0.005
+    REATTACH_SECS = 1.0
+
+    def __init__(self, pool, stream_id, bus):
+        self.pool = pool
+        self.stream_id = stream_id
+        self.bus = bus
+        self.lock = threading.Lock()
+        self.latest_jpeg = None
+        self.latest_meta = {"ts": None, "fps": 0.0, "detections": [], "stream": stream_id}
+        self.variants = VariantSet()
+        self.frames = self.variants.default
+        self.meta_updates = Broadcaster()
+        self.job_updates = Broadcaster()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._poll, name=f'coral-bus-{stream_id}', daemon=True)
+        self.thread.start()
+
+    def _poll(self):
+        from .detector import encode_jpeg
+        seq = 0
+        job = _ATTACHED
+        last = time.time()
+        while not self.stop_event.is_set():
+            item = self.bus.read(seq)
+            if item is None:
+                if time.time() - last >= self.REATTACH_SECS:
+                    last = time.time()
+                    if self._reattach():
+                        seq = 0  # the new segment counts from the start
+                time.sleep(self.POLL)
+                continue
+            last = time.time()
+            seq, jpeg, meta = item
+            try:
+                meta = json.loads(meta)
+            except ValueError:
+                continue
+            with self.lock:
+                self.latest_jpeg = jpeg
+                self.latest_meta = meta
+            self.frames.publish(jpeg)
+            scaled = [(k, b) for k, b in self.variants.active() if k != VariantSet.DEFAULT]
+            if scaled:
+                img = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                resized = {}
+                for (w, q), frames in scaled:
+                    out = encode_jpeg(img, w, q, resized) if img is not None else None
+                    if out is not None:
+                        frames.publish(out)
+            self.meta_updates.publish(meta)
+            if meta.get("source_job") != job:
+                # job updates ride along in meta; re-announce changes, not the one found on attach
+                if job is not _ATTACHED and meta.get("source_job") is not None:
+                    self.job_updates.publish(meta["source_job"])
+                job = meta.get("source_job")
+
+    def _reattach(self):
+        """Switch to a new segment under the same name (the detector restarted); True if it did."""
+        try:
+            bus = FrameBus.attach(self.bus.shm.name)
+        except (FileNotFoundError, ValueError):
+            return False  # detector not back yet, or its header not written yet
+        if bus.key == self.bus.key:
+            bus.close()
+            return False
+        old, self.bus = self.bus, bus
+        old.close()
+        if self.stream_id == 0:
+            self.pool.authkey = bus.key
+        return True
+
+    def get_frame(self):
+        with self.lock:
+            return self.latest_jpeg
+
+    def get_meta(self):
+        with self.lock:
+            return self.latest_meta
+
+    def stop(self):
+        self.stop_event.set()
+        try:
+            self.thread.join(timeout=2)
+        except Exception:
+            pass
+        self.bus.close()
+
+
+class BusPool:
+    """Attaches to every stream bus of a running detector process."""
+
+    def __init__(self, prefix, control_address):
+        self.control_address = control_address
+        self.streams = []
+        while True:
+            try:
+                bus = FrameBus.attach(bus_name(prefix, len(self.streams)))
+            except FileNotFoundError:
+                break
+            self.streams.append(BusStream(self, len(self.streams), bus))
+        if not self.streams:
+            raise RuntimeError(f"No detector process found (shared memory '{bus_name(prefix, 0)}'); "
+                               "start it with `manage.py run_detector`")
+        self.authkey = self.streams[0].bus.key
+
+    def get(self, stream_id=0):
+        if 0 <= stream_id < len(self.streams):
+            return self.streams[stream_id]
+        return None
+
+    def call(self, name, *args, **kwargs):
+        """Run a control function in the detector process."""
+        try:
+            conn = Client(self.control_address, authkey=self.authkey)
+        except OSError as e:
+            return {"ok": False, "error": f"detector process unreachable: {e}"}
+        except AuthenticationError:
+            # a restarted detector has a new key; the poll thread picks it up shortly
+            return {"ok": False, "error": "detector process restarted; try again"}
+        try:
+            conn.send((name, args, kwargs))
+            return conn.recv()
+        finally:
+            conn.close()
+
+    def stop(self):
+        for s in self.streams:
+            s.stop()
+
+
+class ControlServer:
+    """Detector-process side of BusPool.call: runs whitelisted control calls.
+
+    authkey is the key in stream 0's bus header; connections are only
+    unpickled after the handshake proves the client knows it.
+    """
+
+    def __init__(self, address, authkey, handlers):
+        self.handlers = handlers
+        self.listener = Listener(address, authkey=authkey)
+        self.thread = threading.Thread(target=self._serve, name='coral-bus-control', daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                return  # listener closed
+            except Exception:
+                continue  # bad authkey or a client that went away
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        try:
+            name, args, kwargs = conn.recv()
+            fn = self.handlers.get(name)
+            if fn is None:
+                out = {"ok": False, "error": f"unknown control call {name!r}"}
+            else:
+                try:
+                    out = fn(*args, **kwargs)
+                except Exception as e:
+                    out = {"ok": False, "error": str(e)}
+            conn.send(out)
+        except Exception:
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        try:
+            self.listener.close()
+        except Exception:
+            pass
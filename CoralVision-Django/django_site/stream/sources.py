@@ -0,0 +1,241 @@
+import collections, datetime, itertools, queue, threading, time
+import cv2
+
+JOB_HISTORY = 100
+
+
+def open_capture(src):
+    cap = cv2.VideoCapture(src)
+    if not cap.isOpened() and src == 0:
+        # Windows often needs DirectShow backend
+        try:
+            cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        except Exception:
+            pass
+    return cap
+
+
+def source_label(src):
+    return 'file' if isinstance(src, str) else 'webcam'
+
+
+def capabilities(src, cap):
+    """What an opened capture delivers; read once and cached per source."""
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    caps = {
+        "source": src,
+        "kind": source_label(src),
+        "ok": True,
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": round(float(fps), 2) if fps and fps > 0 else None,
+        "probed": datetime.datetime.utcnow().isoformat(),
+    }
+    try:
+        caps["backend"] = cap.getBackendName()
+    except Exception:
+        pass
+    if isinstance(src, str):
+        caps["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return caps
+
+
+class SourceManager:
+    """Opens, probes and keeps warm the captures behind every stream.
+
+    Switch and probe requests become jobs run one at a time on a
+    background thread, so neither the request nor the capture loop ever
+    waits on a device open. A switch job hands the stream a capture that
+    is already open and has delivered a frame; the stream swaps it in
+    between two reads and gives its previous capture back, which stays
+    open (up to max_warm idle captures, least recently used evicted) so
+    switching back is instant. Capabilities of every source seen are
+    cached. A source that just failed a probe is not probed again for
+    probe_ttl seconds; an explicit switch always tries to open it.
+    """
+
+    def __init__(self, max_warm=2, probe_ttl=30.0, on_update=None):
+        self.max_warm = max(0, int(max_warm))
+        self.probe_ttl = probe_ttl
+        self.on_update = on_update  # called with each job snapshot when its state changes
+        self.caps = {}  # source -> capabilities (or {"ok": False, "error": ..})
+        self._warm = collections.OrderedDict()  # source -> idle opened capture
+        self._lock = threading.Lock()
+        self._jobs = collections.OrderedDict()
+        self._ids = itertools.count(1)
+        self.q = queue.Queue()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='coral-sources', daemon=True)
+        self.thread.start()
+
+    # captures
+
+    def acquire(self, src):
+        """An open capture for src: a warm one if there is one, else opened now (blocking)."""
+        with self._lock:
+            cap = self._warm.pop(src, None)
+        if cap is not None:
+            if isinstance(src, str):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return cap
+        cap = open_capture(src)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        return cap
+
+    def release(self, src, cap):
+        """Give back an idle capture; it stays open unless the warm pool is full."""
+        if cap is None:
+            return
+        evicted = []
+        with self._lock:
+            old = self._warm.pop(src, None)
+            if old is not None and old is not cap:
+                evicted.append(old)
+            if self.max_warm:
+                self._warm[src] = cap
+            else:
+                evicted.append(cap)
+            while len(self._warm) > self.max_warm:
+                evicted.append(self._warm.popitem(last=False)[1])
+        for c in evicted:
+            try:
+                c.release()
+            except Exception:
+                pass
+
+    def warm(self):
+        with self._lock:
+            return list(self._warm)
+
+    # jobs
+
+    def _new_job(self, kind, stream, source):
+        job = {
+            "id": next(self._ids), "kind": kind, "stream": stream, "source": source,
+            "state": "queued", "error": None, "created": datetime.datetime.utcnow().isoformat(), "finished": None,
+        }
+        with self._lock:
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        return job
+
+    def _update(self, job, state, error=None, **extra):
+        with self._lock:
+            job.update(extra, state=state, error=error)
+            if state in ('done', 'failed', 'cancelled'):
+                job["finished"] = datetime.datetime.utcnow().isoformat()
+            snapshot = dict(job)
+        if self.on_update is not None:
+            try:
+                self.on_update(snapshot)
+            except Exception:
+                pass
+
+    def job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def switch(self, det, src):
+        """Queue a switch of det to src; returns the job snapshot."""
+        job = self._new_job('switch', det.stream_id, src)
+        self.q.put((job, det))
+        return dict(job)
+
+    def probe(self, sources):
+        """Queue a capability probe of several sources (opened captures are kept warm)."""
+        job = self._new_job('probe', None, list(sources))
+        self.q.put((job, None))
+        return dict(job)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                job, det = self.q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._update(job, 'running')
+            try:
+                if job["kind"] == 'switch':
+                    self._switch(job, det)
+                else:
+                    self._probe(job)
+            except Exception as e:
+                self._update(job, 'failed', str(e))
+
+    def _open_checked(self, src, recent_failure_ok=False):
+        """(capture, None) once it has delivered a frame, else (None, error).
+
+        recent_failure_ok returns a failure younger than probe_ttl without
+        opening the device again (background probes only).
+        """
+        cached = self.caps.get(src)
+        if (recent_failure_ok and cached is not None and not cached["ok"]
+                and time.time() - cached["at"] < self.probe_ttl):
+            return None, cached["error"]
+        cap = self.acquire(src)
+        if cap is None or not cap.read()[0]:
+            if cap is not None:
+                cap.release()
+            error = f"Cannot open video: {src}" if isinstance(src, str) else f"Webcam {src} not available"
+            self.caps[src] = {"source": src, "kind": source_label(src), "ok": False, "error": error, "at": time.time()}
+            return None, error
+        if isinstance(src, str):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.caps[src] = capabilities(src, cap)
+        return cap, None
+
+    def _switch(self, job, det):
+        # already playing (a pending switch elsewhere is dropped) or already on its way in
+        settled = det.settle_switch(job["source"], job)
+        if settled == 'current':
+            self._update(job, 'done', caps=self.caps.get(job["source"]))
+            return
+        if settled == 'pending':
+            self._update(job, 'ready', caps=self.caps.get(job["source"]))
+            return
+        cap, error = self._open_checked(job["source"])
+        if cap is None:
+            # the stream never stopped reading its current source
+            self._update(job, 'failed', error)
+            return
+        self._update(job, 'ready', caps=self.caps[job["source"]])
+        # the capture loop swaps it in and finishes the job
+        det.request_switch(job["source"], cap, job)
+
+    def _probe(self, job):
+        results = []
+        for src in job["source"]:
+            cap, error = self._open_checked(src, recent_failure_ok=True)
+            results.append(self.caps[src])
+            if cap is not None:
+                self.release(src, cap)
+        self._update(job, 'done', results=results)
+
+    def switched(self, job, error=None):
+        self._update(job, 'failed' if error else 'done', error)
+
+    def stats(self):
+        return {"warm": self.warm(), "capabilities": list(self.caps.values())}
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.thread.join(timeout=2)
+        except Exception:
+            pass
+        with self._lock:
+            warm, self._warm = list(self._warm.values()), collections.OrderedDict()
+        for cap in warm:
+            try:
+                cap.release()
+            except Exception:
+                pass
+
+
+def src_is(a, b):
+    # 0 == False etc.: compare type as well as value
+    return type(a) is type(b) and a == b
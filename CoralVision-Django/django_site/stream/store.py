@@ -0,0 +1,154 @@
+import threading, time, queue, datetime
+from django.db import transaction, DatabaseError
+from django.db.models import F
+from django.db.models.functions import Greatest
+from .models import Detection, DetectionMinute, Track, TrackMinute
+
+
+def parse_ts(ts):
+    # detector timestamps are naive UTC isoformat strings
+    dt = ts if isinstance(ts, datetime.datetime) else datetime.datetime.fromisoformat(ts)
+    return dt if dt.tzinfo else dt.replace(tzinfo=datetime.timezone.utc)
+
+
+def save_detections(rows):
+    """Insert (ts, source, det) rows and fold them into the minute rollup."""
+    objs = []
+    rollup = {}
+    for ts, source, d in rows:
+        ts = parse_ts(ts)
+        objs.append(Detection(
+            ts=ts, source=source, class_id=d['class_id'], class_name=d['class_name'], conf=d['conf'],
+            x1=d['x1'], y1=d['y1'], x2=d['x2'], y2=d['y2'],
+        ))
+        key = (ts.replace(second=0, microsecond=0), source, d['class_id'])
+        agg = rollup.setdefault(key, [d['class_name'], 0, 0.0])
+        agg[1] += 1
+        agg[2] = max(agg[2], d['conf'])
+    with transaction.atomic():
+        Detection.objects.bulk_create(objs, batch_size=2000)
+        for (bucket, source, class_id), (name, count, max_conf) in rollup.items():
+            updated = DetectionMinute.objects.filter(bucket=bucket, source=source, class_id=class_id).update(
+                count=F('count') + count, max_conf=Greatest('max_conf', max_conf),
+            )
+            if not updated:
+                DetectionMinute.objects.create(
+                    bucket=bucket, source=source, class_id=class_id, class_name=name, count=count, max_conf=max_conf,
+                )
+    return len(objs)
+
+
+def save_tracks(rows):
+    """Insert (source, track record) rows and count each track once per minute it spans."""
+    objs = []
+    rollup = {}
+    for source, r in rows:
+        first, last = parse_ts(r['first_seen']), parse_ts(r['last_seen'])
+        objs.append(Track(
+            source=source, track_id=r['track_id'], class_id=r['class_id'], class_name=r['class_name'],
+            first_seen=first, last_seen=last, frames=r['frames'], max_conf=r['max_conf'], mean_conf=r['mean_conf'],
+            best_ts=parse_ts(r['best_ts']), x1=r['x1'], y1=r['y1'], x2=r['x2'], y2=r['y2'],
+        ))
+        bucket, end = first.replace(second=0, microsecond=0), last.replace(second=0, microsecond=0)
+        while bucket <= end:
+            agg = rollup.setdefault((bucket, source, r['class_id']), [r['class_name'], 0])
+            agg[1] += 1
+            bucket += datetime.timedelta(minutes=1)
+    with transaction.atomic():
+        Track.objects.bulk_create(objs, batch_size=2000)
+        for (bucket, source, class_id), (name, count) in rollup.items():
+            updated = TrackMinute.objects.filter(bucket=bucket, source=source, class_id=class_id).update(
+                count=F('count') + count,
+            )
+            if not updated:
+                TrackMinute.objects.create(bucket=bucket, source=source, class_id=class_id, class_name=name, count=count)
+    return len(objs)
+
+
+class DetectionStore:
+    """Background batched writer of detections into the database.
+
+    Same contract as LogSink: submit() never blocks, a full queue counts a
+    drop, and rows are inserted in one transaction every flush_rows rows or
+    flush_secs seconds. Ended tracks (submit_tracks) go through the same
+    queue into Track/TrackMinute. Database errors (e.g. migrations not applied) are
+    counted and the batch is discarded so the detector keeps running.
+    """
+
+    def __init__(self, source=0, flush_rows=1000, flush_secs=2.0, queue_size=1000):
+        self.source = source
+        self.flush_rows = flush_rows
+        self.flush_secs = flush_secs
+        self.q = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.rows_written = 0
+        self.tracks_written = 0
+        self._buf = []
+        self._tracks = []
+        self._last_flush = time.time()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f'coral-store-{source}', daemon=True)
+        self.thread.start()
+
+    def submit(self, ts, dets):
+        try:
+            self.q.put_nowait((ts, dets))
+        except queue.Full:
+            self.dropped += 1
+
+    def submit_tracks(self, records):
+        try:
+            self.q.put_nowait((None, records))
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {
+            "queue": self.q.qsize(),
+            "dropped": self.dropped,
+            "rows": self.rows_written,
+            "tracks": self.tracks_written,
+            "errors": self.errors,
+        }
+
+    def _run(self):
+        from django.db import connection
+        try:
+            while not self._stop.is_set() or not self.q.empty():
+                try:
+                    ts, dets = self.q.get(timeout=0.2)
+                    if ts is None:
+                        self._tracks.extend((self.source, r) for r in dets)
+                    else:
+                        self._buf.extend((ts, self.source, d) for d in dets)
+                except queue.Empty:
+                    pass
+                pending = len(self._buf) + len(self._tracks)
+                if pending and (pending >= self.flush_rows or time.time() - self._last_flush >= self.flush_secs):
+                    self._flush()
+            if self._buf or self._tracks:
+                self._flush()
+        finally:
+            connection.close()
+
+    def _flush(self):
+        rows, self._buf = self._buf, []
+        tracks, self._tracks = self._tracks, []
+        self._last_flush = time.time()
+        try:
+            if rows:
+                self.rows_written += save_detections(rows)
+            if tracks:
+                self.tracks_written += save_tracks(tracks)
+        except DatabaseError as e:
+            self.errors += 1
+            self.last_error = str(e)
+
+    def close(self, timeout=2):
+        self._stop.set()
+        try:
+            self.thread.join(timeout=timeout)
+        except Exception:
+            pass
@@ -0,0 +1,123 @@
+import json, math
+import numpy as np
+from .dets import empty
+
+
+class TileConfig:
+    """How one source is cut up for inference.
+
+    tile is the square tile size in pixels (0 = no tiling), overlap the
+    fraction shared by neighbouring tiles, batch how many tiles go into one
+    predict call. rois are static (x1, y1, x2, y2) regions, normalized to
+    0..1, outside of which nothing is inferred or reported.
+    """
+
+    __slots__ = ('tile', 'overlap', 'batch', 'rois', 'merge_thresh')
+
+    def __init__(self, tile=0, overlap=0.2, batch=8, rois=None, merge_thresh=0.6):
+        self.tile = int(tile)
+        self.overlap = min(0.9, max(0.0, float(overlap)))
+        self.batch = max(1, int(batch))
+        self.rois = [tuple(float(v) for v in r) for r in (rois or [])]
+        self.merge_thresh = merge_thresh
+
+    @property
+    def enabled(self):
+        return self.tile > 0 or bool(self.rois)
+
+    def as_dict(self):
+        return {"tile": self.tile, "overlap": self.overlap, "batch": self.batch, "rois": self.rois}
+
+
+def parse_rois(spec):
+    # "0,0.3,1,1;0.5,0,1,0.3" -> [(0, 0.3, 1, 1), (0.5, 0, 1, 0.3)]
+    return [tuple(float(v) for v in part.split(',')) for part in (spec or '').split(';') if part.strip()]
+
+
+def load_configs(default, path=None):
+    """Per-stream TileConfigs: JSON {"<stream id>": {"tile": .., "rois": ..}} over the env default."""
+    if not path:
+        return {}
+    with open(path) as f:
+        raw = json.load(f)
+    base = default.as_dict()
+    return {int(k): TileConfig(**dict(base, **v)) for k, v in raw.items()}
+
+
+def _starts(length, tile, step):
+    if length <= tile:
+        return [0]
+    n = math.ceil((length - tile) / step) + 1
+    return [min(i * step, length - tile) for i in range(n)]
+
+
+def plan_tiles(w, h, cfg):
+    """Pixel (x1, y1, x2, y2) crops covering the frame's ROIs."""
+    rois = [(int(x1 * w), int(y1 * h), int(math.ceil(x2 * w)), int(math.ceil(y2 * h))) for x1, y1, x2, y2 in cfg.rois] \
+        or [(0, 0, w, h)]
+    if cfg.tile <= 0:
+        return rois
+    size = min(cfg.tile, w, h)
+    step = max(1, int(size * (1 - cfg.overlap)))
+    tiles = [(x, y, x + size, y + size) for y in _starts(h, size, step) for x in _starts(w, size, step)]
+    return [t for t in tiles if any(t[0] < r[2] and r[0] < t[2] and t[1] < r[3] and r[1] < t[3] for r in rois)]
+
+
+def merge_boxes(arr, thresh):
+    """Class-wise greedy merge of cross-tile duplicates.
+
+    Uses intersection over the smaller box, so a box clipped by a tile
+    edge is absorbed by the complete one from the neighbouring tile; the
+    kept box grows to cover both.
+    """
+    if len(arr) < 2:
+        return arr
+    arr = arr[np.argsort(-arr['conf'], kind='stable')]
+    xy = np.stack([arr[c] for c in ('x1', 'y1', 'x2', 'y2')], axis=1).astype(np.float64)
+    area = (xy[:, 2] - xy[:, 0]) * (xy[:, 3] - xy[:, 1])
+    ix = np.clip(np.minimum(xy[:, None, 2], xy[None, :, 2]) - np.maximum(xy[:, None, 0], xy[None, :, 0]), 0, None)
+    iy = np.clip(np.minimum(xy[:, None, 3], xy[None, :, 3]) - np.maximum(xy[:, None, 1], xy[None, :, 1]), 0, None)
+    ios = ix * iy / np.maximum(np.minimum(area[:, None], area[None, :]), 1e-9)
+    same = (arr['class_id'][:, None] == arr['class_id'][None, :]) & (ios >= thresh)
+    keep = np.ones(len(arr), bool)
+    for i in range(len(arr)):
+        if not keep[i]:
+            continue
+        dup = same[i] & keep
+        dup[:i + 1] = False
+        if dup.any():
+            for c in ('x1', 'y1'):
+                arr[c][i] = min(arr[c][i], arr[c][dup].min())
+            for c in ('x2', 'y2'):
+                arr[c][i] = max(arr[c][i], arr[c][dup].max())
+            keep[dup] = False
+    return arr[keep]
+
+
+def predict_tiled(backend, frame, cfg, conf):
+    """Run one frame as tiles in batches of cfg.batch; returns a merged detection array."""
+    h, w = frame.shape[:2]
+    tiles = plan_tiles(w, h, cfg)
+    if not tiles:
+        return empty()
+    parts = []
+    for i in range(0, len(tiles), cfg.batch):
+        chunk = tiles[i:i + cfg.batch]
+        for (x1, y1, _, _), dets in zip(chunk, backend.predict([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in chunk], conf)):
+            if len(dets):
+                dets = dets.copy()
+                dets['x1'] += x1; dets['x2'] += x1
+                dets['y1'] += y1; dets['y2'] += y1
+                parts.append(dets)
+    if not parts:
+        return empty()
+    arr = np.concatenate(parts)
+    if cfg.rois:
+        # report only boxes centred inside a ROI
+        cx = (arr['x1'] + arr['x2']) / (2 * w)
+        cy = (arr['y1'] + arr['y2']) / (2 * h)
+        inside = np.zeros(len(arr), bool)
+        for x1, y1, x2, y2 in cfg.rois:
+            inside |= (cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)
+        arr = arr[inside]
+    return merge_boxes(arr, cfg.merge_thresh) if len(tiles) > 1 else arr
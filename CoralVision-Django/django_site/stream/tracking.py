@@ -0,0 +1,126 @@
+import math
+import cv2
+import numpy as np
+from .dets import empty
+
+
+def box_iou(a, b):
+    """IoU of two detection dicts (x1, y1, x2, y2 keys)."""
+    ix = max(0.0, min(a['x2'], b['x2']) - max(a['x1'], b['x1']))
+    iy = max(0.0, min(a['y2'], b['y2']) - max(a['y1'], b['y1']))
+    inter = ix * iy
+    union = (a['x2'] - a['x1']) * (a['y2'] - a['y1']) + (b['x2'] - b['x1']) * (b['y2'] - b['y1']) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FlowTracker:
+    """Moves the last detector boxes along sparse optical flow.
+
+    Between detector runs each box is shifted by the median Lucas-Kanade
+    displacement of a few feature points inside it, computed on a
+    downscaled grayscale frame so a step costs a few milliseconds on CPU.
+    """
+
+    def __init__(self, scale=0.5, max_points=12):
+        self.scale = scale
+        self.max_points = max_points
+        self._prev = None
+        self._dets = empty()
+
+    def _gray(self, frame):
+        g = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.scale != 1.0:
+            g = cv2.resize(g, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return g
+
+    def reset(self, frame, dets):
+        self._prev = self._gray(frame)
+        self._dets = dets.copy()
+
+    def _points(self, gray, d):
+        s = self.scale
+        h, w = gray.shape[:2]
+        x1, y1 = max(0, int(d['x1'] * s)), max(0, int(d['y1'] * s))
+        x2, y2 = min(w, int(d['x2'] * s)), min(h, int(d['y2'] * s))
+        if x2 - x1 < 2 or y2 - y1 < 2:
+            return None
+        mask = np.zeros_like(gray)
+        mask[y1:y2, x1:x2] = 255
+        pts = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+        if pts is None:
+            # textureless patch: fall back to a 3x3 grid
+            xs = np.linspace(x1, x2 - 1, 5)[1:4]
+            ys = np.linspace(y1, y2 - 1, 5)[1:4]
+            pts = np.array([[[x, y]] for y in ys for x in xs], dtype=np.float32)
+        return pts.astype(np.float32)
+
+    def update(self, frame):
+        if self._prev is None:
+            return empty()
+        gray = self._gray(frame)
+        if not len(self._dets):
+            self._prev = gray
+            return empty()
+        seeds, owners = [], []
+        for i, d in enumerate(self._dets):
+            pts = self._points(self._prev, d)
+            if pts is not None:
+                seeds.append(pts)
+                owners.extend([i] * len(pts))
+        if seeds:
+            p0 = np.concatenate(seeds)
+            p1, st, _ = cv2.calcOpticalFlowPyrLK(self._prev, gray, p0, None, winSize=(15, 15), maxLevel=2)
+            owners = np.asarray(owners)
+            good = st.reshape(-1) == 1
+            delta = (p1 - p0).reshape(-1, 2) / self.scale
+            d = self._dets
+            for i in range(len(d)):
+                sel = good & (owners == i)
+                if not sel.any():
+                    continue
+                dx, dy = np.median(delta[sel], axis=0)
+                d['x1'][i] += dx; d['x2'][i] += dx
+                d['y1'][i] += dy; d['y2'][i] += dy
+        self._prev = gray
+        return self._dets.copy()
+
+
+class SkipController:
+    """Chooses K, the detector stride, so output keeps up with target_fps.
+
+    With an inference cost t_inf and a tracker step t_trk, running the
+    detector every K frames costs (t_inf + (K-1)*t_trk)/K per frame; K is
+    the smallest stride that fits the 1/target_fps budget.
+    """
+
+    def __init__(self, target_fps, max_k=8):
+        self.target_fps = float(target_fps)
+        self.max_k = max(1, int(max_k))
+        self.k = 1
+        self.t_inf = None
+        self.t_trk = None
+
+    @staticmethod
+    def _ema(old, new):
+        return new if old is None else 0.8 * old + 0.2 * new
+
+    def observe_inference(self, seconds):
+        self.t_inf = self._ema(self.t_inf, seconds)
+        self._update()
+
+    def observe_track(self, seconds):
+        self.t_trk = self._ema(self.t_trk, seconds)
+        self._update()
+
+    def _update(self):
+        if self.t_inf is None or self.target_fps <= 0:
+            return
+        budget = 1.0 / self.target_fps
+        t_trk = self.t_trk or 0.0
+        if self.t_inf <= budget:
+            k = 1
+        elif t_trk >= budget:
+            k = self.max_k
+        else:
+            k = math.ceil((self.t_inf - t_trk) / (budget - t_trk))
+        self.k = max(1, min(self.max_k, k))
@@ -0,0 +1,188 @@
+import datetime
+import numpy as np
+from .dets import COORDS, class_name
+
+# Per-track aggregation after inference. Each box is matched to a live track
+# of its class by IoU, so an object seen for ten seconds becomes one track
+# (one log record) instead of ~300 per-frame rows. A track is confirmed once
+# it was seen on min_hits frames (shorter ones are treated as noise) and
+# ends when it has not been seen for max_age seconds. Unique tracks per
+# class and minute are counted as frames arrive: a confirmed track counts
+# once in every minute it was seen in.
+
+TRACK_FIELDS = ['track_id', 'class_id', 'class_name', 'first_seen', 'last_seen', 'frames',
+                'max_conf', 'mean_conf', 'best_ts', 'x1', 'y1', 'x2', 'y2']
+
+
+def _seconds(ts):
+    # detector timestamps are naive UTC isoformat strings
+    return datetime.datetime.fromisoformat(ts).replace(tzinfo=datetime.timezone.utc).timestamp()
+
+
+def iou_matrix(a, b):
+    """IoU of every box in a (n, 4) against every box in b (m, 4), as (n, m)."""
+    ix = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    iy = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = ix * iy
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    __slots__ = ('id', 'class_id', 'box', 'first_ts', 'last_ts', 'last_t', 'hits', 'conf_sum', 'max_conf',
+                 'best_box', 'best_ts', 'minute')
+
+    def __init__(self, tid, class_id, box, conf, ts, t):
+        self.id = tid
+        self.class_id = class_id
+        self.box = box
+        self.first_ts = ts
+        self.hits = 0
+        self.conf_sum = 0.0
+        self.max_conf = -1.0
+        self.minute = None  # last minute this track was counted in; None until confirmed
+        self.seen(box, conf, ts, t)
+
+    def seen(self, box, conf, ts, t):
+        self.box = box
+        self.last_ts = ts
+        self.last_t = t
+        self.hits += 1
+        self.conf_sum += conf
+        if conf > self.max_conf:
+            self.max_conf = conf
+            self.best_box = box
+            self.best_ts = ts
+
+
+class TrackAggregator:
+    """Stable track IDs and per-track summaries for one stream's detections.
+
+    update() is called once per output frame from a single thread; it
+    returns the track ID of every box and the records of tracks that ended.
+    """
+
+    def __init__(self, names=None, iou_threshold=0.3, max_age=1.0, min_hits=3, keep_minutes=1440):
+        self.names = names if names is not None else {}
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = max(1, int(min_hits))
+        self.keep_minutes = keep_minutes
+        self.tracks = {}  # id -> Track
+        self.counts = {}  # 'YYYY-MM-DDTHH:MM' -> {class_id: unique tracks}, oldest first
+        self.finished = 0
+        self.discarded = 0
+        self._next_id = 1
+
+    def update(self, ts, arr):
+        """Match one frame's detection array; returns (track IDs aligned with arr, ended track records)."""
+        t = _seconds(ts)
+        ended = [tr for tr in self.tracks.values() if t - tr.last_t > self.max_age]
+        records = self._end(ended)
+        ids = np.zeros(len(arr), np.int64)
+        if len(arr):
+            boxes = np.stack([arr[c] for c in COORDS], axis=1).astype(np.float64)
+            confs = arr['conf'].tolist()
+            classes = arr['class_id']
+            for cid in np.unique(classes).tolist():
+                idx = np.flatnonzero(classes == cid)
+                live = [tr for tr in self.tracks.values() if tr.class_id == cid]
+                taken = set()
+                if live:
+                    iou = iou_matrix(np.array([tr.box for tr in live]), boxes[idx])
+                    used = set()
+                    # greedy: best overlapping pairs first
+                    for flat in np.argsort(iou, axis=None)[::-1].tolist():
+                        i, j = divmod(flat, len(idx))
+                        if iou[i, j] < self.iou_threshold:
+                            break
+                        if i in used or j in taken:
+                            continue
+                        used.add(i)
+                        taken.add(j)
+                        self._seen(live[i], boxes[idx[j]], confs[idx[j]], ts, t)
+                        ids[idx[j]] = live[i].id
+                for j in range(len(idx)):
+                    if j not in taken:
+                        k = idx[j]
+                        tr = Track(self._next_id, cid, boxes[k], confs[k], ts, t)
+                        self._next_id += 1
+                        self.tracks[tr.id] = tr
+                        self._confirm(tr)
+                        ids[k] = tr.id
+        return ids, records
+
+    def _seen(self, tr, box, conf, ts, t):
+        tr.seen(box, conf, ts, t)
+        if tr.minute is None:
+            self._confirm(tr)
+        elif ts[:16] != tr.minute:
+            self._count(tr, ts[:16])
+
+    def _confirm(self, tr):
+        if tr.hits < self.min_hits:
+            return
+        self._count(tr, tr.first_ts[:16])
+        if tr.last_ts[:16] != tr.minute:
+            self._count(tr, tr.last_ts[:16])
+
+    def _count(self, tr, minute):
+        tr.minute = minute
+        bucket = self.counts.get(minute)
+        if bucket is None:
+            late = bool(self.counts) and minute < next(reversed(self.counts))
+            bucket = {}
+            if late:
+                # a track confirmed after the minute turned counts in an older
+                # one; rebuild in minute order (assigned whole, readers copy it)
+                self.counts = dict(sorted({**self.counts, minute: bucket}.items()))
+            else:
+                self.counts[minute] = bucket
+            while len(self.counts) > self.keep_minutes:
+                del self.counts[next(iter(self.counts))]
+        bucket[tr.class_id] = bucket.get(tr.class_id, 0) + 1
+
+    def _end(self, tracks):
+        records = []
+        for tr in tracks:
+            del self.tracks[tr.id]
+            if tr.minute is None:
+                self.discarded += 1
+                continue
+            self.finished += 1
+            x1, y1, x2, y2 = (round(float(v), 2) for v in tr.best_box)
+            records.append({
+                "track_id": tr.id, "class_id": tr.class_id, "class_name": class_name(self.names, tr.class_id),
+                "first_seen": tr.first_ts, "last_seen": tr.last_ts, "frames": tr.hits,
+                "max_conf": round(tr.max_conf, 4), "mean_conf": round(tr.conf_sum / tr.hits, 4), "best_ts": tr.best_ts,
+                "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            })
+        return records
+
+    def flush(self):
+        """End every live track (shutdown); returns their records."""
+        return self._end(list(self.tracks.values()))
+
+    def minute_counts(self, last=None):
+        minutes = list(self.counts.items())  # a copy: the output thread keeps adding
+        if last:
+            minutes = minutes[-last:]
+        return [{"minute": m, "counts": {class_name(self.names, c): n for c, n in sorted(b.items())}}
+                for m, b in minutes]
+
+    def stats(self):
+        latest = self.minute_counts(1)
+        live = list(self.tracks.values())  # may be read from another thread
+        return {
+            "active": sum(1 for tr in live if tr.minute is not None),
+            "tentative": sum(1 for tr in live if tr.minute is None),
+            "finished": self.finished,
+            "discarded": self.discarded,
+            "minute": latest[0] if latest else None,
+        }
+
+
+def track_rows(records):
+    return [[r[f] for f in TRACK_FIELDS] for r in records]
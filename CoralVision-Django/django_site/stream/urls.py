@@ -4,10 +4,23 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('video_feed', views.video_feed, name='video_feed'),
+    path('video_feed/<int:stream_id>', views.video_feed, name='video_feed_stream'),
+    path('metrics', views.metrics, name='metrics'),
     # control APIs
+    path('api/streams', views.api_streams, name='api_streams'),
+    path('api/detections', views.api_detections, name='api_detections'),
+    path('api/stats', views.api_stats, name='api_stats'),
+    path('api/tracks', views.api_tracks, name='api_tracks'),
+    path('api/track_counts', views.api_track_counts, name='api_track_counts'),
+    path('api/events', views.api_events, name='api_events'),
+    path('api/events/<str:name>', views.api_event_clip, name='api_event_clip'),
+    path('api/sources', views.api_sources, name='api_sources'),
+    path('api/jobs/<int:job_id>', views.api_job, name='api_job'),
     path('api/use_webcam', views.api_use_webcam, name='api_use_webcam'),
     path('api/use_video', views.api_use_video, name='api_use_video'),
     path('api/use_camera', views.api_use_camera, name='api_use_camera'),
+    path('api/seek', views.api_seek, name='api_seek'),
+    path('api/profile', views.api_profile, name='api_profile'),
     path('api/start_recording', views.api_start_recording, name='api_start_recording'),
     path('api/stop_recording', views.api_stop_recording, name='api_stop_recording'),
 ]
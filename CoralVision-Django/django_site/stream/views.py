@@ -1,26 +1,89 @@
-import time
-from django.http import StreamingHttpResponse, JsonResponse
+import asyncio, datetime, os, time
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse, JsonResponse, FileResponse, Http404, HttpResponse
 from django.shortcuts import render
-from .detector import get_detector, use_webcam, use_video, start_recording, stop_recording, use_camera
+from .metrics import BYTES_SENT, REGISTRY
 from django.views.decorators.csrf import csrf_exempt
+from django.db.models import Count, F, Sum, Max
+from django.db.models.functions import TruncHour, TruncDay
+from django.utils.dateparse import parse_datetime
+from .models import Detection, DetectionMinute, Track, TrackMinute
+from .store import parse_ts
+
+
+def _detector():
+    # imported on first use: manage.py commands and /metrics never load the
+    # pipeline modules, and the model itself loads with the first stream
+    from . import detector
+    return detector
 
 
 def index(request):
     return render(request, 'stream/index.html')
 
 
-def _mjpeg():
-    boundary = b'--frame'
-    det = get_detector()
-    while True:
-        jpeg = det.get_frame()
-        if jpeg:
-            yield boundary + b"\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
-        time.sleep(0.02)
+# Each viewer waits on its variant's FrameBroadcaster for a frame newer than
+# the last one it sent; a slow viewer jumps straight to the newest frame.
+# ?fps= caps a viewer's rate by sleeping between frames.
+async def _mjpeg_async(variants, key, fps=0, stream_id=0):
+    seq, last = 0, 0.0
+    sent = BYTES_SENT.labels(stream_id, 'mjpeg')
+    frames = variants.subscribe(key)
+    try:
+        while True:
+            if fps:
+                delay = last + 1.0 / fps - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            new_seq, value = await frames.wait_async(seq)
+            if new_seq > seq and value:
+                seq, last = new_seq, time.monotonic()
+                sent.inc(len(value[1]))
+                yield value[1]
+    finally:
+        variants.unsubscribe(key)
+
+
+def _mjpeg(variants, key, fps=0, stream_id=0):
+    # WSGI fallback (one thread per viewer)
+    seq, last = 0, 0.0
+    sent = BYTES_SENT.labels(stream_id, 'mjpeg')
+    frames = variants.subscribe(key)
+    try:
+        while True:
+            if fps:
+                delay = last + 1.0 / fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            new_seq, value = frames.wait(seq)
+            if new_seq > seq and value:
+                seq, last = new_seq, time.monotonic()
+                sent.inc(len(value[1]))
+                yield value[1]
+    finally:
+        variants.unsubscribe(key)
+
+
+async def video_feed(request, stream_id=0):
+    # ?w= output width (aspect kept), ?q= JPEG quality, ?fps= max frame rate
+    try:
+        w = int(request.GET['w']) if request.GET.get('w') else None
+        q = int(request.GET['q']) if request.GET.get('q') else None
+        fps = max(0.0, float(request.GET.get('fps') or 0))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid w, q or fps"}, status=400)
+    det = await sync_to_async(_detector().get_detector)(stream_id)
+    if det is None:
+        return JsonResponse({"ok": False, "error": f"Unknown stream {stream_id}"}, status=404)
+    key = det.variants.key(w, q)
+    mjpeg = _mjpeg_async if isinstance(request, ASGIRequest) else _mjpeg
+    return StreamingHttpResponse(mjpeg(det.variants, key, fps, stream_id), content_type='multipart/x-mixed-replace; boundary=frame')
 
 
-def video_feed(request):
-    return StreamingHttpResponse(_mjpeg(), content_type='multipart/x-mixed-replace; boundary=frame')
+def _stream_id(request):
+    # ?stream=<id> selects the DetectorPool stream; defaults to the first
+    return int(request.GET.get('stream', '0'))
 
 
 # Control endpoints (POST recommended; allow GET for simplicity during dev)
@@ -28,14 +91,39 @@ def video_feed(request):
 def api_use_webcam(request):
     if request.method not in ("POST", "GET"):
         return JsonResponse({"ok": False, "error": "method not allowed"}, status=405)
-    return JsonResponse(use_webcam())
+    try:
+        stream_id = _stream_id(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream"}, status=400)
+    return JsonResponse(_detector().use_webcam(stream_id))
 
 
 @csrf_exempt
 def api_use_video(request):
     if request.method not in ("POST", "GET"):
         return JsonResponse({"ok": False, "error": "method not allowed"}, status=405)
-    return JsonResponse(use_video())
+    try:
+        stream_id = _stream_id(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream"}, status=400)
+    # ?path= plays a file under the log directory (e.g. a recording segment) instead of the sample
+    return JsonResponse(_detector().use_video(stream_id, path=request.GET.get('path') or None))
+
+
+@csrf_exempt
+def api_seek(request):
+    # ?t= seconds into the current file source; frames already cached replay without the model
+    if request.method not in ("POST", "GET"):
+        return JsonResponse({"ok": False, "error": "method not allowed"}, status=405)
+    try:
+        t = float(request.GET['t'])
+        stream_id = _stream_id(request)
+    except (KeyError, ValueError):
+        return JsonResponse({"ok": False, "error": "invalid t or stream"}, status=400)
+    if not 0 <= t < float('inf'):
+        return JsonResponse({"ok": False, "error": "invalid t or stream"}, status=400)
+    out = _detector().seek(t, stream_id)
+    return JsonResponse(out, status=200 if out["ok"] else 409)
 
 
 @csrf_exempt
@@ -46,18 +134,215 @@ def api_use_camera(request):
         idx = int(request.GET.get('i', '0'))
     except ValueError:
         return JsonResponse({"ok": False, "error": "invalid index"}, status=400)
-    return JsonResponse(use_camera(idx))
+    try:
+        stream_id = _stream_id(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream"}, status=400)
+    return JsonResponse(_detector().use_camera(idx, stream_id))
 
 
 @csrf_exempt
 def api_start_recording(request):
     if request.method not in ("POST", "GET"):
         return JsonResponse({"ok": False, "error": "method not allowed"}, status=405)
-    return JsonResponse(start_recording())
+    try:
+        stream_id = _stream_id(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream"}, status=400)
+    raw = request.GET.get("raw") or request.POST.get("raw")
+    return JsonResponse(_detector().start_recording(stream_id, raw=None if raw is None else raw not in ("0", "false", "False")))
 
 
 @csrf_exempt
 def api_stop_recording(request):
     if request.method not in ("POST", "GET"):
         return JsonResponse({"ok": False, "error": "method not allowed"}, status=405)
-    return JsonResponse(stop_recording())
+    try:
+        stream_id = _stream_id(request)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream"}, status=400)
+    return JsonResponse(_detector().stop_recording(stream_id))
+
+
+@csrf_exempt
+def api_profile(request):
+    # lists the inference profiles; ?name= switches (loading it in the background first), ?auto=1|0 the governor
+    name = request.GET.get('name') or request.POST.get('name')
+    auto = request.GET.get('auto') or request.POST.get('auto')
+    if not name and auto is None:
+        return JsonResponse(_detector().get_profiles())
+    out = _detector().set_profile(name, None if auto is None else auto not in ("0", "false", "False"))
+    return JsonResponse(out, status=200 if out["ok"] else 400)
+
+
+def metrics(request):
+    # Prometheus text format; scraping does not start the detector
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def api_job(request, job_id):
+    # state of a use_camera/use_video/probe job: queued, running, ready, done or failed
+    out = _detector().job_status(job_id)
+    return JsonResponse(out, status=200 if out["ok"] else 404)
+
+
+@csrf_exempt
+def api_sources(request):
+    # warm captures and cached capabilities; ?probe=0,1,2 queues a probe of those cameras
+    probe = request.GET.get('probe')
+    if probe:
+        try:
+            indexes = [int(i) for i in probe.split(',') if i.strip()]
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "invalid probe list"}, status=400)
+        return JsonResponse(_detector().probe_sources(indexes))
+    return JsonResponse(_detector().list_sources())
+
+
+def api_streams(request):
+    return JsonResponse(_detector().list_streams())
+
+
+def api_events(request):
+    # event clips on disk, newest first; ?stream= filters, ?limit= caps
+    try:
+        stream_id = int(request.GET["stream"]) if request.GET.get("stream") else None
+        limit = min(1000, int(request.GET.get("limit", 100)))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "invalid stream or limit"}, status=400)
+    from .events import list_clips
+    clips = list_clips(_detector().EVENT_DIR, stream_id, limit)
+    for clip in clips:
+        clip["url"] = f"/api/events/{clip['file']}"
+    return JsonResponse({"ok": True, "count": len(clips), "events": clips})
+
+
+def api_event_clip(request, name):
+    path = os.path.join(_detector().EVENT_DIR, os.path.basename(name))
+    if not name.startswith('event_') or not name.endswith('.mp4') or not os.path.exists(path):
+        raise Http404("no such clip")
+    return FileResponse(open(path, 'rb'), content_type='video/mp4')
+
+
+# Detection history (stream.models). Times are ISO 8601; naive values are UTC.
+def _history_filters(request, ts_field):
+    filters = {}
+    for param, lookup in (('from', 'gte'), ('to', 'lt')):
+        raw = request.GET.get(param)
+        if raw:
+            dt = parse_datetime(raw)
+            if dt is None:
+                raise ValueError(f"invalid '{param}' timestamp")
+            filters[f'{ts_field}__{lookup}'] = parse_ts(dt)
+    cls = request.GET.get('class')
+    if cls:
+        if cls.isdigit():
+            filters['class_id'] = int(cls)
+        else:
+            filters['class_name'] = cls
+    source = request.GET.get('source')
+    if source:
+        try:
+            filters['source'] = int(source)
+        except ValueError:
+            raise ValueError("invalid 'source'")
+    return filters
+
+
+def _page(request, default=1000, cap=10000):
+    # limit clamped to [0, cap] and offset to >= 0; QuerySets reject negative slices
+    try:
+        limit, offset = int(request.GET.get('limit', default)), int(request.GET.get('offset', '0'))
+    except ValueError:
+        raise ValueError("limit and offset must be integers")
+    return max(0, min(limit, cap)), max(0, offset)
+
+
+def api_detections(request):
+    try:
+        filters = _history_filters(request, 'ts')
+        limit, offset = _page(request)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    rows = Detection.objects.filter(**filters).order_by('ts', 'id').values(
+        'ts', 'source', 'class_id', 'class_name', 'conf', 'x1', 'y1', 'x2', 'y2',
+    )[offset:offset + limit]
+    dets = [dict(r, ts=r['ts'].isoformat()) for r in rows]
+    return JsonResponse({"ok": True, "offset": offset, "count": len(dets), "detections": dets})
+
+
+_BUCKETS = {'minute': None, 'hour': TruncHour, 'day': TruncDay}
+
+
+def api_stats(request):
+    # Aggregates come from the per-minute rollup, so from/to resolve to whole minutes
+    try:
+        filters = _history_filters(request, 'bucket')
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    bucket = request.GET.get('bucket')
+    if bucket and bucket not in _BUCKETS:
+        return JsonResponse({"ok": False, "error": f"bucket must be one of {sorted(_BUCKETS)}"}, status=400)
+    qs = DetectionMinute.objects.filter(**filters)
+    totals = list(
+        qs.values('class_id', 'class_name').annotate(count=Sum('count'), max_conf=Max('max_conf')).order_by('class_id')
+    )
+    out = {"ok": True, "total": sum(t['count'] for t in totals), "classes": totals}
+    if bucket:
+        trunc = _BUCKETS[bucket]
+        series = qs.values(t=trunc('bucket', tzinfo=datetime.timezone.utc) if trunc else F('bucket'), cid=F('class_id'))
+        series = series.annotate(count=Sum('count')).order_by('t', 'cid')
+        out["series"] = [{"t": r['t'].isoformat(), "class_id": r['cid'], "count": r['count']} for r in series]
+    return JsonResponse(out)
+
+
+def api_tracks(request):
+    # one row per tracked object; from/to apply to when it was first seen
+    try:
+        filters = _history_filters(request, 'first_seen')
+        limit, offset = _page(request)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    rows = Track.objects.filter(**filters).order_by('first_seen', 'id').values(
+        'source', 'track_id', 'class_id', 'class_name', 'first_seen', 'last_seen', 'frames',
+        'max_conf', 'mean_conf', 'best_ts', 'x1', 'y1', 'x2', 'y2',
+    )[offset:offset + limit]
+    tracks = [dict(r, first_seen=r['first_seen'].isoformat(), last_seen=r['last_seen'].isoformat(),
+                   best_ts=r['best_ts'].isoformat()) for r in rows]
+    return JsonResponse({"ok": True, "offset": offset, "count": len(tracks), "tracks": tracks})
+
+
+def api_track_counts(request):
+    # Unique objects per class. ?live=1 reads the running stream's per-minute
+    # counts (last ?minutes=, no database needed); otherwise totals are tracks
+    # first seen in [from, to), and the series counts each track once per
+    # minute it was seen in (bucket=minute) or by when it was first seen (hour/day).
+    if request.GET.get('live'):
+        try:
+            minutes, stream_id = int(request.GET.get('minutes', '60')), _stream_id(request)
+        except ValueError:
+            return JsonResponse({"ok": False, "error": "invalid minutes or stream"}, status=400)
+        out = _detector().track_counts(minutes, stream_id)
+        return JsonResponse(out, status=200 if out["ok"] else 404)
+    try:
+        filters = _history_filters(request, 'first_seen')
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    bucket = request.GET.get('bucket')
+    if bucket and bucket not in _BUCKETS:
+        return JsonResponse({"ok": False, "error": f"bucket must be one of {sorted(_BUCKETS)}"}, status=400)
+    qs = Track.objects.filter(**filters)
+    totals = list(
+        qs.values('class_id', 'class_name').annotate(count=Count('id'), max_conf=Max('max_conf')).order_by('class_id')
+    )
+    out = {"ok": True, "total": sum(t['count'] for t in totals), "classes": totals}
+    if bucket == 'minute':
+        series = TrackMinute.objects.filter(**{k.replace('first_seen', 'bucket'): v for k, v in filters.items()})
+        series = series.values(t=F('bucket'), cid=F('class_id')).annotate(count=Sum('count')).order_by('t', 'cid')
+    elif bucket:
+        trunc = _BUCKETS[bucket]
+        series = qs.values(t=trunc('first_seen', tzinfo=datetime.timezone.utc), cid=F('class_id'))
+        series = series.annotate(count=Count('id')).order_by('t', 'cid')
+    if bucket:
+        out["series"] = [{"t": r['t'].isoformat(), "class_id": r['cid'], "count": r['count']} for r in series]
+    return JsonResponse(out)
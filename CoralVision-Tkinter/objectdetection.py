@@ -2,11 +2,276 @@ import cv2
 import threading
 import numpy as np
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import filedialog, messagebox
 from PIL import Image, ImageTk  
 from ultralytics import YOLO
+import csv
 import datetime  
+import hashlib
+import json
+import math
 import os
+import queue
+import time
+
+# Adaptive frame skipping: when > 0 the model runs every K frames (K adapted
+# to reach this display FPS, capped at MAX_SKIP) and boxes follow optical
+# flow in between. 0 runs the model on every frame.
+TARGET_FPS = float(os.environ.get("CORAL_TARGET_FPS", "0"))
+MAX_SKIP = int(os.environ.get("CORAL_MAX_SKIP", "8"))
+
+# Inference backend: "torch" (default), "onnx" or "openvino". Exports are made
+# once and cached next to the weights, keyed by a hash of the weights file.
+BACKEND = os.environ.get("CORAL_BACKEND", "torch")
+
+# Inference profiles, picked in the window and loaded on first use: accurate
+# (full size on BACKEND), int8 (dynamically quantized ONNX export) and fast
+# (reduced input size). CORAL_GOVERNOR=1 starts with Auto on, which steps down
+# the list while inference overruns the source's frame time and back up when
+# there is headroom again.
+CONF = float(os.environ.get("CORAL_CONF", "0.6"))
+FAST_IMGSZ = int(os.environ.get("CORAL_FAST_IMGSZ", "320"))
+PROFILES = {
+    # name: (backend, imgsz, int8)
+    "accurate": (BACKEND, 640, False),
+    "int8": ("onnx", 640, True),
+    "fast": (BACKEND, FAST_IMGSZ, False),
+}
+DEFAULT_PROFILE = os.environ.get("CORAL_PROFILE", "accurate")
+GOVERNOR = os.environ.get("CORAL_GOVERNOR", "0") not in ("0", "false", "False")
+
+# Recording runs on a writer thread and is cut into segments of this many
+# seconds (listed in index.jsonl). CORAL_RECORD_RAW=1 records the frames
+# without overlays plus a per-segment detections .jsonl sidecar.
+RECORD_SEGMENT_SECS = float(os.environ.get("CORAL_RECORD_SEGMENT_SECS", "60"))
+RECORD_RAW = os.environ.get("CORAL_RECORD_RAW", "0") not in ("0", "false", "False")
+
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+    (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61),
+]
+
+
+def load_model(model_path, backend=BACKEND, imgsz=640, int8=False):
+    """YOLO on the requested backend, warmed up so the first frame isn't slow.
+
+    int8 quantizes the ONNX export (dynamic, weights only); it needs onnx and
+    onnxruntime and raises if the quantized model cannot be made. When an
+    export fails the PyTorch weights are used and model.fallback says why.
+    """
+    path = model_path
+    fallback = None
+    if backend in ("onnx", "openvino"):
+        h = hashlib.sha1()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        stem = os.path.splitext(model_path)[0]
+        key = f"{h.hexdigest()[:12]}_{imgsz}"
+        path = f"{stem}.{key}.onnx" if backend == "onnx" else f"{stem}.{key}_openvino_model"
+        if not os.path.exists(path):
+            try:
+                out = YOLO(model_path).export(format=backend, imgsz=imgsz, verbose=False)
+                os.replace(out, path)
+            except Exception as e:
+                if int8:
+                    raise RuntimeError(f"onnx export failed: {e}")
+                fallback = f"{backend} export failed ({e}); using PyTorch weights"
+                path = model_path
+        if int8 and backend == "onnx":
+            path = quantize_onnx(path)
+    model = YOLO(path, task="detect")
+    model.predict(source=np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+    model.fallback = fallback
+    return model
+
+
+def quantize_onnx(path):
+    """Dynamic int8 copy of an ONNX export, cached next to it."""
+    target = path[:-len(".onnx")] + ".int8.onnx"
+    if os.path.exists(target):
+        return target
+    try:
+        import onnx
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        raise RuntimeError("the int8 profile needs onnx and onnxruntime (pip install onnx onnxruntime)")
+    tmp = target[:-len(".onnx")] + ".tmp.onnx"
+    quantize_dynamic(path, tmp, weight_type=QuantType.QUInt8)
+    # keep the export's metadata (class names) on the quantized graph
+    model, src = onnx.load(tmp), onnx.load(path)
+    if not model.metadata_props:
+        model.metadata_props.extend(src.metadata_props)
+    onnx.save(model, tmp)
+    os.replace(tmp, target)
+    return target
+
+
+# One record per box for a whole frame; names come from model.names
+DET_DTYPE = np.dtype([("class_id", np.int16), ("conf", np.float32),
+                      ("x1", np.float32), ("y1", np.float32), ("x2", np.float32), ("y2", np.float32)])
+
+
+def extract_dets(r):
+    boxes = getattr(r, "boxes", None)
+    dets = np.zeros(0 if boxes is None else len(boxes), DET_DTYPE)
+    if len(dets):
+        data = boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls in one copy
+        for i, c in enumerate(("x1", "y1", "x2", "y2", "conf", "class_id")):
+            dets[c] = data[:, i]
+    return dets
+
+
+def class_name(names, cid):
+    return names.get(cid, str(cid)) if isinstance(names, dict) else str(cid)
+
+
+def draw_detections(frame, dets, names):
+    """Draws in place; axis-aligned boxes skip anti-aliasing."""
+    h, w = frame.shape[:2]
+    xy = np.stack([dets[c] for c in ("x1", "y1", "x2", "y2")], axis=1)
+    np.clip(xy, 0, (w - 1, h - 1, w - 1, h - 1), out=xy)
+    for (x1, y1, x2, y2), cid in zip(xy.astype(int).tolist(), dets["class_id"].tolist()):
+        color = PALETTE[cid % len(PALETTE)]
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, class_name(names, cid), (x1 + 2, max(12, y1 - 4)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, color, 1, cv2.LINE_AA)
+    return frame
+
+
+class FlowTracker:
+    """Shifts the last detector boxes by the median LK optical flow inside each box."""
+
+    def __init__(self, scale=0.5):
+        self.scale = scale
+        self.prev = None
+        self.dets = np.zeros(0, DET_DTYPE)
+
+    def _gray(self, frame):
+        g = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(g, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+    def reset(self, frame, dets):
+        self.prev = self._gray(frame)
+        self.dets = dets.copy()
+
+    def update(self, frame):
+        gray = self._gray(frame)
+        s = self.scale
+        for d in self.dets:  # records are views, so the shifts land in self.dets
+            x1, y1 = max(0, int(d["x1"] * s)), max(0, int(d["y1"] * s))
+            x2, y2 = min(gray.shape[1], int(d["x2"] * s)), min(gray.shape[0], int(d["y2"] * s))
+            if self.prev is None or x2 - x1 < 2 or y2 - y1 < 2:
+                continue
+            mask = np.zeros_like(self.prev)
+            mask[y1:y2, x1:x2] = 255
+            p0 = cv2.goodFeaturesToTrack(self.prev, 12, 0.01, 3, mask=mask)
+            if p0 is None:
+                continue
+            p1, st, _ = cv2.calcOpticalFlowPyrLK(self.prev, gray, p0, None, winSize=(15, 15), maxLevel=2)
+            good = st.reshape(-1) == 1
+            if not good.any():
+                continue
+            dx, dy = np.median((p1 - p0).reshape(-1, 2)[good], axis=0) / s
+            d["x1"] += dx; d["x2"] += dx
+            d["y1"] += dy; d["y2"] += dy
+        self.prev = gray
+        return self.dets
+
+
+class Recorder:
+    """Writes segments of a recording from a bounded queue on its own thread."""
+
+    def __init__(self, path, fps, names, segment_secs=RECORD_SEGMENT_SECS, raw=RECORD_RAW):
+        self.path, self.fps, self.names, self.raw = path, fps, names, raw
+        self.segment_frames = max(1, int(round(segment_secs * fps)))
+        self.q = queue.Queue(maxsize=64)
+        self.dropped = self.segments = 0
+        self.error = None
+        self.writer = self.sidecar = self.seg = None
+        os.makedirs(path, exist_ok=True)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, dets=None):
+        try:
+            self.q.put_nowait((frame, dets))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                break
+            frame, dets = item
+            try:
+                if self.writer is None or self.seg["frames"] >= self.segment_frames:
+                    self._open(frame)
+                self.writer.write(frame)
+                if self.sidecar is not None:
+                    rows = [{"class_id": cid, "class_name": class_name(self.names, cid), "conf": conf,
+                             "x1": x1, "y1": y1, "x2": x2, "y2": y2} for cid, conf, x1, y1, x2, y2 in dets.tolist()]
+                    self.sidecar.write(json.dumps({"frame": self.seg["frames"], "detections": rows}) + "\n")
+                self.seg["frames"] += 1
+            except Exception as e:
+                self.error = str(e)
+                break
+        self._close()
+
+    def _open(self, frame):
+        self._close()
+        name = f"seg_{self.segments:05d}"
+        h, w = frame.shape[:2]
+        self.writer = cv2.VideoWriter(os.path.join(self.path, name + ".mp4"), cv2.VideoWriter_fourcc(*"mp4v"),
+                                      self.fps, (w, h))
+        if not self.writer.isOpened():
+            self.writer = None
+            raise RuntimeError(f"Could not open video writer for:\n{self.path}")
+        self.seg = {"file": name + ".mp4", "frames": 0, "fps": self.fps, "width": w, "height": h,
+                    "start": datetime.datetime.now().isoformat()}
+        if self.raw:
+            self.sidecar = open(os.path.join(self.path, name + ".jsonl"), "w")
+            self.seg["sidecar"] = name + ".jsonl"
+        self.segments += 1
+
+    def _close(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        if self.sidecar is not None:
+            self.sidecar.close()
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            f.write(json.dumps(self.seg) + "\n")
+        self.writer = self.sidecar = self.seg = None
+
+    def close(self):
+        # drains what is queued, then finishes the open segment
+        self.q.put(None)
+        self.thread.join(timeout=5)
+
+
+class LatestFrame:
+    """Single-slot handoff: the worker overwrites, the UI takes the newest once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.item = None
+        self.seq = 0
+        self.taken = 0
+
+    def put(self, item):
+        with self.lock:
+            self.item = item
+            self.seq += 1
+
+    def take(self):
+        with self.lock:
+            if self.seq == self.taken:
+                return None
+            self.taken = self.seq
+            return self.item
+
 
 class YOLOApp:
     def __init__(self, root):
@@ -14,11 +279,35 @@ class YOLOApp:
         self.root.title("YOLO Object Detection")
         
         self.video_source = 0
-        self.is_recording = False
-        self.out = None
+        self.recorder = None
         self.vid = None
-        self.output_filename = None
         self.fps = 30.0  # default fallback
+        # Frame skipping state (see TARGET_FPS)
+        self.tracker = FlowTracker()
+        self.skip_k = 1
+        self.since_key = None
+        self.t_inf = None
+        self.t_trk = None
+        # Capture and inference run on a worker thread; the UI only shows its newest frame
+        self.latest = LatestFrame()
+        self.stop_event = threading.Event()
+        self.worker = None
+        self.display_size = (640, 480)
+        self.photo = None
+        self.image_item = None
+        self.t_shown = None
+        self.display_fps = 0.0
+        self.infer_fps = 0.0
+        # Inference profiles (see PROFILES): loaded models by name, swapped in by the worker
+        self.profile = DEFAULT_PROFILE if DEFAULT_PROFILE in PROFILES else "accurate"
+        self.models = {}
+        self.pending_profile = None
+        self.profile_loading = set()
+        self.profile_errors = {}
+        self.auto = GOVERNOR
+        self.cost = {}  # profile -> (inference seconds EMA, when last measured)
+        self.over = self.under = 0
+        self.t_switched = time.time()
 
         # Resolve model path relative to this script so it works regardless of CWD
         script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,11 +321,29 @@ class YOLOApp:
             # Fail fast; __del__ will handle partial init safely
             raise FileNotFoundError(model_path)
 
-        self.model = YOLO(model_path)
-        
-        self.canvas = tk.Canvas(root, width=640, height=480)
-        self.canvas.pack()
+        self.model_path = model_path
+        self.model = self.models[self.profile] = load_model(model_path, *PROFILES[self.profile])
+        if self.model.fallback:
+            messagebox.showwarning("Inference Backend", self.model.fallback)
         
+        self.canvas = tk.Canvas(root, width=640, height=480, highlightthickness=0, bg="black")
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        # the worker scales frames to whatever size the window gives the canvas
+        self.canvas.bind("<Configure>", self._on_resize)
+
+        self.fps_label = tk.Label(root, text="Display: - fps | Inference: - fps", fg="gray")
+        self.fps_label.pack()
+
+        profile_row = tk.Frame(root)
+        profile_row.pack()
+        tk.Label(profile_row, text="Profile:").pack(side=tk.LEFT)
+        self.profile_var = tk.StringVar(value=self.profile)
+        tk.OptionMenu(profile_row, self.profile_var, *PROFILES, command=self.choose_profile).pack(side=tk.LEFT)
+        self.auto_var = tk.BooleanVar(value=self.auto)
+        tk.Checkbutton(profile_row, text="Auto", variable=self.auto_var, command=self.toggle_auto).pack(side=tk.LEFT)
+        self.profile_label = tk.Label(root, text="", fg="gray")
+        self.profile_label.pack()
+
         self.record_button = tk.Button(root, text="Start Recording", command=self.toggle_recording)
         self.record_button.pack()
 
@@ -44,6 +351,14 @@ class YOLOApp:
         self.rec_label = tk.Label(root, text="Recording: OFF", fg="gray")
         self.rec_label.pack(pady=(4, 8))
 
+        # Offline batch processing of a recorded video (runs in a worker thread)
+        self.batch_button = tk.Button(root, text="Process Video...", command=self.process_video)
+        self.batch_button.pack()
+        self.batch_status = ""
+        self.batch_done = False
+        self.batch_label = tk.Label(root, text="", fg="gray")
+        self.batch_label.pack(pady=(4, 8))
+
         # Start video capture
         # use mp4 vid for testing
         # self.video_source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "coral.mp4")
@@ -63,92 +378,476 @@ class YOLOApp:
                 self.fps = float(src_fps)
             else:
                 self.fps = 30.0
-            self.update()
+        self.worker = threading.Thread(target=self._capture_loop, daemon=True)
+        self.worker.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        # keep the UI loop running even without a live source (offline processing status)
+        self.update()
     
     def toggle_recording(self):
-        if self.is_recording:
-            self.is_recording = False
+        if self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
             self.record_button.config(text="Start Recording")
-            if self.out:
-                self.out.release()
-                self.out = None
-            messagebox.showinfo("Recording", f"Recording stopped.\nSaved to {self.output_filename or 'file'}")
-            self.output_filename = None
+            recorder.close()
+            messagebox.showinfo("Recording", f"Recording stopped.\nSaved {recorder.segments} segment(s) to {recorder.path}")
             # Update indicator
             self.rec_label.config(text="Recording: OFF", fg="gray")
         else:
-            self.is_recording = True
             self.record_button.config(text="Stop Recording")
-            
-            # Generate a unique filename using the current timestamp
+
+            # Generate a unique folder using the current timestamp; segments are sized on the first frame
             timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            self.output_filename = f'output_{timestamp}.mp4'
-            # Defer VideoWriter creation until we have the first frame to ensure correct size
-            messagebox.showinfo("Recording", f"Recording started. Saving to {self.output_filename}.")
+            self.recorder = Recorder(f"output_{timestamp}", self.fps, self.model.names)
+            messagebox.showinfo("Recording", f"Recording started. Saving to {self.recorder.path}.")
             # Update indicator immediately
             self.rec_label.config(text="Recording: ON", fg="red")
-    
-    def update(self):
-        if self.vid is None or not self.vid.isOpened():
-            # Try again later in case camera becomes available
-            self.root.after(500, self.update)
+
+    def choose_profile(self, name):
+        # a manual choice turns the governor off until Auto is ticked again
+        self.auto = False
+        self.auto_var.set(False)
+        self.set_profile(name)
+
+    def toggle_auto(self):
+        self.auto = self.auto_var.get()
+        self.over = self.under = 0
+        self.t_switched = time.time()
+
+    def set_profile(self, name):
+        """Use profile name for live inference; one not loaded yet loads on a thread first."""
+        if name in self.models:
+            self.pending_profile = name
+        elif name not in self.profile_loading:
+            self.profile_loading.add(name)
+            self.profile_errors.pop(name, None)
+            threading.Thread(target=self._load_profile, args=(name,), daemon=True).start()
+
+    def _load_profile(self, name):
+        try:
+            self.models[name] = load_model(self.model_path, *PROFILES[name])
+            self.pending_profile = name
+        except Exception as e:
+            self.profile_errors[name] = str(e)
+        finally:
+            self.profile_loading.discard(name)
+
+    def _predict(self, frame):
+        start = time.time()
+        results = self.model.predict(source=frame, conf=CONF, imgsz=PROFILES[self.profile][1], verbose=False)
+        self._govern(time.time() - start)
+        return extract_dets(results[0])
+
+    def _govern(self, elapsed):
+        """Step down PROFILES when inference overruns the frame time for a while, back up with headroom."""
+        now = time.time()
+        old = self.cost.get(self.profile)
+        cost = self._ema(old and old[0], elapsed)
+        self.cost[self.profile] = (cost, now)
+        if not self.auto or self.profile_loading or now - self.t_switched < 5.0:
             return
+        ladder = [p for p in PROFILES if p not in self.profile_errors]
+        i = ladder.index(self.profile) if self.profile in ladder else 0
+        budget = 1.0 / self.fps
+        if cost > budget:
+            self.over, self.under = self.over + 1, 0
+            target = ladder[i + 1] if self.over >= 15 and i + 1 < len(ladder) else None
+        elif cost < 0.7 * budget:
+            self.over, self.under = 0, self.under + 1
+            target = ladder[i - 1] if self.under >= 90 and i > 0 else None
+            # retry a profile known to be too slow only once its measurement is a minute old
+            known = self.cost.get(target)
+            if known and known[0] >= 0.7 * budget and now - known[1] < 60:
+                target = None
+        else:
+            self.over = self.under = 0
+            target = None
+        if target is not None:
+            self.over = self.under = 0
+            self.t_switched = now
+            self.set_profile(target)
+
+    def process_video(self):
+        path = filedialog.askopenfilename(
+            title="Choose a recorded video",
+            filetypes=[("Video", "*.mp4 *.avi *.mov *.mkv"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        annotate = messagebox.askyesno("Process Video", "Also write an annotated MP4?")
+        self.batch_button.config(state=tk.DISABLED)
+        threading.Thread(target=self._process_video, args=(path, annotate), daemon=True).start()
+
+    def _process_video(self, path, annotate, batch=8):
+        """Batched detection over a whole file, resumable via a checkpoint file.
+
+        Writes <video>_detections.csv (same columns as the Django log); the
+        .ckpt file holds the next frame to process, the CSV size at that
+        point and the profile and confidence in use, so an interrupted run
+        drops rows written after it and continues where it stopped. A
+        checkpoint made with another profile or confidence is not resumed.
+        """
+        cap = out = writer = None
+        try:
+            backend, imgsz, int8 = PROFILES[self.profile]
+            stem = os.path.splitext(path)[0]
+            csv_path, ckpt = stem + "_detections.csv", stem + "_detections.ckpt"
+            start, size = 0, None
+            if os.path.exists(ckpt) and os.path.exists(csv_path):
+                with open(ckpt) as f:
+                    fields = f.read().split()
+                if fields[2:4] != [self.profile, repr(CONF)]:
+                    made = " ".join(fields[2:4]) or "an older version"
+                    self.batch_status = (f"{os.path.basename(ckpt)} was made with {made}, not {self.profile} {CONF}; "
+                                         "switch back or delete it to start over")
+                    return
+                start, size = int(fields[0]), int(fields[1])
+            model = load_model(self.model_path, backend, imgsz, int8)  # own instance; the live loop keeps self.model
+            cap = cv2.VideoCapture(path)
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            out = open(csv_path, "a" if start else "w", newline="")
+            if start and size is not None:
+                out.truncate(size)  # rows past the checkpoint are redone below
+            log = csv.writer(out)
+            if not start:
+                log.writerow(["frame", "time_s", "class_id", "class_name", "conf", "x1", "y1", "x2", "y2"])
+            idx, t0 = start, time.time()
+            while True:
+                frames = []
+                while len(frames) < batch:
+                    ok, frame = cap.read()
+                    if not ok:
+                        break
+                    frames.append(frame)
+                if not frames:
+                    break
+                for i, r in enumerate(model.predict(source=frames, conf=CONF, imgsz=imgsz, verbose=False)):
+                    dets = extract_dets(r)
+                    t = f"{(idx + i) / fps:.3f}"
+                    log.writerows([idx + i, t, cid, class_name(model.names, cid), f"{conf:.4f}",
+                                   f"{x1:.2f}", f"{y1:.2f}", f"{x2:.2f}", f"{y2:.2f}"]
+                                  for cid, conf, x1, y1, x2, y2 in dets.tolist())
+                    if annotate:
+                        if writer is None:
+                            h, w = frames[i].shape[:2]
+                            writer = cv2.VideoWriter(f"{stem}_annotated_{start}.mp4",
+                                                     cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+                        writer.write(draw_detections(frames[i], dets, model.names))
+                idx += len(frames)
+                out.flush()
+                # frame, CSV size and model settings together, replaced atomically
+                with open(ckpt + ".tmp", "w") as f:
+                    f.write(f"{idx} {out.tell()} {self.profile} {CONF!r}")
+                os.replace(ckpt + ".tmp", ckpt)
+                rate = (idx - start) / max(1e-6, time.time() - t0)
+                self.batch_status = f"Processing {os.path.basename(path)}: {idx}/{total} frames, {rate:.1f} frames/s"
+            out.close()
+            os.remove(ckpt)
+            self.batch_status = f"Done: {idx} frames -> {os.path.basename(csv_path)}"
+        except Exception as e:
+            self.batch_status = f"Processing failed: {e}"
+        finally:
+            if cap is not None:
+                cap.release()
+            if out is not None:
+                out.close()
+            if writer is not None:
+                writer.release()
+            self.batch_done = True
+
+    def _on_resize(self, event):
+        self.display_size = (max(1, event.width), max(1, event.height))
+
+    def _capture_loop(self):
+        """Worker thread: read, detect, record and annotate; hands display-ready images to the UI."""
+        t_prev = None
+        while not self.stop_event.is_set():
+            if self.vid is None or not self.vid.isOpened():
+                # Try again later in case camera becomes available
+                self.stop_event.wait(0.5)
+                continue
+            if self.pending_profile is not None:
+                # swapped here so a frame never mixes two models
+                name, self.pending_profile = self.pending_profile, None
+                self.profile, self.model = name, self.models[name]
+                self.t_switched = time.time()
+            t_read = time.time()
+            ret, frame = self.vid.read()
+            if not ret:
+                self.stop_event.wait(0.01)
+                continue
+            if TARGET_FPS > 0:
+                dets = self.detect_or_track(frame)
+            else:
+                dets = self._predict(frame)
+
+            # a failed recorder is reported and dropped by the UI thread
+            recorder = self.recorder
+            if recorder is not None and recorder.error:
+                recorder = None
+            if recorder is not None and recorder.raw:
+                # the tracker updates dets in place on the next frame
+                recorder.submit(frame.copy(), dets.copy())
+            annotated_frame = draw_detections(frame, dets, self.model.names)
+            # The writer thread owns the frame from here; it is not modified again
+            if recorder is not None and not recorder.raw:
+                recorder.submit(annotated_frame)
+
+            # Scale to the canvas (keeping aspect) and convert here, off the UI thread
+            cw, ch = self.display_size
+            h, w = annotated_frame.shape[:2]
+            scale = min(cw / w, ch / h)
+            size = (max(1, int(w * scale)), max(1, int(h * scale)))
+            shown = annotated_frame
+            if size != (w, h):
+                shown = cv2.resize(annotated_frame, size,
+                                   interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            self.latest.put(Image.fromarray(cv2.cvtColor(shown, cv2.COLOR_BGR2RGB)))
+
+            now = time.time()
+            if t_prev is not None:
+                self.infer_fps = self._ema(self.infer_fps or None, 1.0 / max(1e-6, now - t_prev))
+            t_prev = now
+            if isinstance(self.video_source, str):
+                # files play at their own rate rather than as fast as inference allows
+                self.stop_event.wait(max(0.0, 1.0 / self.fps - (now - t_read)))
+
+    def update(self):
+        # reflect offline processing progress from the worker thread
+        if self.batch_label.cget("text") != self.batch_status:
+            self.batch_label.config(text=self.batch_status)
+        if self.batch_done:
+            self.batch_done = False
+            self.batch_button.config(state=tk.NORMAL)
+
+        recorder = self.recorder
+        if recorder is not None and recorder.error:
+            # Fail gracefully if the writer thread could not write
+            self.recorder = None
+            self.record_button.config(text="Start Recording")
+            self.rec_label.config(text="Recording: OFF", fg="gray")
+            messagebox.showerror(
+                "Recording Error",
+                f"{recorder.error}\n\n"
+                "Try installing an OpenCV build with FFMPEG support or a compatible MP4 codec."
+            )
+
+        image = self.latest.take()
+        if image is not None:
+            if self.photo is None or (self.photo.width(), self.photo.height()) != image.size:
+                # only a new size needs a new PhotoImage; otherwise its buffer is rewritten in place
+                self.photo = ImageTk.PhotoImage(image)
+            else:
+                self.photo.paste(image)
+            cw, ch = self.display_size
+            if self.image_item is None:
+                self.image_item = self.canvas.create_image(cw // 2, ch // 2, image=self.photo, anchor=tk.CENTER)
+            else:
+                self.canvas.itemconfig(self.image_item, image=self.photo)
+                self.canvas.coords(self.image_item, cw // 2, ch // 2)
+            now = time.time()
+            if self.t_shown is not None:
+                self.display_fps = self._ema(self.display_fps or None, 1.0 / max(1e-6, now - self.t_shown))
+            self.t_shown = now
+            self.fps_label.config(text=f"Display: {self.display_fps:.1f} fps | Inference: {self.infer_fps:.1f} fps"
+                                       + (f" (detect every {self.skip_k})" if self.skip_k > 1 else ""))
+
+        # profile in use (the governor may have changed it), loads in progress and failures
+        chosen = self.profile_var.get()
+        if chosen != self.profile and (self.auto or chosen in self.profile_errors):
+            self.profile_var.set(self.profile)
+        status = f"Using {self.profile}"
+        if self.profile_loading:
+            status += f" | loading {', '.join(sorted(self.profile_loading))}..."
+        if getattr(self.model, "fallback", None):
+            status += f" | {self.model.fallback}"
+        for name, err in self.profile_errors.items():
+            status += f" | {name} unavailable: {err}"
+        if self.profile_label.cget("text") != status:
+            self.profile_label.config(text=status)
 
-        ret, frame = self.vid.read()
-        if ret:
-            # Perform prediction
-            results = self.model.predict(source=frame, conf=0.6, show_conf=False)
-            annotated_frame = results[0].plot()  # Get the annotated frame
-
-            # Lazy-create the VideoWriter on first frame after recording starts
-            if self.is_recording and self.out is None:
-                # Use mp4v codec for .mp4
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                h, w = annotated_frame.shape[:2]
-                self.out = cv2.VideoWriter(self.output_filename, fourcc, self.fps, (w, h))
-                if not self.out or not self.out.isOpened():
-                    # Fail gracefully if writer could not open
-                    self.is_recording = False
-                    self.record_button.config(text="Start Recording")
-                    self.out = None
-                    err_path = self.output_filename
-                    self.output_filename = None
-                    messagebox.showerror(
-                        "Recording Error",
-                        f"Could not open video writer for:\n{err_path}\n\n"
-                        "Try installing an OpenCV build with FFMPEG support or a compatible MP4 codec."
-                    )
-                    # Revert indicator on failure
-                    self.rec_label.config(text="Recording: OFF", fg="gray")
-
-            # If recording, write the frame to the video file
-            if self.is_recording and self.out is not None:
-                self.out.write(annotated_frame)
-            
-            # Convert the frame to a format suitable for Tkinter
-            self.photo = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
-            self.photo = Image.fromarray(self.photo)  # Use PIL's Image.fromarray
-            self.photo = ImageTk.PhotoImage(self.photo)  # Convert to PhotoImage
-            
-            # Update the canvas with the new frame
-            self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
-        
         # Call this function again after 10 ms
         self.root.after(10, self.update)
 
+    def detect_or_track(self, frame):
+        start = time.time()
+        if self.since_key is None or self.since_key + 1 >= self.skip_k:
+            self.tracker.reset(frame, self._predict(frame))
+            dets = self.tracker.dets
+            self.since_key = 0
+            self.t_inf = self._ema(self.t_inf, time.time() - start)
+        else:
+            dets = self.tracker.update(frame)
+            self.since_key += 1
+            self.t_trk = self._ema(self.t_trk, time.time() - start)
+        self._adapt_skip()
+        return dets
+
+    @staticmethod
+    def _ema(old, new):
+        return new if old is None else 0.8 * old + 0.2 * new
+
+    def _adapt_skip(self):
+        # smallest K with (t_inf + (K-1)*t_trk)/K within the frame budget
+        budget = 1.0 / TARGET_FPS
+        t_trk = self.t_trk or 0.0
+        if self.t_inf is None or self.t_inf <= budget:
+            k = 1
+        elif t_trk >= budget:
+            k = MAX_SKIP
+        else:
+            k = math.ceil((self.t_inf - t_trk) / (budget - t_trk))
+        self.skip_k = max(1, min(MAX_SKIP, k))
+
+    def close(self):
+        self.stop_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout=2)
+        self.root.destroy()
+
     def __del__(self):
+        try:
+            if getattr(self, 'stop_event', None) is not None:
+                self.stop_event.set()
+            if getattr(self, 'worker', None) is not None:
+                self.worker.join(timeout=2)
+        except Exception:
+            pass
         try:
             if getattr(self, 'vid', None) is not None and self.vid.isOpened():
                 self.vid.release()
         except Exception:
             pass
         try:
-            if getattr(self, 'out', None):
-                self.out.release()
+            if getattr(self, 'recorder', None):
+                self.recorder.close()
         except Exception:
             pass
 
+def _summarize(samples):
+    a = np.asarray(samples, dtype=np.float64) * 1000.0
+    if not len(a):
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"n": int(len(a)), "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3), "mean_ms": round(float(a.mean()), 3),
+            "fps": round(1000.0 * len(a) / float(a.sum()), 2) if a.sum() > 0 else None}
+
+
+def run_benchmark(video, frames=100, imgsz=320, model_path=None):
+    """Times this app's per-frame stages alone and chained; same JSON layout as
+    the Django `manage.py bench_pipeline` report so the two can be compared."""
+    import resource
+    import tempfile
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")  # CPU numbers unless told otherwise
+    rss = lambda: round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    model_path = model_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), "coralvision-bv2.pt")
+    model = load_model(model_path, imgsz=imgsz)
+    times = {s: [] for s in ("decode", "inference", "plot", "jpeg", "csv", "mp4")}
+    peaks = {}
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    decoded = []
+    while len(decoded) < frames:
+        t = time.perf_counter()
+        ok, frame = cap.read()
+        if not ok:
+            break
+        times["decode"].append(time.perf_counter() - t)
+        decoded.append(frame)
+    cap.release()
+    if not decoded:
+        raise RuntimeError(f"No frames decoded from {video}")
+    peaks["decode"] = rss()
+    h, w = decoded[0].shape[:2]
+
+    def infer(frame):
+        return extract_dets(model.predict(source=frame, conf=CONF, imgsz=imgsz, verbose=False)[0])
+
+    dets = []
+    for frame in decoded:
+        t = time.perf_counter()
+        dets.append(infer(frame))
+        times["inference"].append(time.perf_counter() - t)
+    peaks["inference"] = rss()
+    annotated = []
+    for frame, d in zip(decoded, dets):
+        # in place, like the capture loop
+        t = time.perf_counter()
+        annotated.append(draw_detections(frame, d, model.names))
+        times["plot"].append(time.perf_counter() - t)
+    peaks["plot"] = rss()
+    for img in annotated:
+        t = time.perf_counter()
+        cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+        times["jpeg"].append(time.perf_counter() - t)
+    peaks["jpeg"] = rss()
+
+    def rows(i, d):
+        return [[i, f"{i / fps:.3f}", cid, class_name(model.names, cid), f"{conf:.4f}",
+                 f"{x1:.2f}", f"{y1:.2f}", f"{x2:.2f}", f"{y2:.2f}"] for cid, conf, x1, y1, x2, y2 in d.tolist()]
+
+    with tempfile.TemporaryDirectory(prefix="coral-bench-") as tmp:
+        with open(os.path.join(tmp, "bench.csv"), "w", newline="") as f:
+            log = csv.writer(f)
+            for i, d in enumerate(dets):
+                t = time.perf_counter()
+                log.writerows(rows(i, d))
+                f.flush()
+                times["csv"].append(time.perf_counter() - t)
+        peaks["csv"] = rss()
+        out = cv2.VideoWriter(os.path.join(tmp, "bench.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        for img in annotated:
+            t = time.perf_counter()
+            out.write(img)
+            times["mp4"].append(time.perf_counter() - t)
+        out.release()
+        peaks["mp4"] = rss()
+        del annotated
+
+        e2e = []
+        cap = cv2.VideoCapture(video)
+        out = cv2.VideoWriter(os.path.join(tmp, "e2e.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+        with open(os.path.join(tmp, "e2e.csv"), "w", newline="") as f:
+            log = csv.writer(f)
+            t_all = time.perf_counter()
+            for i in range(len(decoded)):
+                t = time.perf_counter()
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                d = infer(frame)
+                img = draw_detections(frame, d, model.names)
+                cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
+                log.writerows(rows(i, d))
+                out.write(img)
+                e2e.append(time.perf_counter() - t)
+            wall = time.perf_counter() - t_all
+        out.release()
+        cap.release()
+    stages = {s: dict(_summarize(v), peak_rss_mb=peaks[s]) for s, v in times.items()}
+    end_to_end = dict(_summarize(e2e), wall_fps=round(len(e2e) / wall, 2) if wall > 0 else None)
+    return {"app": "tkinter", "video": os.path.basename(video), "frames": len(decoded), "resolution": [w, h],
+            "imgsz": imgsz, "backend_fallback": model.fallback, "boxes_per_frame": round(sum(len(d) for d in dets) / len(dets), 2),
+            "stages": stages, "end_to_end": end_to_end, "peak_rss_mb": rss()}
+
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = YOLOApp(root)
-    root.mainloop()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="CoralVision Tkinter app")
+    parser.add_argument("--bench", metavar="VIDEO", help="benchmark the pipeline on VIDEO and print JSON instead of opening the UI")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--out", help="also write the benchmark JSON here")
+    args = parser.parse_args()
+    if args.bench:
+        report = json.dumps(run_benchmark(args.bench, args.frames, args.imgsz), indent=2)
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(report + "\n")
+        print(report)
+    else:
+        root = tk.Tk()
+        app = YOLOApp(root)
+        root.mainloop()
\ No newline at end of file